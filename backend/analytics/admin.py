@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import ReportResult
+
+@admin.register(ReportResult)
+class ReportResultAdmin(admin.ModelAdmin):
+    list_display = ['id', 'job_type', 'status', 'progress', 'created_at', 'completed_at', 'expires_at']
+    list_filter = ['job_type', 'status', 'created_at']
+    readonly_fields = ['id', 'params_hash', 'created_at', 'started_at', 'completed_at']
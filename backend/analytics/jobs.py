@@ -0,0 +1,245 @@
+"""
+Background analytics jobs run on an in-process worker pool (no broker required)
+
+Jobs are persisted as ReportResult rows. Identical requests submitted while a
+job is still pending or running (in any process) are attached to that job
+instead of starting a second computation.
+
+Every process heartbeats the jobs it has queued or running (and progress
+updates heartbeat too), so a job is only presumed orphaned, and marked FAILED,
+once its heartbeat has been silent for ANALYTICS_JOB_STALE_AFTER. Status
+changes are conditional on the expected current status, so a job that was
+failed or purged meanwhile is never resurrected.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from monitoring.streaming import encode_json
+from .models import ReportResult
+from .reports import build_report, build_location_comparison, build_trend_analysis
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+IN_FLIGHT_STATUSES = ('PENDING', 'RUNNING')
+SUBMIT_ATTEMPTS = 3
+
+# Ids of jobs queued or running in this process, kept alive by the heartbeat thread
+_owned = set()
+_owned_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+class JobAborted(Exception):
+    """The job's row was failed or purged while it was computing"""
+
+
+def _optional_int(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+
+
+def normalize_params(job_type: str, params: dict) -> dict:
+    """Validate job params and fill in the same defaults the synchronous endpoints use"""
+    if not isinstance(params, dict):
+        raise ValueError("'params' must be an object")
+
+    location = params.get('location') or None
+    if job_type == 'REPORT':
+        report_type = params.get('type', 'summary')
+        if report_type not in ('summary', 'detailed'):
+            raise ValueError("'type' must be 'summary' or 'detailed'")
+        return {
+            'type': report_type,
+            'days': _optional_int(params.get('days'), 'days') or 30,
+            'location': str(location) if location else None,
+        }
+    if job_type == 'COMPARISON':
+        top = _optional_int(params.get('top'), 'top')
+        if top is not None and top < 1:
+            raise ValueError("'top' must be a positive integer")
+        return {
+            'days': _optional_int(params.get('days'), 'days') or 7,
+            'top': top,
+        }
+    if job_type == 'TREND':
+        return {
+            'days': _optional_int(params.get('days'), 'days') or 7,
+            'location': str(location) if location else None,
+        }
+
+    choices = ', '.join(choice for choice, _ in ReportResult.JOB_TYPE_CHOICES)
+    raise ValueError(f"Unknown job type '{job_type}' (expected one of: {choices})")
+
+
+def _run_builder(job_type, params, progress):
+    if job_type == 'REPORT':
+        return build_report(params['type'], params['days'], params['location'], progress=progress)
+    if job_type == 'COMPARISON':
+        return build_location_comparison(params['days'], top=params['top'], progress=progress)
+    return build_trend_analysis(params['days'], params['location'], progress=progress)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ANALYTICS_JOB_WORKERS,
+                thread_name_prefix='analytics-job'
+            )
+        return _executor
+
+
+def purge_expired_results():
+    """Delete finished jobs whose results have passed their TTL"""
+    deleted, _ = ReportResult.objects.filter(expires_at__lt=timezone.now()).delete()
+    if deleted:
+        logger.info(f"Purged {deleted} expired analytics job results")
+
+
+def _start_heartbeat():
+    global _heartbeat_thread
+    with _owned_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat, name='analytics-job-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+
+
+def _heartbeat():
+    """Touch every job this process still owns, whether queued or running"""
+    while True:
+        time.sleep(settings.ANALYTICS_JOB_HEARTBEAT_INTERVAL)
+        with _owned_lock:
+            job_ids = list(_owned)
+        if not job_ids:
+            continue
+        try:
+            ReportResult.objects.filter(pk__in=job_ids, status__in=IN_FLIGHT_STATUSES).update(
+                heartbeat_at=timezone.now()
+            )
+        except Exception as e:
+            logger.error(f"Error heartbeating analytics jobs: {e}")
+        finally:
+            connection.close()
+
+
+def fail_stale_jobs():
+    """Mark in-flight jobs whose heartbeat stopped (their process died) as FAILED"""
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.ANALYTICS_JOB_STALE_AFTER)
+    failed = ReportResult.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=cutoff),
+        status__in=IN_FLIGHT_STATUSES
+    ).update(
+        status='FAILED',
+        error='Job was interrupted before it finished',
+        completed_at=now,
+        expires_at=now + timedelta(seconds=settings.ANALYTICS_JOB_RESULT_TTL)
+    )
+    if failed:
+        logger.info(f"Marked {failed} stale analytics jobs as failed")
+
+
+def submit_job(job_type: str, params: dict):
+    """
+    Queue an analytics job, or attach to an identical one already in flight
+
+    Returns (job, created). Raises ValueError for invalid job types or params.
+    """
+    params = normalize_params(job_type, params)
+    params_hash = hashlib.sha256(
+        json.dumps({'job_type': job_type, 'params': params}, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+    purge_expired_results()
+    fail_stale_jobs()
+
+    for attempt in range(SUBMIT_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                job = ReportResult.objects.select_for_update().filter(
+                    params_hash=params_hash, status__in=IN_FLIGHT_STATUSES
+                ).first()
+                if job is not None:
+                    return job, False
+                job = ReportResult.objects.create(
+                    job_type=job_type, params=params, params_hash=params_hash, heartbeat_at=timezone.now()
+                )
+            break
+        except IntegrityError:
+            # Another process created the same job between our check and insert; attach to it,
+            # or try again if it already finished
+            if attempt == SUBMIT_ATTEMPTS - 1:
+                raise
+
+    with _owned_lock:
+        _owned.add(job.pk)
+    _start_heartbeat()
+    get_executor().submit(run_job, job.pk)
+    return job, True
+
+
+def run_job(job_id):
+    """Compute a job on a worker thread and persist its result or error"""
+    try:
+        now = timezone.now()
+        if not ReportResult.objects.filter(pk=job_id, status='PENDING').update(
+            status='RUNNING', started_at=now, heartbeat_at=now
+        ):
+            logger.info(f"Analytics job {job_id} was failed or purged before it started")
+            return
+        job = ReportResult.objects.get(pk=job_id)
+
+        def progress(fraction):
+            if not ReportResult.objects.filter(pk=job_id, status='RUNNING').update(
+                progress=round(fraction, 3), heartbeat_at=timezone.now()
+            ):
+                raise JobAborted()
+
+        data = _run_builder(job.job_type, job.params, progress)
+
+        now = timezone.now()
+        if not ReportResult.objects.filter(pk=job_id, status='RUNNING').update(
+            status='COMPLETED',
+            progress=1.0,
+            result=json.loads(encode_json(data)),
+            completed_at=now,
+            expires_at=now + timedelta(seconds=settings.ANALYTICS_JOB_RESULT_TTL)
+        ):
+            raise JobAborted()
+        logger.info(f"Analytics job {job_id} completed")
+
+    except (JobAborted, ReportResult.DoesNotExist):
+        logger.warning(f"Analytics job {job_id} was failed or purged while running; result discarded")
+
+    except Exception as e:
+        logger.error(f"Analytics job {job_id} failed: {e}")
+        now = timezone.now()
+        ReportResult.objects.filter(pk=job_id, status='RUNNING').update(
+            status='FAILED',
+            error=str(e),
+            completed_at=now,
+            expires_at=now + timedelta(seconds=settings.ANALYTICS_JOB_RESULT_TTL)
+        )
+
+    finally:
+        with _owned_lock:
+            _owned.discard(job_id)
+        connection.close()
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:23
+
+import django.core.validators
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportResult',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('job_type', models.CharField(choices=[('REPORT', 'Report'), ('COMPARISON', 'Location Comparison'), ('TREND', 'Trend Analysis')], max_length=20)),
+                ('params', models.JSONField(default=dict)),
+                ('params_hash', models.CharField(help_text='SHA-256 of job type and normalized params', max_length=64)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('progress', models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)])),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['params_hash', 'status'], name='analytics_r_params__b3ab78_idx'), models.Index(fields=['expires_at'], name='analytics_r_expires_7d4668_idx')],
+            },
+        ),
+    ]
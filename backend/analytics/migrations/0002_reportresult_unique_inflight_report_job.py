@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='reportresult',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'RUNNING'])), fields=('params_hash',), name='unique_inflight_report_job'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_reportresult_unique_inflight_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportresult',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last sign of life from the process computing the job', null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
+import uuid
+
+class ReportResult(models.Model):
+    """Model to store background analytics jobs and their results"""
+    JOB_TYPE_CHOICES = [
+        ('REPORT', 'Report'),
+        ('COMPARISON', 'Location Comparison'),
+        ('TREND', 'Trend Analysis'),
+    ]
+    
+    JOB_STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job_type = models.CharField(max_length=20, choices=JOB_TYPE_CHOICES)
+    params = models.JSONField(default=dict)
+    params_hash = models.CharField(max_length=64, help_text="SHA-256 of job type and normalized params")
+    
+    status = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default='PENDING')
+    progress = models.FloatField(default=0.0, validators=[MinValueValidator(0.0), MaxValueValidator(1.0)])
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from the process computing the job")
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['params_hash', 'status']),
+            models.Index(fields=['expires_at']),
+        ]
+        constraints = [
+            # At most one in-flight job per distinct request, across all worker processes
+            models.UniqueConstraint(
+                fields=['params_hash'],
+                condition=models.Q(status__in=['PENDING', 'RUNNING']),
+                name='unique_inflight_report_job',
+            ),
+        ]
+    
+    @property
+    def is_finished(self):
+        return self.status in ('COMPLETED', 'FAILED')
+    
+    def __str__(self):
+        return f"{self.job_type} job {self.id} ({self.status})"
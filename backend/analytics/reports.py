@@ -0,0 +1,303 @@
+"""
+Analytics computations shared by the synchronous endpoints and background jobs
+"""
+from django.utils import timezone
+from django.db.models import Avg, Max, Min, Count, Sum, Q, F
+from django.db.models.functions import TruncDate, ExtractHour
+from datetime import timedelta
+from monitoring.models import Location, AQICalculation, Alert
+
+
+def _report_progress(progress, fraction):
+    """Report completion (0.0 - 1.0) to an optional progress callback"""
+    if progress is not None:
+        progress(fraction)
+
+
+def build_trend_analysis(days, location_id=None, progress=None):
+    """Analyze AQI trends over the last `days` days"""
+    since = timezone.now() - timedelta(days=days)
+    queryset = AQICalculation.objects.filter(calculated_at__gte=since)
+    
+    if location_id:
+        queryset = queryset.filter(sensor_reading__sensor__location_id=location_id)
+    
+    # Daily trends: one query grouped by local calendar date, gaps filled below
+    daily_stats = {
+        row['day']: row
+        for row in queryset.annotate(
+            day=TruncDate('calculated_at')
+        ).values('day').annotate(
+            avg_aqi=Avg('overall_aqi'),
+            max_aqi=Max('overall_aqi'),
+            min_aqi=Min('overall_aqi'),
+            count=Count('id')
+        ).order_by('day')
+    }
+    
+    today = timezone.localdate()
+    daily_trends = []
+    for i in range(days):
+        day = today - timedelta(days=i)
+        daily = daily_stats.get(day, {})
+        
+        daily_trends.append({
+            'date': day.isoformat(),
+            'avg_aqi': round(daily.get('avg_aqi') or 0, 2),
+            'max_aqi': round(daily.get('max_aqi') or 0, 2),
+            'min_aqi': round(daily.get('min_aqi') or 0, 2),
+            'reading_count': daily.get('count', 0)
+        })
+    
+    _report_progress(progress, 0.5)
+    
+    # Pollutant trends
+    pollutant_trends = queryset.values('dominant_pollutant').annotate(
+        count=Count('id'),
+        avg_aqi=Avg('overall_aqi')
+    ).order_by('-count')
+    
+    # Peak pollution hours: one query grouped by local hour of day
+    hourly_stats = dict(
+        queryset.annotate(
+            hour=ExtractHour('calculated_at')
+        ).values('hour').annotate(
+            avg_aqi=Avg('overall_aqi')
+        ).order_by('hour').values_list('hour', 'avg_aqi')
+    )
+    
+    hourly_averages = [
+        {'hour': hour, 'avg_aqi': round(hourly_stats.get(hour) or 0, 2)}
+        for hour in range(24)
+    ]
+    
+    return {
+        'timestamp': timezone.now(),
+        'period_days': days,
+        'daily_trends': daily_trends,
+        'pollutant_trends': list(pollutant_trends),
+        'hourly_averages': hourly_averages
+    }
+
+
+def build_location_comparison(days, top=None, progress=None):
+    """Compare AQI across locations over the last `days` days, worst first"""
+    since = timezone.now() - timedelta(days=days)
+    
+    statuses = sorted(choice for choice, _ in AQICalculation.AQI_STATUS_CHOICES)
+    
+    # Per-location statistics and status counts in one grouped query,
+    # sorted by average AQI (worst first) in SQL
+    location_stats = AQICalculation.objects.filter(
+        calculated_at__gte=since
+    ).values(
+        location_id=F('sensor_reading__sensor__location'),
+        location_name=F('sensor_reading__sensor__location__name'),
+        location_city=F('sensor_reading__sensor__location__city'),
+        location_state=F('sensor_reading__sensor__location__state')
+    ).annotate(
+        avg_aqi=Avg('overall_aqi'),
+        max_aqi=Max('overall_aqi'),
+        min_aqi=Min('overall_aqi'),
+        count=Count('id'),
+        **{
+            f'status_{choice}': Count('id', filter=Q(aqi_status=choice))
+            for choice in statuses
+        }
+    ).order_by('-avg_aqi')
+    
+    if top:
+        location_stats = location_stats[:top]
+    location_stats = list(location_stats)
+    
+    _report_progress(progress, 0.7)
+    
+    # Active alert counts for the same locations in one grouped query
+    alert_counts = dict(
+        Alert.objects.filter(
+            sensor__location__in=[row['location_id'] for row in location_stats],
+            created_at__gte=since,
+            is_active=True
+        ).values('sensor__location').annotate(
+            count=Count('id')
+        ).order_by().values_list('sensor__location', 'count')
+    )
+    
+    location_comparisons = []
+    for row in location_stats:
+        location_comparisons.append({
+            'location': {
+                'id': row['location_id'],
+                'name': row['location_name'],
+                'city': row['location_city'],
+                'state': row['location_state']
+            },
+            'statistics': {
+                'avg_aqi': round(row['avg_aqi'], 2),
+                'max_aqi': round(row['max_aqi'], 2),
+                'min_aqi': round(row['min_aqi'], 2),
+                'reading_count': row['count']
+            },
+            'status_distribution': [
+                {'aqi_status': choice, 'count': row[f'status_{choice}']}
+                for choice in statuses if row[f'status_{choice}']
+            ],
+            'alert_count': alert_counts.get(row['location_id'], 0)
+        })
+    
+    return {
+        'timestamp': timezone.now(),
+        'period_days': days,
+        'locations': location_comparisons
+    }
+
+
+def build_location_breakdown(daily_rows, alert_counts):
+    """Roll per-location, per-day report rows up into per-location statistics"""
+    breakdown = {}
+    for row in daily_rows:
+        entry = breakdown.setdefault(row['location_id'], {
+            'sum_aqi': 0.0, 'max_aqi': None, 'min_aqi': None, 'count': 0,
+            'good_days': 0, 'moderate_days': 0, 'unhealthy_days': 0,
+        })
+        entry['sum_aqi'] += row['sum_aqi']
+        entry['count'] += row['count']
+        entry['max_aqi'] = row['max_aqi'] if entry['max_aqi'] is None else max(entry['max_aqi'], row['max_aqi'])
+        entry['min_aqi'] = row['min_aqi'] if entry['min_aqi'] is None else min(entry['min_aqi'], row['min_aqi'])
+        if row['max_aqi'] <= 50:
+            entry['good_days'] += 1
+        elif row['max_aqi'] <= 100:
+            entry['moderate_days'] += 1
+        else:
+            entry['unhealthy_days'] += 1
+    
+    names = dict(Location.objects.filter(pk__in=breakdown.keys()).values_list('pk', 'name'))
+    
+    locations = []
+    for location_id, entry in breakdown.items():
+        locations.append({
+            'location_id': location_id,
+            'location': names.get(location_id),
+            'average_aqi': round(entry['sum_aqi'] / entry['count'], 2),
+            'max_aqi': round(entry['max_aqi'], 2),
+            'min_aqi': round(entry['min_aqi'], 2),
+            'data_points': entry['count'],
+            'good_air_days': entry['good_days'],
+            'moderate_air_days': entry['moderate_days'],
+            'unhealthy_air_days': entry['unhealthy_days'],
+            'alert_count': alert_counts.get(location_id, 0)
+        })
+    
+    locations.sort(key=lambda item: item['average_aqi'], reverse=True)
+    return locations
+
+
+def build_report(report_type, days, location_id=None, progress=None):
+    """Build a summary or detailed AQI report over the last `days` days"""
+    since = timezone.now() - timedelta(days=days)
+    queryset = AQICalculation.objects.filter(calculated_at__gte=since)
+    
+    if location_id:
+        queryset = queryset.filter(sensor_reading__sensor__location_id=location_id)
+        location = Location.objects.get(id=location_id)
+        location_name = location.name
+    else:
+        location_name = "All Locations"
+    
+    # One scan grouped by location and local calendar day. The overall
+    # statistics roll up from these groups, and each group's daily max AQI
+    # classifies that location-day as good, moderate or unhealthy.
+    daily_rows = list(queryset.annotate(
+        day=TruncDate('calculated_at')
+    ).values(
+        'day', location_id=F('sensor_reading__sensor__location')
+    ).annotate(
+        sum_aqi=Sum('overall_aqi'),
+        max_aqi=Max('overall_aqi'),
+        min_aqi=Min('overall_aqi'),
+        count=Count('id')
+    ).order_by())
+    
+    total_readings = sum(row['count'] for row in daily_rows)
+    overall_stats = {
+        'avg_aqi': sum(row['sum_aqi'] for row in daily_rows) / total_readings if total_readings else None,
+        'max_aqi': max((row['max_aqi'] for row in daily_rows), default=None),
+        'min_aqi': min((row['min_aqi'] for row in daily_rows), default=None),
+        'total_readings': total_readings
+    }
+    
+    # Air quality days breakdown (location-days by daily max AQI)
+    good_days = sum(1 for row in daily_rows if row['max_aqi'] <= 50)
+    moderate_days = sum(1 for row in daily_rows if 50 < row['max_aqi'] <= 100)
+    unhealthy_days = sum(1 for row in daily_rows if row['max_aqi'] > 100)
+    
+    _report_progress(progress, 0.5)
+    
+    # Worst air quality days
+    worst_days = list(queryset.order_by('-overall_aqi')[:10].values(
+        'overall_aqi', 'aqi_status', 'dominant_pollutant', 
+        'calculated_at', 'sensor_reading__sensor__location__name'
+    ))
+    
+    # Pollutant analysis
+    pollutant_analysis = queryset.values('dominant_pollutant').annotate(
+        count=Count('id'),
+        avg_aqi=Avg('overall_aqi'),
+        max_aqi=Max('overall_aqi')
+    ).order_by('-count')
+    
+    _report_progress(progress, 0.8)
+    
+    # Alert counts per location in one grouped query
+    alerts = Alert.objects.filter(created_at__gte=since)
+    if location_id:
+        alerts = alerts.filter(sensor__location_id=location_id)
+    alert_counts = dict(
+        alerts.values('sensor__location').annotate(
+            count=Count('id')
+        ).order_by().values_list('sensor__location', 'count')
+    )
+    
+    # Health recommendations based on overall air quality
+    avg_aqi = overall_stats['avg_aqi'] or 0
+    if avg_aqi <= 50:
+        health_recommendation = "Air quality is generally good. No special precautions needed."
+    elif avg_aqi <= 100:
+        health_recommendation = "Air quality is moderate. Sensitive individuals should limit outdoor activities."
+    elif avg_aqi <= 150:
+        health_recommendation = "Air quality is unhealthy for sensitive groups. Consider wearing masks outdoors."
+    else:
+        health_recommendation = "Air quality is concerning. Everyone should limit outdoor activities and use air purifiers."
+    
+    report = {
+        'report_info': {
+            'type': report_type,
+            'period_days': days,
+            'location': location_name,
+            'generated_at': timezone.now(),
+            'data_points': overall_stats['total_readings']
+        },
+        'executive_summary': {
+            'average_aqi': round(avg_aqi, 2),
+            'max_aqi_recorded': round(overall_stats['max_aqi'] or 0, 2),
+            'monitored_location_days': len(daily_rows),
+            'good_air_days': good_days,
+            'moderate_air_days': moderate_days,
+            'unhealthy_air_days': unhealthy_days,
+            'health_recommendation': health_recommendation
+        },
+        'detailed_analysis': {
+            'pollutant_breakdown': list(pollutant_analysis),
+            'worst_air_quality_events': worst_days,
+            'alert_summary': {
+                'total_alerts': sum(alert_counts.values())
+            }
+        }
+    }
+    
+    if report_type == 'detailed':
+        report['detailed_analysis']['location_breakdown'] = build_location_breakdown(
+            daily_rows, alert_counts
+        )
+    
+    return report
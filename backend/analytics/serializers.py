@@ -0,0 +1,10 @@
+from rest_framework import serializers
+from .models import ReportResult
+
+class ReportResultSerializer(serializers.ModelSerializer):
+    """Serializer for analytics job status (the result payload is fetched separately)"""
+    
+    class Meta:
+        model = ReportResult
+        fields = ['id', 'job_type', 'params', 'status', 'progress', 'error',
+                 'created_at', 'started_at', 'completed_at', 'expires_at']
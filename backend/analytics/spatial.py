@@ -0,0 +1,48 @@
+"""
+Spatial interpolation of AQI over location coordinates
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def idw_grid(latitudes, longitudes, values, bbox, rows: int, cols: int, power: float = 2.0):
+    """
+    Inverse-distance-weighted AQI surface over a lat/lng bounding box
+
+    bbox is (min_lat, min_lng, max_lat, max_lng). Distances use an
+    equirectangular projection around the box centre, which is accurate at
+    city scale. Grid cells that coincide with a station take its value.
+    Returns (grid_latitudes, grid_longitudes, surface) where surface has shape
+    (rows, cols) with row 0 at min_lat.
+    """
+    min_lat, min_lng, max_lat, max_lng = bbox
+    grid_lat = np.linspace(min_lat, max_lat, rows)
+    grid_lng = np.linspace(min_lng, max_lng, cols)
+
+    scale = np.cos(np.radians((min_lat + max_lat) / 2))
+    station_x = np.radians(np.asarray(longitudes, dtype=np.float64)) * scale * EARTH_RADIUS_KM
+    station_y = np.radians(np.asarray(latitudes, dtype=np.float64)) * EARTH_RADIUS_KM
+    station_values = np.asarray(values, dtype=np.float64)
+
+    cell_x = np.radians(grid_lng) * scale * EARTH_RADIUS_KM
+    cell_y = np.radians(grid_lat) * EARTH_RADIUS_KM
+
+    # (rows, cols, stations) distances via broadcasting
+    dx = cell_x[np.newaxis, :, np.newaxis] - station_x[np.newaxis, np.newaxis, :]
+    dy = cell_y[:, np.newaxis, np.newaxis] - station_y[np.newaxis, np.newaxis, :]
+    distances = np.hypot(dx, dy)
+
+    # Weights relative to each cell's nearest station, (nearest / d) ** power, are
+    # proportional to 1 / d ** power but stay within [0, 1], so large powers or
+    # tiny distances can't overflow to inf and turn the surface into NaN
+    nearest = distances.min(axis=2, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = (nearest / distances) ** power
+    exact = distances == 0
+    if exact.any():
+        # A cell on top of a station takes that station's value
+        weights = np.where(exact.any(axis=2, keepdims=True), exact.astype(np.float64), weights)
+
+    surface = (weights * station_values).sum(axis=2) / weights.sum(axis=2)
+    return grid_lat, grid_lng, surface
@@ -0,0 +1,250 @@
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from monitoring.models import Location, Sensor, SensorReading
+from monitoring.sketches import update_aqi_sketch
+from . import jobs
+from .models import ReportResult
+from .spatial import idw_grid
+
+
+@override_settings(ANALYTICS_JOB_STALE_AFTER=300, ANALYTICS_JOB_RESULT_TTL=3600)
+class AnalyticsJobTests(TestCase):
+    """Job dedup, staleness and status transitions (jobs run inline, not on the pool)"""
+
+    def setUp(self):
+        executor = mock.patch.object(jobs, 'get_executor')
+        heartbeat = mock.patch.object(jobs, '_start_heartbeat')
+        self.executor = executor.start()
+        heartbeat.start()
+        self.addCleanup(executor.stop)
+        self.addCleanup(heartbeat.stop)
+
+    def test_identical_submissions_share_one_job(self):
+        first, created = jobs.submit_job('TREND', {'days': 7})
+        second, created_again = jobs.submit_job('TREND', {'days': '7', 'location': ''})
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(self.executor.return_value.submit.call_count, 1)
+
+    def test_different_params_get_different_jobs(self):
+        first, _ = jobs.submit_job('TREND', {'days': 7})
+        second, created = jobs.submit_job('TREND', {'days': 14})
+        self.assertTrue(created)
+        self.assertNotEqual(first.pk, second.pk)
+
+    def test_invalid_params_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            jobs.submit_job('COMPARISON', {'top': 0})
+        with self.assertRaises(ValueError):
+            jobs.submit_job('NOPE', {})
+
+    def test_database_constraint_allows_one_inflight_job_per_hash(self):
+        ReportResult.objects.create(job_type='TREND', params_hash='a' * 64, status='RUNNING')
+        with self.assertRaises(IntegrityError):
+            ReportResult.objects.create(job_type='TREND', params_hash='a' * 64)
+
+    def test_finished_jobs_do_not_block_a_new_submission(self):
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+        ReportResult.objects.filter(pk=job.pk).update(status='COMPLETED')
+        again, created = jobs.submit_job('TREND', {'days': 7})
+        self.assertTrue(created)
+        self.assertNotEqual(job.pk, again.pk)
+
+    def test_integrity_error_retries_when_competing_job_already_finished(self):
+        create = ReportResult.objects.create
+        calls = []
+
+        def racing_create(*args, **kwargs):
+            # The first insert loses to a job that finishes before we look for it
+            calls.append(1)
+            if len(calls) == 1:
+                raise IntegrityError('duplicate key')
+            return create(*args, **kwargs)
+
+        with mock.patch.object(ReportResult.objects, 'create', side_effect=racing_create):
+            job, created = jobs.submit_job('TREND', {'days': 7})
+
+        self.assertTrue(created)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(ReportResult.objects.filter(pk=job.pk, status='PENDING').exists())
+
+    def test_integrity_error_attaches_to_competing_inflight_job(self):
+        def racing_create(*args, **kwargs):
+            raise IntegrityError('duplicate key')
+
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+        with mock.patch.object(jobs.ReportResult.objects, 'select_for_update') as select:
+            select.return_value.filter.return_value.first.side_effect = [None, job]
+            with mock.patch.object(ReportResult.objects, 'create', side_effect=racing_create):
+                attached, created = jobs.submit_job('TREND', {'days': 7})
+        self.assertFalse(created)
+        self.assertEqual(attached.pk, job.pk)
+
+    def test_pending_job_with_recent_heartbeat_is_not_stale(self):
+        old = timezone.now() - timedelta(hours=2)
+        job = ReportResult.objects.create(job_type='TREND', params_hash='b' * 64, heartbeat_at=timezone.now())
+        ReportResult.objects.filter(pk=job.pk).update(created_at=old)
+        jobs.fail_stale_jobs()
+        self.assertEqual(ReportResult.objects.get(pk=job.pk).status, 'PENDING')
+
+    def test_long_running_job_with_recent_heartbeat_is_not_stale(self):
+        old = timezone.now() - timedelta(hours=2)
+        job = ReportResult.objects.create(
+            job_type='TREND', params_hash='c' * 64, status='RUNNING', started_at=old, heartbeat_at=timezone.now()
+        )
+        jobs.fail_stale_jobs()
+        self.assertEqual(ReportResult.objects.get(pk=job.pk).status, 'RUNNING')
+
+    def test_job_with_silent_heartbeat_is_failed(self):
+        job = ReportResult.objects.create(
+            job_type='TREND', params_hash='d' * 64, status='RUNNING',
+            heartbeat_at=timezone.now() - timedelta(seconds=301)
+        )
+        jobs.fail_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertIsNotNone(job.expires_at)
+
+    def test_run_job_completes_pending_job(self):
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+        with mock.patch.object(jobs, '_run_builder', return_value={'ok': 1}):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(job.result, {'ok': 1})
+        self.assertEqual(job.progress, 1.0)
+        self.assertNotIn(job.pk, jobs._owned)
+
+    def test_run_job_does_not_resurrect_failed_job(self):
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+        ReportResult.objects.filter(pk=job.pk).update(status='FAILED')
+        with mock.patch.object(jobs, '_run_builder') as builder:
+            jobs.run_job(job.pk)
+        builder.assert_not_called()
+        self.assertEqual(ReportResult.objects.get(pk=job.pk).status, 'FAILED')
+
+    def test_job_failed_while_running_keeps_its_failure(self):
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+
+        def builder(job_type, params, progress):
+            ReportResult.objects.filter(pk=job.pk).update(status='FAILED', error='interrupted')
+            return {'ok': 1}
+
+        with mock.patch.object(jobs, '_run_builder', side_effect=builder):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.error, 'interrupted')
+        self.assertIsNone(job.result)
+
+    def test_progress_stops_the_job_once_its_row_is_gone(self):
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+        reached = []
+
+        def builder(job_type, params, progress):
+            progress(0.5)
+            ReportResult.objects.filter(pk=job.pk).delete()
+            progress(0.9)
+            reached.append('end')
+            return {}
+
+        with mock.patch.object(jobs, '_run_builder', side_effect=builder):
+            jobs.run_job(job.pk)
+        self.assertEqual(reached, [])
+        self.assertFalse(ReportResult.objects.filter(pk=job.pk).exists())
+
+    def test_builder_error_marks_job_failed(self):
+        job, _ = jobs.submit_job('TREND', {'days': 7})
+        with mock.patch.object(jobs, '_run_builder', side_effect=RuntimeError('boom')):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.error, 'boom')
+
+
+class AQIPercentilesViewTests(TestCase):
+    """Query validation and output of the sketch-backed percentile endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.location = Location.objects.create(name='Percentile Park', city='Testville', state='TS')
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        for aqi in range(1, 101):
+            update_aqi_sketch(self.location.pk, hour, aqi)
+
+    def test_non_numeric_quantiles_are_rejected(self):
+        response = self.client.get('/api/v1/analytics/percentiles/', {'quantiles': '0.5,abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantiles', response.json()['error'])
+
+    def test_out_of_range_quantiles_are_rejected(self):
+        response = self.client.get('/api/v1/analytics/percentiles/', {'quantiles': '1.5'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_window_percentiles(self):
+        response = self.client.get('/api/v1/analytics/percentiles/', {'group': 'window', 'quantiles': '0.5,0.9'})
+        self.assertEqual(response.status_code, 200)
+        entry = response.json()['locations'][0]
+        self.assertEqual(entry['count'], 100)
+        self.assertAlmostEqual(entry['p50'], 50.5, delta=1)
+        self.assertAlmostEqual(entry['p90'], 90.5, delta=1)
+
+
+class IDWGridTests(SimpleTestCase):
+    """Inverse-distance weighting against hand-computed values"""
+
+    def test_midpoint_between_two_stations_is_their_mean(self):
+        _, _, surface = idw_grid([0.0, 0.0], [0.0, 0.2], [50, 150], (0.0, 0.0, 0.2, 0.2), 3, 3)
+        self.assertAlmostEqual(surface[0][1], 100.0)
+
+    def test_station_cells_take_the_station_value(self):
+        _, _, surface = idw_grid([0.0, 0.0], [0.0, 0.2], [50, 150], (0.0, 0.0, 0.2, 0.2), 3, 3)
+        self.assertEqual(surface[0][0], 50.0)
+        self.assertEqual(surface[0][2], 150.0)
+
+    def test_power_controls_the_weights(self):
+        # Cell (0, 0.1) with stations at 0.05 and 0.2 (1:2 distance): weights 1 and 1/2**p
+        _, _, surface = idw_grid([0.0, 0.0], [0.05, 0.2], [40, 160], (0.0, 0.0, 0.2, 0.2), 3, 3, power=1)
+        self.assertAlmostEqual(surface[0][1], (40 + 160 / 2) / 1.5)
+        _, _, surface = idw_grid([0.0, 0.0], [0.05, 0.2], [40, 160], (0.0, 0.0, 0.2, 0.2), 3, 3, power=3)
+        self.assertAlmostEqual(surface[0][1], (40 + 160 / 8) / 1.125)
+
+    def test_extreme_power_stays_finite(self):
+        _, _, surface = idw_grid([0.0, 0.0], [0.05, 0.2], [40, 160], (0.0, 0.0, 0.2, 0.2), 3, 3, power=1000)
+        self.assertTrue(np.isfinite(surface).all())
+        self.assertAlmostEqual(surface[0][1], 40.0)
+
+
+@override_settings(REALTIME_PUBLISH=False)
+class AQIHeatmapViewTests(TestCase):
+    """Query validation of the heatmap endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        for index, (latitude, pm25) in enumerate(((10.0, 5.0), (10.2, 80.0))):
+            location = Location.objects.create(
+                name=f'Heat Park {index}', city='Testville', state='TS', latitude=latitude, longitude=20.0
+            )
+            sensor = Sensor.objects.create(sensor_id=f'SENSOR_H{index}', location=location)
+            SensorReading.objects.create(sensor=sensor, pm25=pm25, pm10=10.0, co=0.2, no2=5.0, so2=1.0, o3=10.0)
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'power': 'abc'}, {'power': 'nan'}, {'resolution': 'x'}, {'bbox': '1,2,3'}, {'bbox': '3,2,1,4'}):
+            response = self.client.get('/api/v1/analytics/heatmap/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_power_is_clamped(self):
+        response = self.client.get('/api/v1/analytics/heatmap/', {'power': '1000', 'resolution': 5})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['power'], 6.0)
+        self.assertTrue(all(value is not None for row in body['values'] for value in row))
+        self.assertEqual(self.client.get('/api/v1/analytics/heatmap/', {'power': '0'}).json()['power'], 0.5)
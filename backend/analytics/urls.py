@@ -7,4 +7,13 @@ urlpatterns = [
     path('reports/', views.generate_report, name='generate_report'),
     path('comparisons/', views.location_comparison, name='location_comparison'),
     path('forecasts/', views.aqi_forecast, name='aqi_forecast'),
+    path('percentiles/', views.aqi_percentiles, name='aqi_percentiles'),
+    path('heatmap/', views.aqi_heatmap, name='aqi_heatmap'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('exports/readings/', views.export_readings, name='export_readings'),
+    path('exports/daily/', views.export_daily_summary, name='export_daily_summary'),
+    path('jobs/', views.create_analytics_job, name='create_analytics_job'),
+    path('jobs/<uuid:job_id>/', views.analytics_job_status, name='analytics_job_status'),
+    path('jobs/<uuid:job_id>/result/', views.analytics_job_result, name='analytics_job_result'),
+    path('jobs/<uuid:job_id>/events/', views.analytics_job_events, name='analytics_job_events'),
 ]
\ No newline at end of file
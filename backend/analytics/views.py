@@ -1,18 +1,40 @@
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework import status
+from django.conf import settings
+from django.http import StreamingHttpResponse, Http404, JsonResponse
+from django.utils.dateparse import parse_datetime
 from django.utils import timezone
-from django.db.models import Avg, Max, Min, Count, Q
+from django.db.models import Avg, Max, Min, Count, Q, OuterRef, Subquery
+from django.db.models.functions import TruncHour, TruncDate
 from datetime import timedelta, datetime
-from monitoring.models import Location, AQICalculation, Alert, SensorReading
+from monitoring.models import Location, AQICalculation, Alert, SensorReading, ForecastState, AQISketch
+from monitoring.forecasting import forecast_from_state, status_for_aqi
+from monitoring.sketches import merge_sketches, quantiles_of
+from monitoring.conditional import conditional_on_ingest
+from monitoring.response_cache import cached_response, get_cache_stats
+from monitoring.streaming import encode_json
+from monitoring.export import streaming_export_response
 from collections import defaultdict
+from .reports import build_trend_analysis, build_location_comparison, build_report
+from .models import ReportResult
+from .serializers import ReportResultSerializer
+from .jobs import submit_job
+from .spatial import idw_grid
+import asyncio
+import math
+import time
 
 @api_view(['GET'])
+@conditional_on_ingest(max_age=settings.ANALYTICS_WINDOW_REFRESH)
 def dashboard_analytics(request):
     """Get comprehensive dashboard analytics"""
     try:
         # Time period filter
         hours = int(request.query_params.get('hours', 24))
-        since = timezone.now() - timedelta(hours=hours)
+        now = timezone.now()
+        since = now - timedelta(hours=hours)
         
         # Overall statistics
         recent_calculations = AQICalculation.objects.filter(calculated_at__gte=since)
@@ -30,12 +52,18 @@ def dashboard_analytics(request):
             percentage=Count('id') * 100.0 / Count('*')
         ).order_by('aqi_status')
         
-        # Location-wise current status
+        # Location-wise current status (latest calculation per location in one query)
+        latest_calc_ids = AQICalculation.objects.filter(
+            sensor_reading__sensor__location=OuterRef('pk')
+        ).order_by('-calculated_at').values('pk')[:1]
+        locations = list(Location.objects.annotate(latest_calc_id=Subquery(latest_calc_ids)))
+        latest_calcs = AQICalculation.objects.in_bulk(
+            [location.latest_calc_id for location in locations if location.latest_calc_id]
+        )
+        
         location_status = []
-        for location in Location.objects.all():
-            latest_calc = AQICalculation.objects.filter(
-                sensor_reading__sensor__location=location
-            ).first()
+        for location in locations:
+            latest_calc = latest_calcs.get(location.latest_calc_id)
             
             if latest_calc:
                 location_status.append({
@@ -59,21 +87,28 @@ def dashboard_analytics(request):
             ))
         }
         
-        # Hourly trends
+        # Hourly trends: one grouped query, gap-filled into a rolling series
+        hourly_stats = {
+            row['bucket']: row
+            for row in recent_calculations.annotate(
+                bucket=TruncHour('calculated_at')
+            ).values('bucket').annotate(
+                avg_aqi=Avg('overall_aqi'),
+                count=Count('id')
+            ).order_by('bucket')
+        }
+        
         hourly_trends = []
-        for i in range(24):
-            hour_start = timezone.now().replace(hour=i, minute=0, second=0, microsecond=0)
-            hour_end = hour_start + timedelta(hours=1)
-            
-            hour_avg = recent_calculations.filter(
-                calculated_at__gte=hour_start,
-                calculated_at__lt=hour_end
-            ).aggregate(avg_aqi=Avg('overall_aqi'))
-            
+        bucket = since.replace(minute=0, second=0, microsecond=0)
+        while bucket <= now:
+            stats = hourly_stats.get(bucket, {})
             hourly_trends.append({
-                'hour': i,
-                'avg_aqi': round(hour_avg['avg_aqi'] or 0, 2)
+                'timestamp': bucket,
+                'hour': bucket.hour,
+                'avg_aqi': round(stats.get('avg_aqi') or 0, 2),
+                'reading_count': stats.get('count', 0)
             })
+            bucket += timedelta(hours=1)
         
         return Response({
             'timestamp': timezone.now(),
@@ -89,139 +124,38 @@ def dashboard_analytics(request):
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
+@cached_response('trend_analysis')
 def trend_analysis(request):
     """Analyze AQI trends over time"""
     try:
         days = int(request.query_params.get('days', 7))
         location_id = request.query_params.get('location')
         
-        since = timezone.now() - timedelta(days=days)
-        queryset = AQICalculation.objects.filter(calculated_at__gte=since)
-        
-        if location_id:
-            queryset = queryset.filter(sensor_reading__sensor__location_id=location_id)
-        
-        # Daily trends
-        daily_trends = []
-        for i in range(days):
-            day = timezone.now().date() - timedelta(days=i)
-            day_start = timezone.datetime.combine(day, timezone.datetime.min.time())
-            day_end = day_start + timedelta(days=1)
-            
-            day_calcs = queryset.filter(
-                calculated_at__gte=day_start,
-                calculated_at__lt=day_end
-            )
-            
-            daily_stats = day_calcs.aggregate(
-                avg_aqi=Avg('overall_aqi'),
-                max_aqi=Max('overall_aqi'),
-                min_aqi=Min('overall_aqi'),
-                count=Count('id')
-            )
-            
-            daily_trends.append({
-                'date': day.isoformat(),
-                'avg_aqi': round(daily_stats['avg_aqi'] or 0, 2),
-                'max_aqi': round(daily_stats['max_aqi'] or 0, 2),
-                'min_aqi': round(daily_stats['min_aqi'] or 0, 2),
-                'reading_count': daily_stats['count']
-            })
-        
-        # Pollutant trends
-        pollutant_trends = queryset.values('dominant_pollutant').annotate(
-            count=Count('id'),
-            avg_aqi=Avg('overall_aqi')
-        ).order_by('-count')
-        
-        # Peak pollution hours
-        hourly_averages = []
-        for hour in range(24):
-            hour_avg = queryset.filter(
-                calculated_at__hour=hour
-            ).aggregate(avg_aqi=Avg('overall_aqi'))
-            
-            hourly_averages.append({
-                'hour': hour,
-                'avg_aqi': round(hour_avg['avg_aqi'] or 0, 2)
-            })
-        
-        return Response({
-            'timestamp': timezone.now(),
-            'period_days': days,
-            'daily_trends': daily_trends,
-            'pollutant_trends': list(pollutant_trends),
-            'hourly_averages': hourly_averages
-        })
+        return Response(build_trend_analysis(days, location_id))
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
+@cached_response('location_comparison')
 def location_comparison(request):
     """Compare AQI across different locations"""
     try:
         days = int(request.query_params.get('days', 7))
-        since = timezone.now() - timedelta(days=days)
+        top = request.query_params.get('top')
         
-        location_comparisons = []
+        if top:
+            if not top.isdigit() or int(top) < 1:
+                return Response({'error': "'top' must be a positive integer"}, status=400)
+            top = int(top)
         
-        for location in Location.objects.all():
-            location_calcs = AQICalculation.objects.filter(
-                sensor_reading__sensor__location=location,
-                calculated_at__gte=since
-            )
-            
-            if location_calcs.exists():
-                stats = location_calcs.aggregate(
-                    avg_aqi=Avg('overall_aqi'),
-                    max_aqi=Max('overall_aqi'),
-                    min_aqi=Min('overall_aqi'),
-                    count=Count('id')
-                )
-                
-                # Status distribution for this location
-                status_dist = location_calcs.values('aqi_status').annotate(
-                    count=Count('id')
-                ).order_by('aqi_status')
-                
-                # Alert count
-                alert_count = Alert.objects.filter(
-                    sensor__location=location,
-                    created_at__gte=since,
-                    is_active=True
-                ).count()
-                
-                location_comparisons.append({
-                    'location': {
-                        'id': location.id,
-                        'name': location.name,
-                        'city': location.city,
-                        'state': location.state
-                    },
-                    'statistics': {
-                        'avg_aqi': round(stats['avg_aqi'], 2),
-                        'max_aqi': round(stats['max_aqi'], 2),
-                        'min_aqi': round(stats['min_aqi'], 2),
-                        'reading_count': stats['count']
-                    },
-                    'status_distribution': list(status_dist),
-                    'alert_count': alert_count
-                })
-        
-        # Sort by average AQI (worst first)
-        location_comparisons.sort(key=lambda x: x['statistics']['avg_aqi'], reverse=True)
-        
-        return Response({
-            'timestamp': timezone.now(),
-            'period_days': days,
-            'locations': location_comparisons
-        })
+        return Response(build_location_comparison(days, top=top))
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
+@cached_response('generate_report')
 def generate_report(request):
     """Generate comprehensive AQI report"""
     try:
@@ -229,162 +163,392 @@ def generate_report(request):
         days = int(request.query_params.get('days', 30))
         location_id = request.query_params.get('location')
         
-        since = timezone.now() - timedelta(days=days)
-        queryset = AQICalculation.objects.filter(calculated_at__gte=since)
-        
-        if location_id:
-            queryset = queryset.filter(sensor_reading__sensor__location_id=location_id)
-            location = Location.objects.get(id=location_id)
-            location_name = location.name
-        else:
-            location_name = "All Locations"
-        
-        # Basic statistics
-        overall_stats = queryset.aggregate(
-            avg_aqi=Avg('overall_aqi'),
-            max_aqi=Max('overall_aqi'),
-            min_aqi=Min('overall_aqi'),
-            total_readings=Count('id')
-        )
-        
-        # Air quality days breakdown
-        good_days = queryset.filter(overall_aqi__lte=50).count()
-        moderate_days = queryset.filter(overall_aqi__gt=50, overall_aqi__lte=100).count()
-        unhealthy_days = queryset.filter(overall_aqi__gt=100).count()
-        
-        # Worst air quality days
-        worst_days = list(queryset.order_by('-overall_aqi')[:10].values(
-            'overall_aqi', 'aqi_status', 'dominant_pollutant', 
-            'calculated_at', 'sensor_reading__sensor__location__name'
-        ))
-        
-        # Pollutant analysis
-        pollutant_analysis = queryset.values('dominant_pollutant').annotate(
-            count=Count('id'),
-            avg_aqi=Avg('overall_aqi'),
-            max_aqi=Max('overall_aqi')
-        ).order_by('-count')
-        
-        # Health recommendations based on overall air quality
-        avg_aqi = overall_stats['avg_aqi'] or 0
-        if avg_aqi <= 50:
-            health_recommendation = "Air quality is generally good. No special precautions needed."
-        elif avg_aqi <= 100:
-            health_recommendation = "Air quality is moderate. Sensitive individuals should limit outdoor activities."
-        elif avg_aqi <= 150:
-            health_recommendation = "Air quality is unhealthy for sensitive groups. Consider wearing masks outdoors."
-        else:
-            health_recommendation = "Air quality is concerning. Everyone should limit outdoor activities and use air purifiers."
-        
-        report = {
-            'report_info': {
-                'type': report_type,
-                'period_days': days,
-                'location': location_name,
-                'generated_at': timezone.now(),
-                'data_points': overall_stats['total_readings']
-            },
-            'executive_summary': {
-                'average_aqi': round(avg_aqi, 2),
-                'max_aqi_recorded': round(overall_stats['max_aqi'] or 0, 2),
-                'good_air_days': good_days,
-                'moderate_air_days': moderate_days,
-                'unhealthy_air_days': unhealthy_days,
-                'health_recommendation': health_recommendation
-            },
-            'detailed_analysis': {
-                'pollutant_breakdown': list(pollutant_analysis),
-                'worst_air_quality_events': worst_days,
-                'alert_summary': {
-                    'total_alerts': Alert.objects.filter(
-                        created_at__gte=since
-                    ).count() if not location_id else Alert.objects.filter(
-                        sensor__location_id=location_id,
-                        created_at__gte=since
-                    ).count()
-                }
-            }
-        }
-        
-        return Response(report)
+        return Response(build_report(report_type, days, location_id))
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])  
 def aqi_forecast(request):
-    """Simple AQI forecasting based on historical trends"""
+    """AQI forecast from each location's incrementally maintained Holt-Winters state"""
     try:
         location_id = request.query_params.get('location')
-        days_history = int(request.query_params.get('history_days', 7))
+        horizon = min(int(request.query_params.get('horizon', 24)), settings.FORECAST_MAX_HORIZON)
         
-        # Get historical data
-        since = timezone.now() - timedelta(days=days_history)
+        states = ForecastState.objects.all()
         if location_id:
-            historical_data = AQICalculation.objects.filter(
-                sensor_reading__sensor__location_id=location_id,
-                calculated_at__gte=since
-            ).order_by('calculated_at')
-        else:
-            historical_data = AQICalculation.objects.filter(
-                calculated_at__gte=since
-            ).order_by('calculated_at')
-        
-        if not historical_data.exists():
-            return Response({'error': 'Insufficient historical data'}, status=400)
-        
-        # Simple moving average forecast (can be enhanced with ML models)
-        recent_values = list(historical_data.values_list('overall_aqi', flat=True)[-24:])  # Last 24 readings
-        
-        if len(recent_values) < 5:
-            return Response({'error': 'Need at least 5 recent readings'}, status=400)
-        
-        # Calculate trend
-        moving_avg = sum(recent_values) / len(recent_values)
-        trend = (recent_values[-1] - recent_values[0]) / len(recent_values)
-        
-        # Generate 24-hour forecast
+            states = states.filter(location_id=location_id)
+        
+        # Forecast each location from its persisted state (no history scan)
+        forecasts = []
+        trends = []
+        observations = []
+        for state in states:
+            forecast = forecast_from_state(state, horizon)
+            if forecast and state.observations >= 5:
+                forecasts.append(forecast)
+                trends.append(state.trend)
+                observations.append(state.observations)
+        
+        if not forecasts:
+            return Response({'error': 'Need at least 5 hours of recent AQI history'}, status=400)
+        
+        # Fleet-wide forecast is the mean of the per-location forecasts
         forecast = []
-        for i in range(24):
-            forecast_time = timezone.now() + timedelta(hours=i+1)
-            predicted_aqi = max(0, moving_avg + (trend * i))
-            
-            # Add some seasonal/hourly adjustments (simplified)
-            hour = forecast_time.hour
-            if 7 <= hour <= 10 or 17 <= hour <= 20:  # Rush hours
-                predicted_aqi *= 1.2
-            elif 22 <= hour or hour <= 5:  # Night time
-                predicted_aqi *= 0.8
-                
-            # Determine predicted status
-            if predicted_aqi <= 50:
-                status = 'GOOD'
-            elif predicted_aqi <= 100:
-                status = 'MODERATE'
-            elif predicted_aqi <= 150:
-                status = 'UNHEALTHY_SG'
-            elif predicted_aqi <= 200:
-                status = 'UNHEALTHY'
-            elif predicted_aqi <= 300:
-                status = 'VERY_UNHEALTHY'
-            else:
-                status = 'HAZARDOUS'
+        for points in zip(*forecasts):
+            predicted_aqi = sum(point['value'] for point in points) / len(points)
+            lower = sum(point['lower'] for point in points) / len(points)
+            upper = sum(point['upper'] for point in points) / len(points)
             
             forecast.append({
-                'timestamp': forecast_time,
+                'timestamp': points[0]['timestamp'],
                 'predicted_aqi': round(predicted_aqi, 1),
-                'predicted_status': status,
-                'confidence': max(0.3, 1.0 - (i * 0.02))  # Decreasing confidence over time
+                'predicted_status': status_for_aqi(predicted_aqi),
+                'lower_bound': round(lower, 1),
+                'upper_bound': round(upper, 1),
+                # Narrower prediction intervals mean higher confidence
+                'confidence': round(max(0.3, 1.0 - (upper - lower) / (2 * max(predicted_aqi, 1.0))), 2)
             })
         
+        trend = sum(trends) / len(trends)
         return Response({
             'timestamp': timezone.now(),
-            'forecast_period': '24 hours',
-            'based_on_days': days_history,
-            'current_trend': 'improving' if trend < 0 else 'worsening' if trend > 0 else 'stable',
+            'forecast_period': f'{horizon} hours',
+            'based_on_hours': min(observations),
+            'locations': len(forecasts),
+            'current_trend': 'improving' if trend < -0.1 else 'worsening' if trend > 0.1 else 'stable',
             'forecast': forecast,
             'disclaimer': 'This is a simple statistical forecast. Actual conditions may vary due to weather and other factors.'
         })
         
     except Exception as e:
-        return Response({'error': str(e)}, status=500)
\ No newline at end of file
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@cached_response('aqi_percentiles')
+def aqi_percentiles(request):
+    """AQI percentiles per location per day (or over the whole window) from hourly sketches"""
+    try:
+        quantiles = [
+            float(q) for q in request.query_params.get('quantiles', '0.5,0.95,0.98').split(',')
+        ]
+    except ValueError:
+        return Response({'error': "'quantiles' must be a comma-separated list of numbers"}, status=400)
+    
+    try:
+        days = int(request.query_params.get('days', 7))
+        location_id = request.query_params.get('location')
+        group = request.query_params.get('group', 'day')  # day, window
+        
+        if group not in ('day', 'window'):
+            return Response({'error': "'group' must be 'day' or 'window'"}, status=400)
+        if not all(0 <= q <= 1 for q in quantiles):
+            return Response({'error': 'Quantiles must be between 0 and 1'}, status=400)
+        
+        since = timezone.now() - timedelta(days=days)
+        sketches = AQISketch.objects.filter(hour__gte=since).select_related('location')
+        if location_id:
+            sketches = sketches.filter(location_id=location_id)
+        
+        # Merge hourly sketches per (location, day) or per location
+        buckets = defaultdict(list)
+        for sketch in sketches.order_by('location__name', 'hour'):
+            key = timezone.localtime(sketch.hour).date() if group == 'day' else None
+            buckets[(sketch.location, key)].append(sketch)
+        
+        locations = {}
+        for (location, key), members in buckets.items():
+            entry = locations.setdefault(location.id, {
+                'location_id': location.id,
+                'location': location.name,
+                'city': location.city,
+            })
+            summary = quantiles_of(merge_sketches(members), quantiles)
+            if group == 'day':
+                entry.setdefault('days', []).append({'date': key, **summary})
+            else:
+                entry.update(summary)
+        
+        return Response({
+            'timestamp': timezone.now(),
+            'period_days': days,
+            'group': group,
+            'quantiles': quantiles,
+            'locations': list(locations.values())
+        })
+        
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@cached_response('aqi_heatmap')
+def aqi_heatmap(request):
+    """Gridded AQI surface interpolated (IDW) from the latest AQI at each location"""
+    try:
+        rows = cols = int(request.query_params.get('resolution', settings.HEATMAP_DEFAULT_RESOLUTION))
+    except ValueError:
+        return Response({'error': "'resolution' must be an integer"}, status=400)
+    try:
+        power = float(request.query_params.get('power', 2))
+    except ValueError:
+        return Response({'error': "'power' must be a number"}, status=400)
+    if not math.isfinite(power):
+        return Response({'error': "'power' must be a number"}, status=400)
+    # Larger exponents only snap every cell to its nearest station
+    power = min(max(power, settings.HEATMAP_MIN_POWER), settings.HEATMAP_MAX_POWER)
+    bbox = request.query_params.get('bbox')  # min_lat,min_lng,max_lat,max_lng
+    if bbox:
+        try:
+            min_lat, min_lng, max_lat, max_lng = [float(value) for value in bbox.split(',')]
+        except ValueError:
+            return Response({'error': 'bbox must be min_lat,min_lng,max_lat,max_lng'}, status=400)
+        finite = all(math.isfinite(value) for value in (min_lat, min_lng, max_lat, max_lng))
+        if not finite or min_lat >= max_lat or min_lng >= max_lng:
+            return Response({'error': 'bbox must be min_lat,min_lng,max_lat,max_lng'}, status=400)
+    
+    try:
+        if not 2 <= rows <= settings.HEATMAP_MAX_RESOLUTION:
+            return Response(
+                {'error': f'resolution must be between 2 and {settings.HEATMAP_MAX_RESOLUTION}'},
+                status=400
+            )
+        
+        # Latest calculation per located site in one query
+        latest_calc_ids = AQICalculation.objects.filter(
+            sensor_reading__sensor__location=OuterRef('pk')
+        ).order_by('-calculated_at').values('pk')[:1]
+        locations = list(Location.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).annotate(latest_calc_id=Subquery(latest_calc_ids)))
+        latest_calcs = AQICalculation.objects.in_bulk(
+            [location.latest_calc_id for location in locations if location.latest_calc_id]
+        )
+        
+        stations = [
+            {
+                'location': location.name,
+                'latitude': location.latitude,
+                'longitude': location.longitude,
+                'aqi': latest_calcs[location.latest_calc_id].overall_aqi,
+                'timestamp': latest_calcs[location.latest_calc_id].calculated_at
+            }
+            for location in locations if location.latest_calc_id in latest_calcs
+        ]
+        
+        if not stations:
+            return Response({'error': 'No located AQI data available'}, status=400)
+        
+        if not bbox:
+            # Default to the stations' extent with a 10% margin
+            lats = [station['latitude'] for station in stations]
+            lngs = [station['longitude'] for station in stations]
+            lat_margin = max((max(lats) - min(lats)) * 0.1, 0.05)
+            lng_margin = max((max(lngs) - min(lngs)) * 0.1, 0.05)
+            min_lat, max_lat = min(lats) - lat_margin, max(lats) + lat_margin
+            min_lng, max_lng = min(lngs) - lng_margin, max(lngs) + lng_margin
+        
+        grid_lat, grid_lng, surface = idw_grid(
+            [station['latitude'] for station in stations],
+            [station['longitude'] for station in stations],
+            [station['aqi'] for station in stations],
+            (min_lat, min_lng, max_lat, max_lng),
+            rows, cols, power
+        )
+        
+        return Response({
+            'timestamp': timezone.now(),
+            'method': 'idw',
+            'power': power,
+            'bbox': {'min_lat': min_lat, 'min_lng': min_lng, 'max_lat': max_lat, 'max_lng': max_lng},
+            'rows': rows,
+            'cols': cols,
+            'latitudes': grid_lat.round(5).tolist(),
+            'longitudes': grid_lng.round(5).tolist(),
+            'values': surface.round(1).tolist(),  # values[row][col], row 0 at min_lat
+            'stations': stations
+        })
+        
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Get response cache hit rates for this worker process"""
+    return Response({
+        'timestamp': timezone.now(),
+        'backend': settings.CACHES['default']['BACKEND'],
+        'ttls': settings.RESPONSE_CACHE_TTLS,
+        'endpoints': get_cache_stats()
+    })
+
+@api_view(['POST'])
+def create_analytics_job(request):
+    """Queue a report, comparison or trend computation to run in the background"""
+    job_type = str(request.data.get('type', '')).upper()
+    params = request.data.get('params', {})
+    
+    try:
+        job, created = submit_job(job_type, params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = ReportResultSerializer(job).data
+    data['deduplicated'] = not created
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+def analytics_job_status(request, job_id):
+    """Get the status and progress of a background analytics job"""
+    try:
+        job = ReportResult.objects.get(pk=job_id)
+    except ReportResult.DoesNotExist:
+        return Response({'error': 'Job not found or expired'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(ReportResultSerializer(job).data)
+
+@api_view(['GET'])
+def analytics_job_result(request, job_id):
+    """Get the result of a completed background analytics job"""
+    try:
+        job = ReportResult.objects.get(pk=job_id)
+    except ReportResult.DoesNotExist:
+        return Response({'error': 'Job not found or expired'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status == 'COMPLETED':
+        return Response(job.result)
+    if job.status == 'FAILED':
+        return Response({'error': job.error}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    # Still pending or running
+    return Response(ReportResultSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+def _job_event_state(job_id):
+    """Serialized job for an event stream poll, or None once it is gone"""
+    job = ReportResult.objects.filter(pk=job_id).first()
+    return ReportResultSerializer(job).data if job is not None else None
+
+def analytics_job_events(request, job_id):
+    """Stream job progress as server-sent events until the job finishes"""
+    if not ReportResult.objects.filter(pk=job_id).exists():
+        raise Http404('Job not found or expired')
+    
+    async def event_stream():
+        last_state = None
+        deadline = time.monotonic() + settings.ANALYTICS_JOB_STREAM_TIMEOUT
+        while True:
+            data = await sync_to_async(_job_event_state)(job_id)
+            if data is None:
+                yield 'event: error\ndata: {"error": "Job not found or expired"}\n\n'
+                return
+            
+            state = (data['status'], data['progress'])
+            if state != last_state:
+                yield f'event: progress\ndata: {encode_json(data)}\n\n'
+                last_state = state
+            
+            if data['status'] in ('COMPLETED', 'FAILED'):
+                return
+            if time.monotonic() >= deadline:
+                # Clients reconnect (or poll the job) if they still care
+                yield 'event: timeout\ndata: {"error": "Event stream timed out; the job is still running"}\n\n'
+                return
+            await asyncio.sleep(settings.ANALYTICS_JOB_POLL_INTERVAL)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _query_list(request, name):
+    """Values of a repeatable and/or comma-separated query param"""
+    return [value for raw in request.GET.getlist(name) for value in raw.split(',') if value]
+
+def _export_window(request):
+    """Parse ?start=&end= (ISO 8601) or ?hours= into an aware (start, end) range"""
+    end = parse_datetime(request.GET['end']) if request.GET.get('end') else timezone.now()
+    if request.GET.get('start'):
+        start = parse_datetime(request.GET['start'])
+    else:
+        start = end - timedelta(hours=int(request.GET.get('hours', 24))) if end else None
+    
+    if start is None or end is None:
+        raise ValueError("'start' and 'end' must be ISO 8601 datetimes")
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if start >= end:
+        raise ValueError("'start' must be before 'end'")
+    return start, end
+
+# values_list() lookups and CSV/XLSX column headers for reading exports
+EXPORT_READING_FIELDS = (
+    'timestamp', 'sensor__sensor_id', 'sensor__location__name',
+    'pm25', 'pm10', 'co', 'no2', 'so2', 'o3',
+    'temperature', 'humidity', 'wind_speed', 'wind_direction',
+    'aqi_calculation__overall_aqi', 'aqi_calculation__aqi_status', 'aqi_calculation__dominant_pollutant',
+)
+EXPORT_READING_HEADER = (
+    'timestamp', 'sensor_id', 'location',
+    'pm25', 'pm10', 'co', 'no2', 'so2', 'o3',
+    'temperature', 'humidity', 'wind_speed', 'wind_direction',
+    'aqi', 'aqi_status', 'dominant_pollutant',
+)
+
+def export_readings(request):
+    """Stream raw readings with their AQI as CSV or XLSX (?output=csv|xlsx)"""
+    output = request.GET.get('output', 'csv')
+    if output not in ('csv', 'xlsx'):
+        return JsonResponse({'error': "'output' must be 'csv' or 'xlsx'"}, status=400)
+    try:
+        start, end = _export_window(request)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    queryset = SensorReading.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    locations = _query_list(request, 'location')
+    sensors = _query_list(request, 'sensor')
+    if locations:
+        queryset = queryset.filter(sensor__location_id__in=locations)
+    if sensors:
+        queryset = queryset.filter(sensor__sensor_id__in=sensors)
+    
+    # Server-side cursor: memory stays flat regardless of the range
+    rows = queryset.order_by('timestamp').values_list(*EXPORT_READING_FIELDS).iterator(
+        chunk_size=settings.STREAMING_CHUNK_SIZE
+    )
+    filename = f"aqi_readings_{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}"
+    return streaming_export_response(request, filename, EXPORT_READING_HEADER, rows, output)
+
+def export_daily_summary(request):
+    """Stream the per-location daily AQI summary used by reports as CSV or XLSX"""
+    output = request.GET.get('output', 'csv')
+    if output not in ('csv', 'xlsx'):
+        return JsonResponse({'error': "'output' must be 'csv' or 'xlsx'"}, status=400)
+    try:
+        start, end = _export_window(request)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    queryset = AQICalculation.objects.filter(
+        sensor_reading__timestamp__gte=start,
+        sensor_reading__timestamp__lt=end
+    )
+    locations = _query_list(request, 'location')
+    if locations:
+        queryset = queryset.filter(sensor_reading__sensor__location_id__in=locations)
+    
+    rows = queryset.annotate(
+        day=TruncDate('sensor_reading__timestamp')
+    ).values_list(
+        'day', 'sensor_reading__sensor__location__name', 'sensor_reading__sensor__location__city'
+    ).annotate(
+        avg_aqi=Avg('overall_aqi'),
+        max_aqi=Max('overall_aqi'),
+        min_aqi=Min('overall_aqi'),
+        readings=Count('id')
+    ).order_by('day', 'sensor_reading__sensor__location__name').iterator(
+        chunk_size=settings.STREAMING_CHUNK_SIZE
+    )
+    header = ('date', 'location', 'city', 'avg_aqi', 'max_aqi', 'min_aqi', 'readings')
+    filename = f"aqi_daily_summary_{start:%Y%m%d}_{end:%Y%m%d}"
+    return streaming_export_response(request, filename, header, rows, output)
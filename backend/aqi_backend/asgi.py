@@ -4,17 +4,39 @@ ASGI config for aqi_backend project.
 
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aqi_backend.settings')
+
+# Set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import monitoring.routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aqi_backend.settings')
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             monitoring.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
+
+# Serve the first connects and ingests after a (re)deploy from memory rather than the database
+from monitoring.realtime import warm_realtime_state
+from monitoring.rolling_stats import rolling_stats
+from monitoring.averaging import averaging_windows
+from monitoring.anomaly import anomaly_detector
+warm_realtime_state()
+rolling_stats.warm()
+averaging_windows.warm()
+anomaly_detector.warm()
+
+# Watch for sensors going quiet from boot, not from the first reading this process ingests
+from monitoring.offline import offline_monitor
+offline_monitor.start()
+
+# Fail jobs orphaned by a previous process so their streams and duplicates don't wait on them
+from analytics.jobs import fail_stale_jobs
+fail_stale_jobs()
\ No newline at end of file
@@ -136,23 +136,62 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Cache configuration
+# Set CACHE_BACKEND=redis (using REDIS_URL) or CACHE_BACKEND=file for a cache
+# shared between worker processes; locmem is per-process
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL', default='redis://localhost:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'aqi-monitoring',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 # Channels configuration
-# Using in-memory channel layer for development (Redis not required)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Set CHANNEL_LAYER=redis to fan out across worker processes through Redis
+# pub/sub. REDIS_CHANNEL_HOSTS is a comma-separated list of redis:// URLs, and
+# groups (one per location) are sharded across them. The in-memory layer only
+# works with a single worker process.
+CHANNEL_LAYER = config('CHANNEL_LAYER', default='memory')
 
-# Alternative Redis configuration (uncomment when Redis is available):
-# CHANNEL_LAYERS = {
-#     'default': {
-#         'BACKEND': 'channels_redis.core.RedisChannelLayer',
-#         'CONFIG': {
-#             "hosts": [('127.0.0.1', 6379)],
-#         },
-#     },
-# }
+if CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'monitoring.channel_layers.BatchingRedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': config(
+                    'REDIS_CHANNEL_HOSTS',
+                    default='redis://localhost:6379/1',
+                    cast=lambda v: [s.strip() for s in v.split(',')]
+                ),
+                'prefix': 'aqi',
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
 # Celery configuration (Redis required - commented out for development)
 # CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -165,6 +204,53 @@ CHANNEL_LAYERS = {
 # Custom settings for AQI monitoring
 AQI_UPDATE_INTERVAL = 5  # seconds
 MAX_SENSOR_DATA_AGE = 3600  # seconds (1 hour)
+SENSOR_OFFLINE_MONITOR = config('SENSOR_OFFLINE_MONITOR', default=True, cast=bool)
+SENSOR_OFFLINE_TIMEOUT = 300  # seconds without a reading before a sensor is marked offline
+STREAMING_CHUNK_SIZE = 2000  # rows fetched per server-side cursor round-trip
+ANALYTICS_WINDOW_REFRESH = 60  # seconds before windowed analytics ETags roll over
+REALTIME_PUBLISH = True  # push ingest updates to WebSocket groups
+REALTIME_COALESCE_WINDOW = 0.5  # seconds; bursts within a window send one update per location
+CONSUMER_DB_WORKERS = config('CONSUMER_DB_WORKERS', default=4, cast=int)  # threads for WebSocket consumer queries
+CONSUMER_DB_SLOW_WAIT = 0.25  # seconds; longer queue waits for a DB worker are logged
+RESPONSE_CACHE_TTLS = {  # seconds, per cached endpoint
+    'default': 300,
+    'aqi_analytics': 300,
+    'trend_analysis': 600,
+    'location_comparison': 300,
+    'generate_report': 900,
+    'aqi_percentiles': 300,
+    'aqi_heatmap': 300,
+}
+ANALYTICS_JOB_WORKERS = 2  # background analytics job threads per process
+ANALYTICS_JOB_RESULT_TTL = 86400  # seconds finished job results are kept
+ANALYTICS_JOB_POLL_INTERVAL = 0.5  # seconds between progress checks for event streams
+ANALYTICS_JOB_HEARTBEAT_INTERVAL = 30  # seconds between heartbeats for jobs a process has queued or running
+ANALYTICS_JOB_STALE_AFTER = 300  # seconds without a heartbeat before an unfinished job is presumed orphaned
+ANALYTICS_JOB_STREAM_TIMEOUT = 900  # seconds a job event stream stays open at most
+FORECAST_SMOOTHING = {  # Holt-Winters smoothing for level, trend, hour-of-day seasonality and trend damping
+    'alpha': 0.3,
+    'beta': 0.05,
+    'gamma': 0.2,
+    'phi': 0.98,
+}
+FORECAST_MAX_HORIZON = 168  # hours
+HEATMAP_DEFAULT_RESOLUTION = 50  # grid cells per side
+HEATMAP_MAX_RESOLUTION = 200
+HEATMAP_MIN_POWER = 0.5  # IDW exponent bounds; ?power= is clamped to them
+HEATMAP_MAX_POWER = 6.0
+QUANTILE_SKETCH_COMPRESSION = 100  # t-digest size/accuracy trade-off (max ~centroids per sketch)
+ANOMALY_DETECTION = {  # per-sensor EWMA z-score spike / data anomaly detection
+    'alpha': 0.1,  # EW smoothing factor for mean and variance
+    'spike_z': 4.0,  # standard deviations above the mean that count as a spike
+    'warmup': 12,  # readings per sensor before alerts are raised
+    'flatline_readings': 12,  # identical consecutive values that indicate a stuck sensor
+    'min_relative_std': 0.05,  # std floor as a fraction of the mean
+    'pm_ratio_tolerance': 0.1,  # PM2.5 may exceed PM10 by this fraction before it is flagged
+    'detection_limits': {  # values at or below these never count towards a flatline
+        'pm25': 0.0, 'pm10': 0.0, 'co': 0.1, 'no2': 1.0, 'so2': 1.0, 'o3': 1.0,
+    },
+    'history_hours': 24,  # readings replayed into the detector at startup
+}
 ALERT_THRESHOLDS = {
     'AQI': {
         'MODERATE': 100,
@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Location, Sensor, SensorReading, AQICalculation, Alert, UserPreference
+from .models import Location, Sensor, SensorReading, AQICalculation, Alert, UserPreference, ForecastState
+from .realtime import publisher
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
@@ -144,11 +145,13 @@ class AlertAdmin(admin.ModelAdmin):
     
     def acknowledge_alerts(self, request, queryset):
         from django.utils import timezone
+        publisher.discard_alerts(list(queryset.values_list('pk', flat=True)))
         queryset.update(acknowledged=True, acknowledged_at=timezone.now())
         self.message_user(request, f"{queryset.count()} alerts acknowledged.")
     acknowledge_alerts.short_description = "Acknowledge selected alerts"
     
     def deactivate_alerts(self, request, queryset):
+        publisher.discard_alerts(list(queryset.values_list('pk', flat=True)))
         queryset.update(is_active=False)
         self.message_user(request, f"{queryset.count()} alerts deactivated.")
     deactivate_alerts.short_description = "Deactivate selected alerts"
@@ -160,6 +163,12 @@ class UserPreferenceAdmin(admin.ModelAdmin):
     search_fields = ['location__name', 'email', 'phone']
     readonly_fields = ['id', 'created_at', 'updated_at']
 
+@admin.register(ForecastState)
+class ForecastStateAdmin(admin.ModelAdmin):
+    list_display = ['location', 'level', 'trend', 'observations', 'bucket_start', 'updated_at']
+    search_fields = ['location__name']
+    readonly_fields = ['id', 'updated_at']
+
 # Customize admin site header
 admin.site.site_header = "AQI Monitoring System Admin"
 admin.site.site_title = "AQI Admin"
@@ -0,0 +1,240 @@
+"""
+Online spike and data-anomaly detection per sensor
+
+Each sensor keeps, per pollutant, an exponentially weighted mean and variance
+plus a flatline run counter (O(1) state and O(1) work per reading). A reading
+is scored before it is folded in:
+
+- POLLUTANT_SPIKE: the value is more than `spike_z` EW standard deviations
+  above the EW mean.
+- DATA_ANOMALY: the value has not changed for `flatline_readings` consecutive
+  readings (stuck sensor), or PM2.5 exceeds PM10 by more than
+  `pm_ratio_tolerance` (PM2.5 is a subset of PM10, so this is a sensor fault).
+  Values at or below the pollutant's entry in `detection_limits` never count
+  towards a flatline: SO2, CO and O3 legitimately sit at zero in clean air.
+
+Detector state lives in the process. It is replayed from the last
+`history_hours` of readings of ACTIVE sensors at ASGI startup, and readings
+ingested by other worker processes are folded in through realtime.publisher,
+so every worker scores against the same baseline. No alerts are raised for a
+sensor until `warmup` readings have been seen.
+"""
+import logging
+import math
+import threading
+from datetime import timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Alert, Sensor, SensorReading
+
+logger = logging.getLogger(__name__)
+
+POLLUTANTS = ('pm25', 'pm10', 'co', 'no2', 'so2', 'o3')
+
+
+class PollutantState:
+    """EW mean/variance and flatline tracking for one pollutant of one sensor"""
+    __slots__ = ('mean', 'variance', 'count', 'last_value', 'flat_run')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+        self.last_value = None
+        self.flat_run = 0
+
+
+class AnomalyDetector:
+    """Process-level per-sensor EWMA z-score detector"""
+
+    def __init__(self, config=None):
+        config = {**settings.ANOMALY_DETECTION, **(config or {})}
+        self.alpha = config['alpha']
+        self.spike_z = config['spike_z']
+        self.warmup = config['warmup']
+        self.flatline_readings = config['flatline_readings']
+        self.min_relative_std = config['min_relative_std']
+        self.pm_ratio_tolerance = config['pm_ratio_tolerance']
+        self.detection_limits = config['detection_limits']
+        self.history_hours = config['history_hours']
+        self._sensors = {}
+        self._lock = threading.Lock()
+
+    def observe(self, sensor_key, values: Dict[str, float]) -> List[dict]:
+        """Score one reading's pollutant values, update state, and return any findings"""
+        with self._lock:
+            states = self._sensors.get(sensor_key)
+            if states is None:
+                states = self._sensors[sensor_key] = self._new_states()
+
+            findings = []
+            for pollutant in POLLUTANTS:
+                value = values.get(pollutant)
+                if value is None:
+                    continue
+                finding = self._observe_value(states[pollutant], pollutant, value)
+                if finding:
+                    findings.append(finding)
+
+        pm25 = values.get('pm25')
+        pm10 = values.get('pm10')
+        if (pm25 is not None and pm10 is not None and
+                states['pm25'].count > self.warmup and pm25 > pm10 * (1 + self.pm_ratio_tolerance)):
+            findings.append({
+                'alert_type': 'DATA_ANOMALY',
+                'pollutant': 'PM25',
+                'value': pm25,
+                'expected': pm10,
+                'reason': f"PM2.5 ({pm25:.1f}) exceeds PM10 ({pm10:.1f})",
+            })
+        return findings
+
+    def learn(self, sensor_key, values: Dict[str, float]):
+        """Fold a reading into a sensor's state without raising findings for it"""
+        with self._lock:
+            states = self._sensors.get(sensor_key)
+            if states is None:
+                states = self._sensors[sensor_key] = self._new_states()
+            self._fold(states, values)
+
+    def apply_update(self, update: dict):
+        """Fold readings ingested by another worker process (see realtime.publisher)"""
+        for sensor_pk, _, values in update['readings']:
+            self.learn(Sensor._meta.pk.to_python(sensor_pk), values)
+
+    def warm(self, now=None):
+        """Replay the last `history_hours` of readings of all ACTIVE sensors (at startup)"""
+        try:
+            now = now or timezone.now()
+            rows = SensorReading.objects.filter(
+                sensor__status='ACTIVE',
+                timestamp__gte=now - timedelta(hours=self.history_hours),
+                timestamp__lte=now
+            ).values_list('sensor_id', *POLLUTANTS).order_by(
+                'sensor_id', 'timestamp'
+            ).iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+
+            loaded = {}
+            for sensor_pk, *values in rows:
+                states = loaded.get(sensor_pk)
+                if states is None:
+                    states = loaded[sensor_pk] = self._new_states()
+                self._fold(states, dict(zip(POLLUTANTS, values)))
+
+            with self._lock:
+                # The replay supersedes state built from the few readings that raced it
+                self._sensors.update(loaded)
+            logger.info(f"Anomaly detector warmed for {len(loaded)} sensors")
+        except Exception as e:
+            logger.error(f"Error warming anomaly detector: {e}")
+        finally:
+            connection.close()
+
+    def _new_states(self) -> Dict[str, PollutantState]:
+        return {pollutant: PollutantState() for pollutant in POLLUTANTS}
+
+    def _fold(self, states: Dict[str, PollutantState], values: Dict[str, float]):
+        for pollutant in POLLUTANTS:
+            value = values.get(pollutant)
+            if value is not None:
+                self._observe_value(states[pollutant], pollutant, value)
+
+    def _observe_value(self, state: PollutantState, pollutant: str, value: float):
+        finding = None
+
+        if value <= self.detection_limits.get(pollutant, 0.0):
+            state.flat_run = 0  # zero / below-detection readings are legitimately constant
+        elif state.last_value is not None and value == state.last_value:
+            state.flat_run += 1
+        else:
+            state.flat_run = 0
+        state.last_value = value
+
+        if state.count >= self.warmup:
+            std = max(math.sqrt(state.variance), self.min_relative_std * abs(state.mean), 1e-6)
+            z = (value - state.mean) / std
+
+            if z > self.spike_z:
+                finding = {
+                    'alert_type': 'POLLUTANT_SPIKE',
+                    'pollutant': pollutant.upper(),
+                    'value': value,
+                    'expected': state.mean + self.spike_z * std,
+                    'z': round(z, 2),
+                    'reason': f"{pollutant.upper()} {value:.2f} is {z:.1f} standard deviations above its recent mean {state.mean:.2f}",
+                }
+            elif (state.flat_run + 1) % self.flatline_readings == 0:
+                finding = {
+                    'alert_type': 'DATA_ANOMALY',
+                    'pollutant': pollutant.upper(),
+                    'value': value,
+                    'expected': None,
+                    'reason': f"{pollutant.upper()} has reported {value:.2f} for {self.flatline_readings} consecutive readings",
+                }
+
+            # Winsorize the update so a spike does not swamp the baseline
+            value = min(max(value, state.mean - self.spike_z * std), state.mean + self.spike_z * std)
+
+        if state.count == 0:
+            state.mean = value
+        else:
+            delta = value - state.mean
+            state.mean += self.alpha * delta
+            state.variance = (1 - self.alpha) * (state.variance + self.alpha * delta * delta)
+        state.count += 1
+        return finding
+
+    def forget(self, sensor_key=None):
+        with self._lock:
+            if sensor_key is None:
+                self._sensors.clear()
+            else:
+                self._sensors.pop(sensor_key, None)
+
+
+anomaly_detector = AnomalyDetector()
+
+
+def raise_anomaly_alerts(sensor, findings: List[dict], aqi_calculation=None):
+    """Create alerts for detector findings, refreshing an active alert of the same type and pollutant"""
+    for finding in findings:
+        try:
+            severity = 'WARNING'
+            if finding['alert_type'] == 'POLLUTANT_SPIKE' and finding.get('z', 0) >= 2 * anomaly_detector.spike_z:
+                severity = 'CRITICAL'
+
+            existing_alert = Alert.objects.filter(
+                sensor=sensor,
+                alert_type=finding['alert_type'],
+                pollutant=finding['pollutant'],
+                is_active=True
+            ).first()
+
+            if existing_alert:
+                existing_alert.message = finding['reason']
+                existing_alert.severity = severity
+                existing_alert.actual_value = finding['value']
+                existing_alert.updated_at = timezone.now()
+                existing_alert.save()
+            else:
+                title = 'Pollutant Spike' if finding['alert_type'] == 'POLLUTANT_SPIKE' else 'Data Anomaly'
+                Alert.objects.create(
+                    sensor=sensor,
+                    aqi_calculation=aqi_calculation,
+                    alert_type=finding['alert_type'],
+                    severity=severity,
+                    title=f"{title} - {sensor.location.name}",
+                    message=finding['reason'],
+                    threshold_value=finding['expected'],
+                    actual_value=finding['value'],
+                    pollutant=finding['pollutant']
+                )
+
+            logger.info(f"{finding['alert_type']} alert for sensor {sensor.sensor_id}: {finding['reason']}")
+
+        except Exception as e:
+            logger.error(f"Error creating {finding['alert_type']} alert for sensor {sensor.sensor_id}: {e}")
@@ -0,0 +1,237 @@
+"""
+Averaging-period concentrations (EPA NowCast, 8-hour and 24-hour means) per sensor
+
+EPA breakpoints for PM are defined on 24-hour averages and those for O3 and CO
+on 8-hour averages, so applying them to a single 5-minute reading overstates
+AQI during short spikes. Each sensor keeps a 24-slot ring of hourly
+(sum, count) buckets per pollutant in this process; a new reading updates one
+slot and the windowed values are read from at most 24 slots, so ingest never
+re-queries the last day. Rings for every ACTIVE sensor are loaded in one
+grouped query at ASGI startup; a sensor first seen later by a process (e.g. one
+that was inactive at startup) is rehydrated on its first reading.
+"""
+import logging
+import math
+import threading
+from array import array
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.db.models.functions import TruncHour
+
+from .models import Sensor, SensorReading
+from .utils import AQICalculator
+
+logger = logging.getLogger(__name__)
+
+WINDOW_HOURS = 24
+WINDOWED_POLLUTANTS = ('pm25', 'pm10', 'co', 'o3')
+
+
+def hour_index(timestamp) -> int:
+    """Hours since the epoch, used as the ring slot tag"""
+    return int(timestamp.timestamp() // 3600)
+
+
+class HourlyRing:
+    """Hourly (sum, count) buckets for the last WINDOW_HOURS hours of one pollutant"""
+
+    def __init__(self):
+        self.hours = array('q', [-1] * WINDOW_HOURS)
+        self.sums = array('d', [0.0] * WINDOW_HOURS)
+        self.counts = array('l', [0] * WINDOW_HOURS)
+
+    def add(self, hour: int, value: float, count: int = 1):
+        slot = hour % WINDOW_HOURS
+        if self.hours[slot] > hour:
+            return  # older than the window this slot now holds
+        if self.hours[slot] != hour:
+            self.hours[slot] = hour
+            self.sums[slot] = 0.0
+            self.counts[slot] = 0
+        self.sums[slot] += value
+        self.counts[slot] += count
+
+    def hourly_means(self, hour: int, hours: int):
+        """Means for `hour`, `hour - 1`, ... (None where the hour has no data)"""
+        means = []
+        for offset in range(hours):
+            slot = (hour - offset) % WINDOW_HOURS
+            if self.hours[slot] == hour - offset and self.counts[slot]:
+                means.append(self.sums[slot] / self.counts[slot])
+            else:
+                means.append(None)
+        return means
+
+    def average(self, hour: int, hours: int, min_hours: int) -> Optional[float]:
+        """Mean of the hourly means over the window, if enough hours have data"""
+        means = [mean for mean in self.hourly_means(hour, hours) if mean is not None]
+        if len(means) < min_hours:
+            return None
+        return sum(means) / len(means)
+
+    def nowcast(self, hour: int, min_weight: float = 0.5) -> Optional[float]:
+        """
+        EPA NowCast over the last 12 hourly means
+
+        Requires data in at least 2 of the 3 most recent hours. The weight factor
+        is min/max of the available hours, floored at min_weight.
+        """
+        means = self.hourly_means(hour, 12)
+        if sum(mean is not None for mean in means[:3]) < 2:
+            return None
+
+        available = [mean for mean in means if mean is not None]
+        highest = max(available)
+        weight = max(min(available) / highest, min_weight) if highest > 0 else 1.0
+
+        numerator = denominator = 0.0
+        for age, mean in enumerate(means):
+            if mean is not None:
+                numerator += weight ** age * mean
+                denominator += weight ** age
+        return numerator / denominator
+
+
+class AveragingWindows:
+    """Process-level registry of per-sensor hourly rings"""
+
+    def __init__(self):
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def warm(self, now=None):
+        """Load the last 24h of hourly buckets for all ACTIVE sensors in one grouped query"""
+        try:
+            now = now or timezone.now()
+            since = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=WINDOW_HOURS - 1)
+            hourly = SensorReading.objects.filter(
+                sensor__status='ACTIVE',
+                timestamp__gte=since,
+                timestamp__lte=now
+            ).annotate(
+                hour=TruncHour('timestamp')
+            ).values('sensor_id', 'hour').annotate(
+                count=Count('id'),
+                **{f'sum_{pollutant}': Sum(pollutant) for pollutant in WINDOWED_POLLUTANTS}
+            ).order_by('sensor_id', 'hour')
+
+            loaded = {sensor_pk: self._empty_rings() for sensor_pk in Sensor.objects.filter(
+                status='ACTIVE'
+            ).values_list('pk', flat=True)}
+            for row in hourly:
+                rings = loaded.setdefault(row['sensor_id'], self._empty_rings())
+                for pollutant in WINDOWED_POLLUTANTS:
+                    rings[pollutant].add(hour_index(row['hour']), row[f'sum_{pollutant}'], row['count'])
+
+            with self._lock:
+                for sensor_pk, rings in loaded.items():
+                    # Rings built by readings that raced the warm-up already include them
+                    self._rings.setdefault(sensor_pk, rings)
+            logger.info(f"Averaging windows warmed for {len(loaded)} sensors")
+        except Exception as e:
+            logger.error(f"Error warming averaging windows: {e}")
+        finally:
+            connection.close()
+
+    def _empty_rings(self) -> Dict[str, HourlyRing]:
+        return {pollutant: HourlyRing() for pollutant in WINDOWED_POLLUTANTS}
+
+    def _rehydrate(self, reading) -> Dict[str, HourlyRing]:
+        rings = self._empty_rings()
+        since = reading.timestamp.replace(minute=0, second=0, microsecond=0) - timedelta(hours=WINDOW_HOURS - 1)
+        hourly = SensorReading.objects.filter(
+            sensor_id=reading.sensor_id,
+            timestamp__gte=since,
+            timestamp__lte=reading.timestamp
+        ).exclude(pk=reading.pk).annotate(
+            hour=TruncHour('timestamp')
+        ).values('hour').annotate(
+            count=Count('id'),
+            **{f'sum_{pollutant}': Sum(pollutant) for pollutant in WINDOWED_POLLUTANTS}
+        ).order_by('hour')
+
+        for row in hourly:
+            for pollutant in WINDOWED_POLLUTANTS:
+                rings[pollutant].add(hour_index(row['hour']), row[f'sum_{pollutant}'], row['count'])
+        return rings
+
+    def observe(self, reading) -> Dict[str, Optional[float]]:
+        """
+        Add a saved reading to its sensor's rings and return the windowed concentrations
+
+        Keys: pm25_nowcast, pm10_nowcast, pm25_24h, pm10_24h, co_8h, o3_8h
+        (None where the window does not have enough data yet).
+        """
+        with self._lock:
+            rings = self._rings.get(reading.sensor_id)
+        if rings is None:
+            rings = self._rehydrate(reading)
+
+        hour = hour_index(reading.timestamp)
+        with self._lock:
+            rings = self._rings.setdefault(reading.sensor_id, rings)
+            for pollutant in WINDOWED_POLLUTANTS:
+                rings[pollutant].add(hour, getattr(reading, pollutant))
+
+            return {
+                'pm25_nowcast': rings['pm25'].nowcast(hour),
+                'pm10_nowcast': rings['pm10'].nowcast(hour),
+                # EPA completeness: 75% of the hours in the averaging period
+                'pm25_24h': rings['pm25'].average(hour, 24, min_hours=18),
+                'pm10_24h': rings['pm10'].average(hour, 24, min_hours=18),
+                'co_8h': rings['co'].average(hour, 8, min_hours=6),
+                'o3_8h': rings['o3'].average(hour, 8, min_hours=6),
+            }
+
+    def forget(self, sensor_id=None):
+        """Drop cached rings (all sensors if sensor_id is None)"""
+        with self._lock:
+            if sensor_id is None:
+                self._rings.clear()
+            else:
+                self._rings.pop(sensor_id, None)
+
+
+averaging_windows = AveragingWindows()
+
+
+def calculate_windowed_aqi(reading) -> Dict[str, Optional[float]]:
+    """
+    Windowed concentrations for a reading plus the AQI computed from them
+
+    nowcast_aqi uses NowCast PM2.5/PM10 and 8-hour CO/O3, falling back to the
+    instantaneous concentration while a window is still filling; NO2 and SO2
+    use the instantaneous value.
+    """
+    try:
+        windows = averaging_windows.observe(reading)
+    except Exception as e:
+        logger.error(f"Error updating averaging windows for sensor {reading.sensor_id}: {e}")
+        return {}
+
+    def windowed(key, fallback, digits):
+        # EPA truncates averages to the breakpoint precision, which also keeps
+        # them out of the gaps between breakpoint ranges (e.g. 12.0-12.1)
+        value = windows[key] if windows[key] is not None else fallback
+        scale = 10 ** digits
+        return math.floor(value * scale) / scale
+
+    components = [
+        AQICalculator.calculate_pm25_aqi(windowed('pm25_nowcast', reading.pm25, 1)),
+        AQICalculator.calculate_pm10_aqi(windowed('pm10_nowcast', reading.pm10, 0)),
+        AQICalculator.calculate_co_aqi(windowed('co_8h', reading.co, 1)),
+        AQICalculator.calculate_o3_aqi(windowed('o3_8h', reading.o3, 0)),
+        AQICalculator.calculate_no2_aqi(reading.no2),
+        AQICalculator.calculate_so2_aqi(reading.so2),
+    ]
+
+    result = {
+        key: round(value, 3) if value is not None else None
+        for key, value in windows.items()
+    }
+    result['nowcast_aqi'] = round(max(components), 1)
+    return result
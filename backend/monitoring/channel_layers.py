@@ -0,0 +1,63 @@
+"""
+Redis pub/sub channel layer with batched, pipelined group sends
+
+Built on channels_redis' RedisPubSubChannelLayer: every worker process
+subscribes once per group it has members in, so a group_send is a single
+PUBLISH however many sockets (or workers) are listening. With several hosts
+configured, groups are spread over them by consistent hash of the group
+name. Because location groups are named per location (`aqi_<id>`,
+`alerts_<id>`), this shards the fan-out per location.
+
+group_send_many() sends a whole publisher flush in one pipelined round trip
+per shard instead of one round trip per group.
+"""
+import asyncio
+
+from channels_redis.pubsub import RedisPubSubChannelLayer, RedisPubSubLoopLayer
+from channels_redis.utils import _wrap_close
+
+
+class BatchingRedisPubSubLoopLayer(RedisPubSubLoopLayer):
+    """Per-event-loop layer adding pipelined multi-group sends"""
+
+    async def group_send_many(self, messages):
+        """Publish (group, message) pairs, pipelined per shard"""
+        batches = {}
+        for group, message in messages:
+            group_channel = self._get_group_channel_name(group)
+            shard = self._get_shard(group_channel)
+            batches.setdefault(shard, []).append((group_channel, self.channel_layer.serialize(message)))
+
+        await asyncio.gather(*(_publish_batch(shard, batch) for shard, batch in batches.items()))
+
+
+async def _publish_batch(shard, batch):
+    async with shard._lock:
+        shard._ensure_redis()
+        async with shard._redis.pipeline(transaction=False) as pipe:
+            for group_channel, payload in batch:
+                pipe.publish(group_channel, payload)
+            await pipe.execute()
+
+
+class BatchingRedisPubSubChannelLayer(RedisPubSubChannelLayer):
+    """RedisPubSubChannelLayer whose per-loop layers support group_send_many()"""
+
+    async def group_send_many(self, messages):
+        await self._get_layer().group_send_many(messages)
+
+    def _get_layer(self):
+        loop = asyncio.get_running_loop()
+
+        try:
+            layer = self._layers[loop]
+        except KeyError:
+            layer = BatchingRedisPubSubLoopLayer(
+                *self._args,
+                **self._kwargs,
+                channel_layer=self,
+            )
+            self._layers[loop] = layer
+            _wrap_close(self, loop)
+
+        return layer
@@ -0,0 +1,99 @@
+"""
+Columnar (per-sensor arrays) representation of time-series data
+"""
+import math
+import struct
+import sys
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from .models import Sensor
+from .streaming import encode_json
+
+
+def build_columnar_series(queryset, fields, keys=None) -> dict:
+    """
+    Group readings into one set of column arrays per sensor
+
+    Rows are fetched as values_list tuples ordered by (sensor, timestamp) and
+    transposed per sensor with zip(), so no per-row dict or model instance is
+    ever built.
+    """
+    keys = list(keys or fields)
+    rows = queryset.order_by('sensor', 'timestamp').values_list(
+        'sensor', 'timestamp', *fields
+    ).iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+
+    grouped = []
+    for sensor_pk, group in groupby(rows, key=itemgetter(0)):
+        columns = list(zip(*group))
+        grouped.append((sensor_pk, columns[1:]))
+
+    labels = {
+        pk: (sensor_id, location_name)
+        for pk, sensor_id, location_name in Sensor.objects.filter(
+            pk__in=[sensor_pk for sensor_pk, _ in grouped]
+        ).values_list('pk', 'sensor_id', 'location__name')
+    }
+
+    series = []
+    points = 0
+    for sensor_pk, columns in grouped:
+        sensor_id, location_name = labels.get(sensor_pk, (None, None))
+        entry = {
+            'sensor_id': sensor_id,
+            'location': location_name,
+            'timestamps': list(columns[0]),
+        }
+        entry.update((key, list(column)) for key, column in zip(keys, columns[1:]))
+        series.append(entry)
+        points += len(columns[0])
+
+    return {
+        'columns': ['timestamps'] + keys,
+        'points': points,
+        'series': series,
+    }
+
+
+def _float64_bytes(values) -> bytes:
+    """Pack values as little-endian float64, mapping None to NaN"""
+    packed = array('d', (math.nan if value is None else value for value in values))
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def pack_columnar(data: dict) -> bytes:
+    """
+    Encode build_columnar_series() output as packed float64 columns
+
+    Layout: a little-endian uint32 header length, a JSON header describing the
+    series (sensor_id, location, length) and column names, padded with spaces
+    so the column data starts on an 8-byte boundary, then for each series the
+    timestamps (epoch seconds) followed by every value column, each as
+    `length` float64 values. Missing values are NaN.
+    """
+    header = encode_json({
+        'columns': data['columns'],
+        'dtype': 'float64',
+        'series': [
+            {
+                'sensor_id': entry['sensor_id'],
+                'location': entry['location'],
+                'length': len(entry['timestamps']),
+            }
+            for entry in data['series']
+        ],
+    }).encode('utf-8')
+    header += b' ' * (-(4 + len(header)) % 8)
+
+    chunks = [struct.pack('<I', len(header)), header]
+    for entry in data['series']:
+        chunks.append(_float64_bytes(ts.timestamp() for ts in entry['timestamps']))
+        for key in data['columns'][1:]:
+            chunks.append(_float64_bytes(entry[key]))
+    return b''.join(chunks)
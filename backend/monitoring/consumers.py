@@ -1,19 +1,63 @@
+import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
 from django.utils import timezone
-from .models import SensorReading, AQICalculation, Alert
-from .serializers import AQICalculationSerializer, AlertSerializer
+from .models import SensorReading, Alert
+from .realtime import publisher
+from .dashboard import dashboard_state
+from .latest import latest_state
+from .db_executor import consumer_db, run_in_db_executor
+from .dashboard import merge_deltas
+from .throttle import ThrottledSender, parse_update_frequency, preference_update_frequency, query_params
 import logging
 
 logger = logging.getLogger(__name__)
 
-class AQIConsumer(AsyncWebsocketConsumer):
+class UpdateFrequencyMixin:
+    """Per-connection update throttling driven by query params, client messages or a UserPreference"""
+    
+    async def apply_requested_frequency(self):
+        """Honour ?update_frequency=<minutes> or ?preference=<id> from the connect URL"""
+        params = query_params(self.scope)
+        if 'preference' in params or 'update_frequency' in params:
+            await self.set_update_frequency(params.get('update_frequency'), params.get('preference'))
+    
+    async def handle_frequency_message(self, message_type, data):
+        """Handle set_update_frequency / set_preference; returns True if the message was one of them"""
+        if message_type == 'set_update_frequency':
+            await self.set_update_frequency(data.get('minutes'))
+        elif message_type == 'set_preference':
+            await self.set_update_frequency(preference_id=data.get('preference_id'))
+        else:
+            return False
+        return True
+    
+    async def set_update_frequency(self, minutes=None, preference_id=None):
+        try:
+            if preference_id:
+                minutes = await run_in_db_executor(preference_update_frequency, preference_id)
+            minutes = parse_update_frequency(minutes)
+        except ValueError as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'error': str(e)
+            }))
+            return
+        
+        await self.updates.set_update_frequency(minutes)
+        await self.send(text_data=json.dumps({
+            'type': 'update_frequency',
+            'minutes': minutes
+        }))
+
+class AQIConsumer(UpdateFrequencyMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for real-time AQI updates"""
     
     async def connect(self):
         self.location_id = self.scope['url_route']['kwargs'].get('location_id', 'all')
         self.room_group_name = f'aqi_{self.location_id}'
+        self.updates = ThrottledSender(self.send_aqi_updates)
+        publisher.attach_loop(asyncio.get_running_loop())
         
         # Join room group
         await self.channel_layer.group_add(
@@ -25,8 +69,11 @@ class AQIConsumer(AsyncWebsocketConsumer):
         
         # Send initial data
         await self.send_initial_data()
+        await self.apply_requested_frequency()
     
     async def disconnect(self, close_code):
+        self.updates.close()
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -43,6 +90,8 @@ class AQIConsumer(AsyncWebsocketConsumer):
                 await self.send_current_data()
             elif message_type == 'subscribe_alerts':
                 await self.subscribe_to_alerts()
+            else:
+                await self.handle_frequency_message(message_type, text_data_json)
             
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -83,34 +132,23 @@ class AQIConsumer(AsyncWebsocketConsumer):
             'message': 'Subscribed to alerts'
         }))
     
-    @database_sync_to_async
-    def get_current_aqi_data(self):
-        """Get current AQI data from database"""
-        if self.location_id == 'all':
-            # Get latest AQI for all locations
-            latest_calculations = AQICalculation.objects.select_related(
-                'sensor_reading__sensor__location'
-            ).order_by('sensor_reading__sensor__location', '-calculated_at').distinct('sensor_reading__sensor__location')
-        else:
-            # Get latest AQI for specific location
-            latest_calculations = AQICalculation.objects.filter(
-                sensor_reading__sensor__location_id=self.location_id
-            ).select_related(
-                'sensor_reading__sensor__location'
-            ).order_by('-calculated_at')[:1]
-        
-        serializer = AQICalculationSerializer(latest_calculations, many=True)
-        return serializer.data
+    async def get_current_aqi_data(self):
+        """Get current AQI data from the in-memory latest-state cache"""
+        if not latest_state.is_warm:
+            await run_in_db_executor(latest_state.warm)
+        return latest_state.current_aqi(self.location_id)
     
     # Handle messages from room group
     async def aqi_update(self, event):
-        """Handle AQI update from group"""
-        aqi_data = event['aqi_data']
-        
-        await self.send(text_data=json.dumps({
-            'type': 'aqi_update',
-            'data': aqi_data
-        }))
+        """Handle AQI update from group (coalesced per location when throttled)"""
+        await self.updates.offer(event.get('location_id'), event['aqi_data'])
+    
+    async def send_aqi_updates(self, updates):
+        for aqi_data in updates.values():
+            await self.send(text_data=json.dumps({
+                'type': 'aqi_update',
+                'data': aqi_data
+            }))
     
     async def alert_notification(self, event):
         """Handle alert notification from group"""
@@ -120,6 +158,10 @@ class AQIConsumer(AsyncWebsocketConsumer):
             'type': 'alert',
             'data': alert_data
         }))
+    
+    async def new_alert(self, event):
+        """Handle new alert published to alerts_<location> (after subscribe_alerts)"""
+        await self.alert_notification(event)
 
 class AlertConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for real-time alert notifications"""
@@ -127,6 +169,7 @@ class AlertConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.location_id = self.scope['url_route']['kwargs'].get('location_id', 'all')
         self.room_group_name = f'alerts_{self.location_id}'
+        publisher.attach_loop(asyncio.get_running_loop())
         
         # Join room group
         await self.channel_layer.group_add(
@@ -174,25 +217,13 @@ class AlertConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error sending active alerts: {e}")
     
-    @database_sync_to_async
-    def get_active_alerts(self):
-        """Get active alerts from database"""
-        if self.location_id == 'all':
-            alerts = Alert.objects.filter(
-                is_active=True,
-                acknowledged=False
-            ).select_related('sensor__location').order_by('-created_at')
-        else:
-            alerts = Alert.objects.filter(
-                sensor__location_id=self.location_id,
-                is_active=True,
-                acknowledged=False
-            ).select_related('sensor__location').order_by('-created_at')
-        
-        serializer = AlertSerializer(alerts, many=True)
-        return serializer.data
+    async def get_active_alerts(self):
+        """Get active alerts from the in-memory latest-state cache"""
+        if not latest_state.is_warm:
+            await run_in_db_executor(latest_state.warm)
+        return latest_state.active_alerts(self.location_id)
     
-    @database_sync_to_async
+    @consumer_db
     def acknowledge_alert(self, alert_id):
         """Acknowledge an alert"""
         try:
@@ -223,24 +254,38 @@ class AlertConsumer(AsyncWebsocketConsumer):
             'alert_id': alert_id
         }))
 
-class DashboardConsumer(AsyncWebsocketConsumer):
+class DashboardConsumer(UpdateFrequencyMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for dashboard real-time updates"""
     
     async def connect(self):
         self.room_group_name = 'dashboard'
+        self.updates = ThrottledSender(self.forward_dashboard_deltas, merge=merge_deltas)
+        publisher.attach_loop(asyncio.get_running_loop())
         
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        self.subscribed = True
+        stale = dashboard_state.subscribe()
         
         await self.accept()
         
         # Send initial dashboard data
         await self.send_dashboard_data()
+        if stale:
+            # The snapshot sat out change sets while this process had no dashboard clients
+            delta = await run_in_db_executor(dashboard_state.refresh)
+            if delta is not None:
+                await self.updates.offer('delta', delta)
+        await self.apply_requested_frequency()
     
     async def disconnect(self, close_code):
+        self.updates.close()
+        if getattr(self, 'subscribed', False):
+            dashboard_state.unsubscribe()
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -255,6 +300,8 @@ class DashboardConsumer(AsyncWebsocketConsumer):
             
             if message_type == 'refresh_dashboard':
                 await self.send_dashboard_data()
+            else:
+                await self.handle_frequency_message(message_type, text_data_json)
             
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -262,43 +309,48 @@ class DashboardConsumer(AsyncWebsocketConsumer):
             }))
     
     async def send_dashboard_data(self):
-        """Send dashboard summary data"""
+        """Send the full dashboard snapshot"""
         try:
-            dashboard_data = await self.get_dashboard_data()
+            snapshot = dashboard_state.peek() or await run_in_db_executor(dashboard_state.snapshot)
+            self.dashboard_version = snapshot['version']
             await self.send(text_data=json.dumps({
                 'type': 'dashboard_data',
-                'data': dashboard_data,
+                'version': snapshot['version'],
+                'data': {
+                    'locations': snapshot['locations'],
+                    'summary': snapshot['summary']
+                },
                 'timestamp': timezone.now().isoformat()
             }))
         except Exception as e:
             logger.error(f"Error sending dashboard data: {e}")
     
-    @database_sync_to_async
-    def get_dashboard_data(self):
-        """Get dashboard summary data"""
-        from .models import Location
-        from .serializers import DashboardLocationSerializer
-        
-        locations = Location.objects.prefetch_related(
-            'sensors__readings__aqi_calculation'
-        ).all()
-        
-        serializer = DashboardLocationSerializer(locations, many=True)
-        
-        # Add summary statistics
-        total_alerts = Alert.objects.filter(is_active=True, acknowledged=False).count()
-        total_sensors = Alert.objects.filter(status='ACTIVE').count()
-        
-        return {
-            'locations': serializer.data,
-            'summary': {
-                'total_alerts': total_alerts,
-                'total_sensors': total_sensors,
-                'last_updated': timezone.now().isoformat()
-            }
-        }
-    
     # Handle messages from room group
     async def dashboard_update(self, event):
-        """Handle dashboard update from group"""
-        await self.send_dashboard_data()
\ No newline at end of file
+        """Apply a broadcast change set locally and forward the delta (merged with pending ones when throttled)"""
+        delta = dashboard_state.apply_remote(event['changes'])
+        if delta is not None:
+            await self.updates.offer('delta', delta)
+    
+    async def forward_dashboard_deltas(self, updates):
+        """Forward a dashboard delta, or resync on a version gap"""
+        delta = updates['delta']
+        current = getattr(self, 'dashboard_version', None)
+        
+        if current is not None and delta['version'] <= current:
+            # Already covered by the snapshot this client was sent
+            return
+        if delta.get('resync') or delta['base_version'] != current:
+            await self.send_dashboard_data()
+            return
+        
+        self.dashboard_version = delta['version']
+        await self.send(text_data=json.dumps({
+            'type': 'dashboard_delta',
+            'version': delta['version'],
+            'base_version': delta['base_version'],
+            'changed': delta['changed'],
+            'removed': delta['removed'],
+            'summary': delta['summary'],
+            'timestamp': timezone.now().isoformat()
+        }))
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+Shared, versioned dashboard snapshot for the `dashboard` WebSocket group
+
+The snapshot (one DashboardLocationSerializer entry per location plus fleet
+summary counts) is computed once per process, not once per connected client.
+Each publisher flush re-serializes only the locations that changed and
+broadcasts them as a change set, whether or not the sending process holds a
+snapshot itself. Every worker process with dashboard clients folds each change
+set into its own snapshot once, bumping its own version, and hands its
+clients a delta with just the entries that differ. Versions are therefore
+local to a process; consumers send the full snapshot on connect and whenever
+they see a version gap.
+
+A process only receives change sets while it has dashboard clients, so a
+snapshot kept across a period without any is refreshed from the database when
+the next client subscribes.
+"""
+import json
+import threading
+import uuid
+from collections import OrderedDict
+
+from .models import Alert, Location, Sensor
+from .serializers import DashboardLocationSerializer
+from .streaming import encode_json
+
+APPLIED_CHANGE_MEMORY = 256  # change sets remembered per process, so each is applied once
+
+
+class DashboardState:
+    """Process-wide dashboard snapshot with monotonically increasing versions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locations = None  # location id -> serialized dashboard card
+        self._summary = None
+        self._version = 0
+        self._subscribers = 0  # local dashboard consumers; change sets only arrive while > 0
+        self._current = False  # snapshot has seen every change set since it was loaded
+        self._origin = uuid.uuid4().hex
+        self._sequence = 0
+        self._applied = OrderedDict()  # (origin, sequence) -> resulting delta or None
+
+    def _serialize(self, locations) -> dict:
+        data = json.loads(encode_json(DashboardLocationSerializer(locations, many=True).data))
+        return {str(entry['id']): entry for entry in data}
+
+    def _compute_summary(self) -> dict:
+        return {
+            'total_alerts': Alert.objects.filter(is_active=True, acknowledged=False).count(),
+            'total_sensors': Sensor.objects.filter(status='ACTIVE').count(),
+        }
+
+    def _ensure_loaded(self):
+        """Compute the full snapshot the first time it is needed; caller holds the lock"""
+        if self._locations is None:
+            self._locations = self._serialize(Location.objects.all())
+            self._summary = self._compute_summary()
+            self._current = self._subscribers > 0
+            self._version += 1
+
+    def _as_snapshot(self) -> dict:
+        return {
+            'version': self._version,
+            'locations': list(self._locations.values()),
+            'summary': self._summary,
+        }
+
+    def _merge(self, fresh: dict, removed, summary: dict):
+        """Fold fresh entries into the snapshot and return the delta, or None; caller holds the lock"""
+        changed = [entry for key, entry in fresh.items() if self._locations.get(key) != entry]
+        removed = [key for key in removed if key not in fresh and key in self._locations]
+
+        if not changed and not removed and summary == self._summary:
+            return None
+
+        for entry in changed:
+            self._locations[str(entry['id'])] = entry
+        for key in removed:
+            del self._locations[key]
+        self._summary = summary
+        self._version += 1
+
+        return {
+            'version': self._version,
+            'base_version': self._version - 1,
+            'changed': changed,
+            'removed': removed,
+            'summary': summary,
+        }
+
+    def snapshot(self) -> dict:
+        """Full snapshot for a newly connected (or resyncing) client"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._as_snapshot()
+
+    def peek(self):
+        """The full snapshot if it has already been computed, without touching the database"""
+        with self._lock:
+            if self._locations is None:
+                return None
+            return self._as_snapshot()
+
+    def subscribe(self) -> bool:
+        """
+        Count a local dashboard consumer that has joined the group
+
+        Returns True when an existing snapshot may have missed change sets
+        while nobody was subscribed, and so needs refresh().
+        """
+        with self._lock:
+            self._subscribers += 1
+            stale = self._locations is not None and not self._current
+            self._current = True
+            return stale
+
+    def unsubscribe(self):
+        with self._lock:
+            self._subscribers = max(0, self._subscribers - 1)
+            if not self._subscribers:
+                self._current = False
+
+    def collect_changes(self, location_ids) -> dict:
+        """
+        Re-serialize the given locations and the summary for broadcasting
+
+        Reads only the database, never the local snapshot, so a process
+        without dashboard clients still publishes what its ingest changed.
+        """
+        location_ids = sorted({str(location_id) for location_id in location_ids})
+        fresh = self._serialize(Location.objects.filter(pk__in=location_ids)) if location_ids else {}
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        return {
+            'origin': self._origin,
+            'sequence': sequence,
+            'changed': list(fresh.values()),
+            'removed': [key for key in location_ids if key not in fresh],
+            'summary': self._compute_summary(),
+        }
+
+    def apply_remote(self, changes: dict):
+        """
+        Fold a broadcast change set (from any process) into the local snapshot
+
+        Every local consumer receives the same change set; it is applied once
+        and all of them get the same local delta. Returns None when the
+        snapshot is not loaded yet (it will be read from the database) or
+        nothing visible changed.
+        """
+        key = (changes['origin'], changes['sequence'])
+        with self._lock:
+            if key in self._applied:
+                return self._applied[key]
+
+            delta = None
+            if self._locations is not None:
+                fresh = {str(entry['id']): entry for entry in changes['changed']}
+                delta = self._merge(fresh, changes['removed'], changes['summary'])
+
+            self._applied[key] = delta
+            if len(self._applied) > APPLIED_CHANGE_MEMORY:
+                self._applied.popitem(last=False)
+            return delta
+
+    def refresh(self):
+        """Re-read every location after a period without change sets; returns the delta, or None"""
+        fresh = self._serialize(Location.objects.all())
+        summary = self._compute_summary()
+        with self._lock:
+            if self._locations is None:
+                self._locations, self._summary = fresh, summary
+                self._version += 1
+                return None
+            return self._merge(fresh, list(self._locations), summary)
+
+
+dashboard_state = DashboardState()
+
+
+def merge_deltas(older: dict, newer: dict) -> dict:
+    """Combine two consecutive deltas into one spanning both (for throttled clients)"""
+    if older.get('resync') or newer['base_version'] != older['version']:
+        return {'resync': True, 'version': newer['version']}
+
+    changed = {entry['id']: entry for entry in older['changed']}
+    removed = set(older['removed'])
+    for key in newer['removed']:
+        changed.pop(key, None)
+        removed.add(key)
+    for entry in newer['changed']:
+        changed[entry['id']] = entry
+        removed.discard(str(entry['id']))
+
+    return {
+        'version': newer['version'],
+        'base_version': older['base_version'],
+        'changed': list(changed.values()),
+        'removed': sorted(removed),
+        'summary': newer['summary'],
+    }
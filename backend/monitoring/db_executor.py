@@ -0,0 +1,134 @@
+"""
+Dedicated, bounded thread pool for WebSocket consumer database work
+
+channels' database_sync_to_async defaults to thread_sensitive=True, which
+runs every consumer query in the process on one shared thread, so a single
+slow query stalls every socket. Consumer reads go through this pool instead:
+CONSUMER_DB_WORKERS threads, each with its own connection, cleaned up around
+every call the way channels does it. The time a call waits for a free worker
+is recorded so pool sizing can be tuned from real numbers.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ExecutorMetrics:
+    """Queue-wait and run-time counters for the consumer DB pool"""
+
+    def __init__(self, sample_size: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=sample_size)  # recent queue waits, seconds
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def on_submit(self):
+        with self._lock:
+            self.submitted += 1
+
+    def on_start(self, wait: float):
+        with self._lock:
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._waits.append(wait)
+
+    def on_finish(self, run: float, failed: bool):
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            self.failed += failed
+            self.total_run += run
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            started = self.completed + self.running
+
+            def percentile(fraction):
+                if not waits:
+                    return None
+                return round(waits[min(len(waits) - 1, int(fraction * len(waits)))] * 1000, 2)
+
+            return {
+                'workers': settings.CONSUMER_DB_WORKERS,
+                'submitted': self.submitted,
+                'queued': self.submitted - started,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'queue_wait_ms': {
+                    'mean': round(self.total_wait / started * 1000, 2) if started else None,
+                    'p50': percentile(0.5),
+                    'p95': percentile(0.95),
+                    'p99': percentile(0.99),
+                    'max': round(self.max_wait * 1000, 2),
+                },
+                'mean_run_ms': round(self.total_run / self.completed * 1000, 2) if self.completed else None,
+            }
+
+
+metrics = ExecutorMetrics()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONSUMER_DB_WORKERS,
+                thread_name_prefix='consumer-db'
+            )
+        return _executor
+
+
+def _call(submitted: float, func, args, kwargs):
+    started = time.perf_counter()
+    wait = started - submitted
+    metrics.on_start(wait)
+    if wait > settings.CONSUMER_DB_SLOW_WAIT:
+        logger.warning(f"Consumer DB call {func.__qualname__} waited {wait * 1000:.0f}ms for a worker")
+
+    failed = True
+    close_old_connections()
+    try:
+        result = func(*args, **kwargs)
+        failed = False
+        return result
+    finally:
+        close_old_connections()
+        metrics.on_finish(time.perf_counter() - started, failed)
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Run a blocking ORM call on the consumer DB pool and await its result"""
+    metrics.on_submit()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(_call, time.perf_counter(), func, args, kwargs)
+    )
+
+
+def consumer_db(func):
+    """Decorator counterpart of database_sync_to_async that uses the consumer DB pool"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_executor(func, *args, **kwargs)
+    return wrapper
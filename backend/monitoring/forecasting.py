@@ -0,0 +1,207 @@
+"""
+Incremental AQI forecasting (damped additive Holt-Winters, 24-hour seasonality)
+
+Each location keeps a small persisted state (ForecastState). Incoming AQI
+values are averaged per hour; when an hour completes, its mean is folded into
+the smoothed level, trend and hour-of-day seasonal components in O(1). A
+forecast is then O(horizon) and never rescans history.
+"""
+import logging
+import math
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ForecastState
+
+logger = logging.getLogger(__name__)
+
+SEASON_LENGTH = 24
+MAX_GAP_HOURS = 7 * 24  # longer outages restart the level instead of extrapolating
+
+
+def status_for_aqi(aqi: float) -> str:
+    """Map an AQI value to its EPA category"""
+    if aqi <= 50:
+        return 'GOOD'
+    elif aqi <= 100:
+        return 'MODERATE'
+    elif aqi <= 150:
+        return 'UNHEALTHY_SG'
+    elif aqi <= 200:
+        return 'UNHEALTHY'
+    elif aqi <= 300:
+        return 'VERY_UNHEALTHY'
+    return 'HAZARDOUS'
+
+
+def hour_start(timestamp):
+    """Truncate a datetime to the start of its local hour"""
+    return timezone.localtime(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+def hours_between(start, end) -> int:
+    return int((end - start).total_seconds() // 3600)
+
+
+class HoltWintersModel:
+    """Damped additive Holt-Winters over hourly mean AQI"""
+
+    def __init__(self, level=0.0, trend=0.0, seasonal=None, residual_variance=0.0,
+                 observations=0, alpha=None, beta=None, gamma=None, phi=None):
+        params = settings.FORECAST_SMOOTHING
+        self.alpha = params['alpha'] if alpha is None else alpha
+        self.beta = params['beta'] if beta is None else beta
+        self.gamma = params['gamma'] if gamma is None else gamma
+        self.phi = params['phi'] if phi is None else phi
+
+        self.level = level
+        self.trend = trend
+        self.seasonal = list(seasonal) if seasonal else [0.0] * SEASON_LENGTH
+        self.residual_variance = residual_variance
+        self.observations = observations
+
+    @classmethod
+    def from_state(cls, state: ForecastState) -> 'HoltWintersModel':
+        return cls(
+            level=state.level,
+            trend=state.trend,
+            seasonal=state.seasonal,
+            residual_variance=state.residual_variance,
+            observations=state.observations,
+        )
+
+    def to_state(self, state: ForecastState):
+        state.level = self.level
+        state.trend = self.trend
+        state.seasonal = self.seasonal
+        state.residual_variance = self.residual_variance
+        state.observations = self.observations
+
+    def skip(self, hours: int):
+        """
+        Advance over hours with no data by following the damped trend
+
+        Outages longer than MAX_GAP_HOURS restart the level at the next
+        observation instead (the seasonal profile is kept).
+        """
+        if hours > MAX_GAP_HOURS:
+            self.observations = 0
+            self.trend = 0.0
+            return
+        for _ in range(hours):
+            self.level += self.phi * self.trend
+            self.trend *= self.phi
+
+    def update(self, hour, value: float) -> Optional[float]:
+        """Absorb one hourly mean and return the one-step-ahead residual"""
+        season = timezone.localtime(hour).hour % SEASON_LENGTH
+
+        if self.observations == 0:
+            self.level = value - self.seasonal[season]
+            self.trend = 0.0
+            self.observations = 1
+            return None
+
+        predicted = self.level + self.phi * self.trend + self.seasonal[season]
+        residual = value - predicted
+
+        previous_level = self.level
+        self.level = (
+            self.alpha * (value - self.seasonal[season]) +
+            (1 - self.alpha) * (self.level + self.phi * self.trend)
+        )
+        self.trend = self.beta * (self.level - previous_level) + (1 - self.beta) * self.phi * self.trend
+        self.seasonal[season] = self.gamma * (value - self.level) + (1 - self.gamma) * self.seasonal[season]
+
+        if self.observations == 1:
+            self.residual_variance = residual ** 2
+        else:
+            self.residual_variance = 0.9 * self.residual_variance + 0.1 * residual ** 2
+        self.observations += 1
+        return residual
+
+    def predict(self, last_hour, horizon: int) -> List[Dict]:
+        """Forecast the `horizon` hours following last_hour"""
+        forecast = []
+        damped_trend = 0.0
+        phi_power = 1.0
+        stderr = math.sqrt(self.residual_variance)
+
+        for step in range(1, horizon + 1):
+            phi_power *= self.phi
+            damped_trend += phi_power * self.trend
+            target = last_hour + timedelta(hours=step)
+            season = timezone.localtime(target).hour % SEASON_LENGTH
+            value = max(0.0, self.level + damped_trend + self.seasonal[season])
+            spread = 1.96 * stderr * math.sqrt(1 + (step - 1) * self.alpha ** 2)
+
+            forecast.append({
+                'timestamp': target,
+                'value': value,
+                'lower': max(0.0, value - spread),
+                'upper': value + spread,
+            })
+        return forecast
+
+
+def update_forecast_state(location_id, timestamp, aqi: float):
+    """
+    Fold one AQI value into the location's forecaster state (called on ingest)
+
+    Values are accumulated into the current hour; the completed hour's mean is
+    absorbed into the model once a value for a later hour arrives. Values for
+    hours that were already absorbed are ignored.
+    """
+    hour = hour_start(timestamp)
+    with transaction.atomic():
+        state, _ = ForecastState.objects.select_for_update().get_or_create(
+            location_id=location_id,
+            defaults={'seasonal': [0.0] * SEASON_LENGTH}
+        )
+
+        if state.bucket_start is None:
+            state.bucket_start = hour
+        elif hour < state.bucket_start or (hour == state.bucket_start and not state.bucket_count):
+            # Hour already absorbed (an empty bucket is only left by backtest_forecast --save)
+            return
+        elif hour > state.bucket_start:
+            model = HoltWintersModel.from_state(state)
+            if state.bucket_count:
+                model.update(state.bucket_start, state.bucket_sum / state.bucket_count)
+            model.skip(hours_between(state.bucket_start, hour) - 1)
+            model.to_state(state)
+            state.bucket_start = hour
+            state.bucket_sum = 0.0
+            state.bucket_count = 0
+        
+        state.bucket_sum += aqi
+        state.bucket_count += 1
+        state.save()
+
+
+def forecast_from_state(state: ForecastState, horizon: int, now=None) -> List[Dict]:
+    """
+    Forecast the `horizon` hours after the current hour from persisted state
+
+    Returns an empty list when the state has no data or its latest data is
+    older than MAX_GAP_HOURS.
+    """
+    if state.bucket_start is None:
+        return []
+
+    model = HoltWintersModel.from_state(state)
+    if state.bucket_count:
+        # Fold in the partially filled current hour without persisting it
+        model.update(state.bucket_start, state.bucket_sum / state.bucket_count)
+    if model.observations == 0:
+        return []
+
+    elapsed = hours_between(state.bucket_start, hour_start(now or timezone.now()))
+    if elapsed > MAX_GAP_HOURS:
+        return []
+    elapsed = max(elapsed, 0)
+    return model.predict(state.bucket_start, elapsed + horizon)[elapsed:]
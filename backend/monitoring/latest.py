@@ -0,0 +1,148 @@
+"""
+Process-local cache of the state WebSocket clients receive on connect
+
+Holds the latest serialized AQI calculation per location (from ACTIVE sensors
+only, like the `current` endpoint) and the serialized active, unacknowledged
+alerts. It is warmed once (at ASGI startup, or on the first connect) and then
+kept current by the ingest publisher and the alert and sensor signals, so
+consumer connects and get_current_data/get_active_alerts requests are
+answered without touching the database. A reconnect storm after a deploy
+costs one warm-up instead of one query set per client. Changes made in other
+worker processes arrive through the publisher's `latest_state` group listener
+(see realtime.RealtimePublisher.listen).
+"""
+import json
+import logging
+import threading
+
+from django.db.models import OuterRef, Subquery
+
+from .models import AQICalculation, Alert, Location
+from .serializers import AQICalculationSerializer, AlertSerializer
+from .streaming import encode_json
+
+logger = logging.getLogger(__name__)
+
+
+def _plain(data):
+    return json.loads(encode_json(data))
+
+
+class LatestStateCache:
+    """Latest AQI per location and active alerts, keyed for O(1) lookups"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()  # one warm-up at a time; concurrent callers wait for it
+        self._aqi = {}  # location id -> serialized AQICalculation
+        self._alerts = {}  # alert id -> (location id, serialized Alert)
+        self._warm = False
+
+    @property
+    def is_warm(self) -> bool:
+        return self._warm
+
+    def warm(self):
+        """Load the latest AQI for every location and all active alerts (3 queries)"""
+        with self._warm_lock:
+            self._warm_up()
+
+    def _load_latest_aqi(self, locations) -> dict:
+        """Serialized latest calculation from an ACTIVE sensor, per location id"""
+        latest_ids = locations.annotate(
+            latest_calculation=Subquery(
+                AQICalculation.objects.filter(
+                    sensor_reading__sensor__location=OuterRef('pk'),
+                    sensor_reading__sensor__status='ACTIVE'
+                ).order_by('-calculated_at').values('pk')[:1]
+            )
+        ).values_list('pk', 'latest_calculation')
+        latest_ids = {calc_pk: location_pk for location_pk, calc_pk in latest_ids if calc_pk is not None}
+
+        calculations = AQICalculation.objects.filter(pk__in=latest_ids).select_related(
+            'sensor_reading__sensor__location'
+        )
+        return {
+            str(latest_ids[calculation.pk]): data
+            for calculation, data in zip(calculations, _plain(AQICalculationSerializer(calculations, many=True).data))
+        }
+
+    def _warm_up(self):
+        if self._warm:
+            return
+        aqi = self._load_latest_aqi(Location.objects.all())
+
+        alerts = list(Alert.objects.filter(is_active=True, acknowledged=False).select_related(
+            'sensor__location', 'aqi_calculation'
+        ))
+        alert_data = _plain(AlertSerializer(alerts, many=True).data)
+        active = {str(alert.pk): (str(alert.sensor.location_id), data) for alert, data in zip(alerts, alert_data)}
+
+        with self._lock:
+            if self._warm:
+                return
+            # Updates that raced the warm-up are newer than what was just loaded
+            self._aqi = {**aqi, **self._aqi}
+            self._alerts = {**active, **self._alerts}
+            self._warm = True
+        logger.info(f"Latest-state cache warmed with {len(aqi)} locations and {len(active)} active alerts")
+
+    def set_aqi(self, location_id, aqi_data):
+        """Set a location's latest AQI, or forget it (None) when no sensor there is ACTIVE"""
+        with self._lock:
+            if aqi_data is not None:
+                self._aqi[str(location_id)] = aqi_data
+            else:
+                self._aqi.pop(str(location_id), None)
+
+    def reload_location(self, location_id):
+        """Re-read a location's latest AQI after one of its sensors changed status; returns it"""
+        aqi_data = self._load_latest_aqi(Location.objects.filter(pk=location_id)).get(str(location_id))
+        self.set_aqi(location_id, aqi_data)
+        return aqi_data
+
+    def set_alert(self, location_id, alert_data):
+        """Insert or refresh an alert, dropping it once it is inactive or acknowledged"""
+        with self._lock:
+            if alert_data['is_active'] and not alert_data['acknowledged']:
+                self._alerts[str(alert_data['id'])] = (str(location_id), alert_data)
+            else:
+                self._alerts.pop(str(alert_data['id']), None)
+
+    def discard_alerts(self, alert_ids):
+        """Forget alerts changed through bulk queryset updates (which bypass signals)"""
+        with self._lock:
+            for alert_id in alert_ids:
+                self._alerts.pop(str(alert_id), None)
+
+    def apply_update(self, update: dict):
+        """Fold changes published by another worker process into this cache"""
+        for location_id, aqi_data in update['aqi'].items():
+            self.set_aqi(location_id, aqi_data)
+        for location_id, alert_data in update['alerts']:
+            self.set_alert(location_id, alert_data)
+        self.discard_alerts(update['discarded_alerts'])
+
+    def current_aqi(self, location_id='all') -> list:
+        with self._lock:
+            if location_id == 'all':
+                return list(self._aqi.values())
+            data = self._aqi.get(str(location_id))
+            return [data] if data is not None else []
+
+    def active_alerts(self, location_id='all') -> list:
+        with self._lock:
+            alerts = [
+                data for alert_location, data in self._alerts.values()
+                if location_id == 'all' or alert_location == str(location_id)
+            ]
+        return sorted(alerts, key=lambda data: data['created_at'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._aqi = {}
+            self._alerts = {}
+            self._warm = False
+
+
+latest_state = LatestStateCache()
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from monitoring.models import AQICalculation, Location, ForecastState
+from monitoring.forecasting import HoltWintersModel, hour_start, hours_between, SEASON_LENGTH
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+import math
+
+class Command(BaseCommand):
+    help = 'Replay hourly AQI history through the forecaster and report accuracy per lead time'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Days of history to replay')
+        parser.add_argument('--horizon', type=int, default=24, help='Forecast horizon in hours')
+        parser.add_argument('--warmup', type=int, default=SEASON_LENGTH, help='Hours absorbed before forecasts are scored')
+        parser.add_argument('--location', help='Only replay this location id')
+        parser.add_argument('--save', action='store_true', help='Persist the replayed state as the live forecaster state')
+    
+    def handle(self, *args, **options):
+        horizon = options['horizon']
+        until = hour_start(timezone.now())  # the current hour is still incomplete
+        since = until - timedelta(days=options['days'])
+        
+        calculations = AQICalculation.objects.filter(
+            sensor_reading__timestamp__gte=since,
+            sensor_reading__timestamp__lt=until
+        )
+        if options['location']:
+            calculations = calculations.filter(sensor_reading__sensor__location_id=options['location'])
+        
+        # Hourly mean AQI per location in a single grouped query
+        hourly = calculations.annotate(
+            hour=TruncHour('sensor_reading__timestamp')
+        ).values_list('sensor_reading__sensor__location', 'hour').annotate(
+            avg_aqi=Avg('overall_aqi')
+        ).order_by('sensor_reading__sensor__location', 'hour')
+        
+        names = dict(Location.objects.values_list('id', 'name'))
+        errors = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])  # lead -> n, abs, sq, baseline abs, baseline sq
+        
+        for location_id, rows in groupby(hourly, key=itemgetter(0)):
+            model, last_hour, scored = self.replay(rows, horizon, options['warmup'], errors)
+            self.stdout.write(
+                f"{names.get(location_id, location_id)}: {model.observations} hours replayed, {scored} forecasts scored"
+            )
+            
+            if options['save'] and last_hour is not None:
+                state, _ = ForecastState.objects.get_or_create(location_id=location_id)
+                model.to_state(state)
+                state.bucket_start = last_hour
+                state.bucket_sum = 0.0
+                state.bucket_count = 0
+                state.save()
+        
+        if not errors:
+            self.stdout.write(self.style.WARNING("Not enough history to score any forecasts"))
+            return
+        
+        self.stdout.write(f"\n{'lead':>4}  {'n':>6}  {'MAE':>7}  {'RMSE':>7}  {'persist MAE':>11}  {'persist RMSE':>12}")
+        for lead in sorted(errors):
+            n, abs_error, sq_error, base_abs, base_sq = errors[lead]
+            self.stdout.write(
+                f"{lead:>4}  {n:>6}  {abs_error / n:>7.2f}  {math.sqrt(sq_error / n):>7.2f}  "
+                f"{base_abs / n:>11.2f}  {math.sqrt(base_sq / n):>12.2f}"
+            )
+        
+        if options['save']:
+            self.stdout.write(self.style.SUCCESS("Forecaster state saved"))
+    
+    def replay(self, rows, horizon, warmup, errors):
+        """Feed one location's hourly means through a fresh model, scoring forecasts as actuals arrive"""
+        model = HoltWintersModel()
+        pending = defaultdict(list)  # target hour -> [(lead, predicted, persistence)]
+        last_hour = None
+        scored = 0
+        
+        for _, hour, value in rows:
+            for lead, predicted, baseline in pending.pop(hour, []):
+                totals = errors[lead]
+                totals[0] += 1
+                totals[1] += abs(predicted - value)
+                totals[2] += (predicted - value) ** 2
+                totals[3] += abs(baseline - value)
+                totals[4] += (baseline - value) ** 2
+                scored += 1
+            
+            if last_hour is not None:
+                model.skip(hours_between(last_hour, hour) - 1)
+            model.update(hour, value)
+            last_hour = hour
+            
+            if model.observations >= warmup:
+                for lead, point in enumerate(model.predict(hour, horizon), 1):
+                    pending[point['timestamp']].append((lead, point['value'], value))
+        
+        return model, last_hour, scored
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from monitoring.routing import websocket_urlpatterns
+from monitoring.latest import latest_state
+from monitoring.dashboard import dashboard_state
+from monitoring.db_executor import metrics as db_executor_metrics
+import asyncio
+import statistics
+import time
+
+CONSUMER_PATHS = {
+    'aqi': '/ws/aqi/all/',
+    'alerts': '/ws/alerts/all/',
+    'dashboard': '/ws/dashboard/',
+}
+
+class Command(BaseCommand):
+    help = 'Simulate a WebSocket reconnect storm and report connect-to-first-frame latency and DB queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=5000, help='Clients reconnecting at once')
+        parser.add_argument('--concurrency', type=int, default=500, help='Connects in flight at a time')
+        parser.add_argument('--consumer', choices=sorted(CONSUMER_PATHS), default='aqi', help='Endpoint to connect to')
+        parser.add_argument('--cold', action='store_true', help='Start with empty latest-state caches')
+
+    def handle(self, *args, **options):
+        if options['cold']:
+            latest_state.reset()
+        else:
+            latest_state.warm()
+            dashboard_state.snapshot()
+        connections.close_all()
+
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        def install_counter(sender, connection, **kwargs):
+            connection.execute_wrappers.append(count_queries)
+
+        connection_created.connect(install_counter)
+        try:
+            latencies, elapsed = asyncio.run(self.storm(
+                CONSUMER_PATHS[options['consumer']], options['clients'], options['concurrency']
+            ))
+        finally:
+            connection_created.disconnect(install_counter)
+
+        cuts = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{len(latencies)} connects to {CONSUMER_PATHS[options['consumer']]} in {elapsed:.2f}s "
+            f"({len(latencies) / elapsed:,.0f}/sec), {queries[0]} DB queries"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Connect-to-first-frame latency: p50 {cuts[49] * 1000:.1f}ms, "
+            f"p95 {cuts[94] * 1000:.1f}ms, p99 {cuts[98] * 1000:.1f}ms, max {max(latencies) * 1000:.1f}ms"
+        ))
+        executor = db_executor_metrics.snapshot()
+        self.stdout.write(
+            f"Consumer DB pool: {executor['completed']} calls on {executor['workers']} workers, "
+            f"queue wait {executor['queue_wait_ms']}"
+        )
+
+    async def storm(self, path, clients, concurrency):
+        """Connect all clients, at most `concurrency` at a time, timing each until its first frame"""
+        application = URLRouter(websocket_urlpatterns)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        communicators = []
+
+        async def connect_one():
+            async with semaphore:
+                communicator = WebsocketCommunicator(application, path)
+                started = time.perf_counter()
+                connected, _ = await communicator.connect(timeout=30)
+                if connected:
+                    await communicator.receive_from(timeout=30)
+                    latencies.append(time.perf_counter() - started)
+                communicators.append(communicator)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect_one() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return latencies, elapsed
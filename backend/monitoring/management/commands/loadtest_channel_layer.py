@@ -0,0 +1,135 @@
+from django.core.management.base import BaseCommand, CommandError
+from channels.layers import get_channel_layer
+import asyncio
+import json
+import multiprocessing
+import time
+
+PAYLOAD = {
+    'type': 'aqi_update',
+    'aqi_data': {
+        'sensor_id': 'SENSOR_LOADTEST',
+        'location_name': 'Load Test',
+        'overall_aqi': 87,
+        'aqi_status': 'MODERATE',
+        'dominant_pollutant': 'PM25',
+        'pollutant_data': {'pm25': 28.4, 'pm10': 51.0, 'co': 0.6, 'no2': 21.3, 'so2': 3.2, 'o3': 41.8},
+    },
+}
+
+
+def _worker(index, clients, locations, messages_per_group, ready, start, results):
+    """One 'daphne worker': `clients` channels spread over location groups, each JSON-encoding what it receives"""
+
+    async def run():
+        layer = get_channel_layer()
+        members = [0] * locations
+        channels = []
+        for n in range(clients):
+            channel = await layer.new_channel()
+            location = (index + n) % locations
+            await layer.group_add(f'aqi_loadtest_{location}', channel)
+            members[location] += 1
+            channels.append(channel)
+
+        expected = sum(members) * messages_per_group
+        received = 0
+        done = asyncio.Event()
+        last = [None]
+
+        async def client(channel):
+            nonlocal received
+            while True:
+                message = await layer.receive(channel)
+                json.dumps({'type': message['type'], 'data': message['aqi_data']})
+                received += 1
+                last[0] = time.time()
+                if received >= expected:
+                    done.set()
+
+        tasks = [asyncio.ensure_future(client(channel)) for channel in channels]
+        await asyncio.sleep(0.5)  # let subscriptions settle
+        ready.release()
+        await asyncio.get_running_loop().run_in_executor(None, start.wait)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=120)
+        except asyncio.TimeoutError:
+            pass
+        for task in tasks:
+            task.cancel()
+        results.put((index, received, expected, last[0]))
+        await layer.flush()
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = 'Measure group fan-out throughput of the Redis channel layer across 1..N worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker process counts to test')
+        parser.add_argument('--clients', type=int, default=500, help='WebSocket clients (channels) per worker')
+        parser.add_argument('--locations', type=int, default=50, help='Location groups')
+        parser.add_argument('--messages', type=int, default=20, help='Messages sent to each location group')
+        parser.add_argument('--batch', type=int, default=50, help='Group sends per group_send_many() batch')
+
+    def handle(self, *args, **options):
+        if not hasattr(get_channel_layer(), 'group_send_many'):
+            raise CommandError(
+                "Set CHANNEL_LAYER=redis (and REDIS_CHANNEL_HOSTS, e.g. a run_redis_standin instance) to load test"
+            )
+
+        baseline = None
+        for workers in [int(value) for value in options['workers'].split(',')]:
+            rate = self.run_round(workers, options)
+            baseline = baseline or rate
+            scaling = f"{rate / baseline:.2f}x of 1st round" if baseline else "no baseline yet"
+            self.stdout.write(self.style.SUCCESS(f"{workers} worker(s): {rate:,.0f} deliveries/sec ({scaling})"))
+
+    def run_round(self, workers, options):
+        ready = multiprocessing.Semaphore(0)
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(
+                index, options['clients'], options['locations'], options['messages'], ready, start, results
+            ))
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+
+        groups = [f'aqi_loadtest_{location}' for location in range(options['locations'])]
+        sends = [(group, PAYLOAD) for _ in range(options['messages']) for group in groups]
+
+        async def publish():
+            layer = get_channel_layer()
+            for offset in range(0, len(sends), options['batch']):
+                await layer.group_send_many(sends[offset:offset + options['batch']])
+            await layer.flush()
+
+        started = time.time()
+        start.set()
+        asyncio.run(publish())
+        published = time.time() - started
+
+        finished = [results.get(timeout=180) for _ in processes]
+        for process in processes:
+            process.join()
+
+        delivered = sum(received for _, received, _, _ in finished)
+        expected = sum(expected for _, _, expected, _ in finished)
+        # No worker received anything (e.g. every subscription was lost): zero throughput, not a crash
+        elapsed = max((last for _, _, _, last in finished if last), default=started) - started
+        lost = expected - delivered
+        self.stdout.write(
+            f"{workers} worker(s) x {options['clients']} clients: {len(sends)} group sends published in "
+            f"{published:.2f}s, {delivered}/{expected} deliveries in {elapsed:.2f}s"
+        )
+        if lost:
+            self.stdout.write(self.style.WARNING(
+                f"{workers} worker(s): {lost} deliveries lost ({lost / expected:.1%} of expected)"
+            ))
+        return delivered / elapsed if delivered and elapsed > 0 else 0.0
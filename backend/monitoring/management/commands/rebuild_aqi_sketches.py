@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from monitoring.models import AQICalculation, AQISketch
+from monitoring.forecasting import hour_start
+from monitoring.sketches import TDigest
+from datetime import timedelta
+from itertools import groupby
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly AQI percentile sketches from stored AQI calculations'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Days of history to rebuild')
+        parser.add_argument('--location', help='Only rebuild this location id')
+    
+    def handle(self, *args, **options):
+        since = hour_start(timezone.now() - timedelta(days=options['days']))
+        
+        calculations = AQICalculation.objects.filter(sensor_reading__timestamp__gte=since)
+        sketches = AQISketch.objects.filter(hour__gte=since)
+        if options['location']:
+            calculations = calculations.filter(sensor_reading__sensor__location_id=options['location'])
+            sketches = sketches.filter(location_id=options['location'])
+        
+        rows = calculations.order_by(
+            'sensor_reading__sensor__location', 'sensor_reading__timestamp'
+        ).values_list(
+            'sensor_reading__sensor__location', 'sensor_reading__timestamp', 'overall_aqi'
+        ).iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+        
+        # Rows arrive ordered by (location, timestamp), so each hour is one contiguous group
+        rebuilt = []
+        for (location_id, hour), group in groupby(rows, key=lambda row: (row[0], hour_start(row[1]))):
+            digest = TDigest()
+            for _, _, aqi in group:
+                digest.add(aqi)
+            sketch = AQISketch(location_id=location_id, hour=hour)
+            digest.to_sketch(sketch)
+            rebuilt.append(sketch)
+        
+        with transaction.atomic():
+            deleted, _ = sketches.delete()
+            AQISketch.objects.bulk_create(rebuilt, batch_size=500)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {len(rebuilt)} hourly sketches (replaced {deleted})")
+        )
@@ -0,0 +1,132 @@
+from django.core.management.base import BaseCommand
+import asyncio
+
+PUBSUB_MODE_COMMANDS = {'SUBSCRIBE', 'UNSUBSCRIBE', 'PING', 'QUIT'}
+ACCEPTED_COMMANDS = {'CLIENT', 'SELECT', 'FLUSHDB', 'FLUSHALL', 'RESET'}
+
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def _array(*items) -> bytes:
+    return b'*%d\r\n' % len(items) + b''.join(items)
+
+
+class PubSubStandin:
+    """Single-process Redis-protocol (RESP2) server implementing the pub/sub subset the channel layer uses"""
+
+    def __init__(self):
+        self.subscribers = {}  # channel name -> set of client writers
+        self.published = 0
+        self.delivered = 0
+
+    async def handle(self, reader, writer):
+        subscriptions = set()
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                name = command[0].decode('utf-8', 'replace').upper()
+                args = command[1:]
+
+                if subscriptions and name not in PUBSUB_MODE_COMMANDS:
+                    writer.write(b"-ERR only (P)SUBSCRIBE / (P)UNSUBSCRIBE / PING / QUIT allowed in this context\r\n")
+                elif name == 'PING':
+                    if subscriptions:
+                        writer.write(_array(_bulk('pong'), _bulk(args[0] if args else b'')))
+                    else:
+                        writer.write(_bulk(args[0]) if args else b'+PONG\r\n')
+                elif name == 'PUBLISH' and len(args) == 2:
+                    writer.write(b':%d\r\n' % self.publish(args[0], args[1]))
+                elif name == 'SUBSCRIBE' and args:
+                    for channel in args:
+                        subscriptions.add(channel)
+                        self.subscribers.setdefault(channel, set()).add(writer)
+                        writer.write(_array(_bulk('subscribe'), _bulk(channel), b':%d\r\n' % len(subscriptions)))
+                elif name == 'UNSUBSCRIBE':
+                    channels = args or sorted(subscriptions)
+                    if not channels:
+                        writer.write(_array(_bulk('unsubscribe'), _bulk(None), b':0\r\n'))
+                    for channel in channels:
+                        subscriptions.discard(channel)
+                        self._drop(channel, writer)
+                        writer.write(_array(_bulk('unsubscribe'), _bulk(channel), b':%d\r\n' % len(subscriptions)))
+                elif name == 'QUIT':
+                    writer.write(b'+OK\r\n')
+                    break
+                elif name in ACCEPTED_COMMANDS:
+                    writer.write(b'+OK\r\n')
+                else:
+                    writer.write(f"-ERR unknown command '{name}'\r\n".encode('utf-8'))
+
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._drop(channel, writer)
+            writer.close()
+
+    def publish(self, channel: bytes, payload: bytes) -> int:
+        receivers = self.subscribers.get(channel, ())
+        if receivers:
+            frame = _array(_bulk('message'), _bulk(channel), _bulk(payload))
+            for receiver in receivers:
+                receiver.write(frame)
+        self.published += 1
+        self.delivered += len(receivers)
+        return len(receivers)
+
+    def _drop(self, channel: bytes, writer):
+        receivers = self.subscribers.get(channel)
+        if receivers is not None:
+            receivers.discard(writer)
+            if not receivers:
+                del self.subscribers[channel]
+
+    async def _read_command(self, reader):
+        """Read one RESP array of bulk strings (or an inline command); None on EOF"""
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split() or [b'']
+        items = []
+        for _ in range(int(line[1:])):
+            header = await reader.readline()
+            size = int(header[1:])
+            items.append((await reader.readexactly(size + 2))[:-2])
+        return items
+
+
+class Command(BaseCommand):
+    help = 'Run a local Redis-compatible pub/sub stand-in for testing the Redis channel layer without Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+        parser.add_argument('--port', type=int, default=6379, help='Port to listen on')
+
+    def handle(self, *args, **options):
+        standin = PubSubStandin()
+
+        async def serve():
+            server = await asyncio.start_server(standin.handle, options['host'], options['port'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Redis pub/sub stand-in listening on redis://{options['host']}:{options['port']}"
+            ))
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"Published {standin.published} messages, {standin.delivered} deliveries")
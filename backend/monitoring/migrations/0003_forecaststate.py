@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0002_alert_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastState',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('level', models.FloatField(default=0.0)),
+                ('trend', models.FloatField(default=0.0)),
+                ('seasonal', models.JSONField(default=list, help_text='24 additive hour-of-day offsets')),
+                ('residual_variance', models.FloatField(default=0.0)),
+                ('observations', models.IntegerField(default=0, help_text='Hourly observations absorbed')),
+                ('bucket_start', models.DateTimeField(blank=True, null=True)),
+                ('bucket_sum', models.FloatField(default=0.0)),
+                ('bucket_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_state', to='monitoring.location')),
+            ],
+        ),
+    ]
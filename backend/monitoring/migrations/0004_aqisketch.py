@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0003_forecaststate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AQISketch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('hour', models.DateTimeField()),
+                ('centroids', models.JSONField(default=list)),
+                ('count', models.IntegerField(default=0)),
+                ('min_aqi', models.FloatField(blank=True, null=True)),
+                ('max_aqi', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aqi_sketches', to='monitoring.location')),
+            ],
+            options={
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour'], name='monitoring__hour_a27eda_idx')],
+                'unique_together': {('location', 'hour')},
+            },
+        ),
+    ]
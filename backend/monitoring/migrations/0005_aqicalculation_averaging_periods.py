@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_aqisketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='co_8h',
+            field=models.FloatField(blank=True, help_text='8-hour average CO (ppm)', null=True),
+        ),
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='nowcast_aqi',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(500.0)]),
+        ),
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='o3_8h',
+            field=models.FloatField(blank=True, help_text='8-hour average O3 (ppb)', null=True),
+        ),
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='pm10_24h',
+            field=models.FloatField(blank=True, help_text='24-hour average PM10 (µg/m³)', null=True),
+        ),
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='pm10_nowcast',
+            field=models.FloatField(blank=True, help_text='NowCast PM10 (µg/m³)', null=True),
+        ),
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='pm25_24h',
+            field=models.FloatField(blank=True, help_text='24-hour average PM2.5 (µg/m³)', null=True),
+        ),
+        migrations.AddField(
+            model_name='aqicalculation',
+            name='pm25_nowcast',
+            field=models.FloatField(blank=True, help_text='NowCast PM2.5 (µg/m³)', null=True),
+        ),
+    ]
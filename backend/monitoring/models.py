@@ -12,6 +12,7 @@ class Location(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['name']
@@ -120,6 +121,20 @@ class AQICalculation(models.Model):
     aqi_status = models.CharField(max_length=20, choices=AQI_STATUS_CHOICES)
     dominant_pollutant = models.CharField(max_length=10)  # PM25, PM10, CO, NO2, SO2, O3
     
+    # Averaging-period concentrations (null until the sensor's window has enough data)
+    pm25_nowcast = models.FloatField(null=True, blank=True, help_text="NowCast PM2.5 (µg/m³)")
+    pm10_nowcast = models.FloatField(null=True, blank=True, help_text="NowCast PM10 (µg/m³)")
+    pm25_24h = models.FloatField(null=True, blank=True, help_text="24-hour average PM2.5 (µg/m³)")
+    pm10_24h = models.FloatField(null=True, blank=True, help_text="24-hour average PM10 (µg/m³)")
+    co_8h = models.FloatField(null=True, blank=True, help_text="8-hour average CO (ppm)")
+    o3_8h = models.FloatField(null=True, blank=True, help_text="8-hour average O3 (ppb)")
+    
+    # AQI from NowCast PM and 8-hour CO/O3 instead of instantaneous concentrations
+    nowcast_aqi = models.FloatField(
+        null=True, blank=True,
+        validators=[MinValueValidator(0.0), MaxValueValidator(500.0)]
+    )
+    
     calculated_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -176,6 +191,7 @@ class Alert(models.Model):
             models.Index(fields=['sensor', '-created_at']),
             models.Index(fields=['severity', 'is_active']),
             models.Index(fields=['alert_type']),
+            models.Index(fields=['-updated_at']),
         ]
     
     def __str__(self):
@@ -210,4 +226,50 @@ class UserPreference(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"Preferences for {self.location.name}"
\ No newline at end of file
+        return f"Preferences for {self.location.name}"
+
+class ForecastState(models.Model):
+    """Model to store incremental Holt-Winters forecaster state per location"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, related_name='forecast_state')
+    
+    # Smoothed components (hourly resolution, 24-hour seasonality)
+    level = models.FloatField(default=0.0)
+    trend = models.FloatField(default=0.0)
+    seasonal = models.JSONField(default=list, help_text="24 additive hour-of-day offsets")
+    residual_variance = models.FloatField(default=0.0)
+    observations = models.IntegerField(default=0, help_text="Hourly observations absorbed")
+    
+    # Hour currently being accumulated from incoming readings
+    bucket_start = models.DateTimeField(null=True, blank=True)
+    bucket_sum = models.FloatField(default=0.0)
+    bucket_count = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Forecast state for {self.location.name} ({self.observations} hours)"
+
+class AQISketch(models.Model):
+    """Model to store a mergeable t-digest of AQI values per location per hour"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='aqi_sketches')
+    hour = models.DateTimeField()
+    
+    # Digest centroids as [mean, weight] pairs sorted by mean
+    centroids = models.JSONField(default=list)
+    count = models.IntegerField(default=0)
+    min_aqi = models.FloatField(null=True, blank=True)
+    max_aqi = models.FloatField(null=True, blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-hour']
+        unique_together = ['location', 'hour']
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+    
+    def __str__(self):
+        return f"AQI sketch for {self.location.name} at {self.hour}"
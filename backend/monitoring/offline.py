@@ -0,0 +1,155 @@
+"""
+Deadline-based sensor offline detection
+
+Every ingested reading pushes the sensor's next expected-reading deadline onto
+a min-heap (O(log n)); superseded deadlines are skipped lazily when popped. A
+daemon thread sleeps until the earliest deadline, and when one passes without
+a newer reading it raises a SENSOR_OFFLINE alert and flips the sensor to
+INACTIVE. No periodic fleet-wide scan is needed. The next reading from the
+sensor reactivates it (see signals.check_sensor_status).
+
+Each worker process runs its own monitor, started at ASGI startup, and only
+sees the readings it ingested itself. An expired deadline is therefore
+re-checked against the database first; if another process stored a newer
+reading, the deadline is re-armed from it instead.
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Alert, Sensor, SensorReading
+from .realtime import publisher
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineMonitor:
+    """Min-heap of per-sensor reading deadlines with a background expiry thread"""
+
+    def __init__(self):
+        self._heap = []  # (deadline epoch seconds, sensor pk)
+        self._deadlines = {}  # sensor pk -> current deadline
+        self._condition = threading.Condition()
+        self._thread = None
+
+    @property
+    def timeout(self) -> float:
+        return settings.SENSOR_OFFLINE_TIMEOUT
+
+    def _push(self, sensor_pk, deadline: float):
+        """Record a sensor's deadline; caller holds the condition"""
+        self._deadlines[sensor_pk] = deadline
+        wake = not self._heap or deadline < self._heap[0][0]
+        heapq.heappush(self._heap, (deadline, sensor_pk))
+
+        # Drop superseded entries once they dominate the heap
+        if len(self._heap) > 4 * len(self._deadlines) + 64:
+            self._heap = [(d, pk) for pk, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        if wake:
+            self._condition.notify()
+
+    def touch(self, sensor_pk):
+        """A reading arrived: the sensor is expected again within the timeout"""
+        if not settings.SENSOR_OFFLINE_MONITOR:
+            return
+        self.start()
+        with self._condition:
+            self._push(sensor_pk, time.time() + self.timeout)
+
+    def start(self):
+        """Seed deadlines from each active sensor's latest reading and start the expiry thread"""
+        if self._thread is not None or not settings.SENSOR_OFFLINE_MONITOR:
+            return
+        with self._condition:
+            if self._thread is not None:
+                return
+            latest = Sensor.objects.filter(status='ACTIVE').annotate(
+                last_reading=Max('readings__timestamp')
+            ).values_list('pk', 'last_reading')
+            for sensor_pk, last_reading in latest:
+                if last_reading is not None:
+                    self._push(sensor_pk, last_reading.timestamp() + self.timeout)
+
+            self._thread = threading.Thread(target=self._run, name='sensor-offline-monitor', daemon=True)
+            self._thread.start()
+            logger.info(f"Sensor offline monitor started with {len(self._deadlines)} sensors")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._condition.wait(self._heap[0][0] - now if self._heap else None)
+
+                expired = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, sensor_pk = heapq.heappop(self._heap)
+                    if self._deadlines.get(sensor_pk) == deadline:
+                        del self._deadlines[sensor_pk]
+                        expired.append((sensor_pk, deadline))
+
+            for sensor_pk, deadline in expired:
+                self._mark_offline(sensor_pk, deadline)
+            if expired:
+                connection.close()
+
+    def _mark_offline(self, sensor_pk, deadline: float):
+        try:
+            now = timezone.now()
+            last_seen = datetime.fromtimestamp(deadline - self.timeout, tz=dt_timezone.utc)
+
+            # The reading may have been ingested by another worker process
+            latest = SensorReading.objects.filter(
+                sensor_id=sensor_pk, timestamp__gt=last_seen
+            ).aggregate(latest=Max('timestamp'))['latest']
+            if latest is not None:
+                with self._condition:
+                    if sensor_pk not in self._deadlines:
+                        self._push(sensor_pk, latest.timestamp() + self.timeout)
+                return
+
+            # Only ACTIVE sensors go offline; MAINTENANCE/ERROR are left alone
+            if not Sensor.objects.filter(pk=sensor_pk, status='ACTIVE').update(status='INACTIVE', updated_at=now):
+                return
+
+            sensor = Sensor.objects.select_related('location').get(pk=sensor_pk)
+            # The queryset update above bypasses the Sensor post_save signal
+            publisher.sensor_status_changed(sensor.location_id)
+            if not Alert.objects.filter(sensor=sensor, alert_type='SENSOR_OFFLINE', is_active=True).exists():
+                Alert.objects.create(
+                    sensor=sensor,
+                    alert_type='SENSOR_OFFLINE',
+                    severity='WARNING',
+                    title=f"Sensor Offline - {sensor.location.name}",
+                    message=(
+                        f"No readings from {sensor.sensor_id} since {last_seen:%Y-%m-%d %H:%M:%S} UTC "
+                        f"(expected every {self.timeout:g} seconds)."
+                    ),
+                    threshold_value=self.timeout,
+                    actual_value=round((now - last_seen).total_seconds(), 1)
+                )
+            logger.info(f"Sensor {sensor.sensor_id} marked offline")
+
+        except Exception as e:
+            logger.error(f"Error marking sensor {sensor_pk} offline: {e}")
+
+    def snapshot(self) -> dict:
+        """Current deadlines (sensor pk -> datetime) for health reporting"""
+        with self._condition:
+            return {
+                sensor_pk: datetime.fromtimestamp(deadline, tz=dt_timezone.utc)
+                for sensor_pk, deadline in self._deadlines.items()
+            }
+
+
+offline_monitor = OfflineMonitor()
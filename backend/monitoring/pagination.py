@@ -0,0 +1,169 @@
+"""
+Keyset (cursor) pagination for the large, append-only tables
+"""
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset) -> int:
+    """
+    Estimate the number of rows a queryset returns
+
+    On PostgreSQL this reads the planner's row estimate from EXPLAIN, which
+    costs no table scan. Other backends fall back to an exact COUNT(*).
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (ordering_field, id), newest first
+
+    Pages are selected with a WHERE on the last seen (value, id) pair rather
+    than an OFFSET, so deep pages cost the same as the first one, and no
+    COUNT(*) is issued unless the client asks for ?count=estimate or
+    ?count=exact.
+    """
+    ordering_field = None
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        field = self.ordering_field
+
+        if cursor is None:
+            reverse = False
+            queryset = queryset.order_by(f'-{field}', '-pk')
+        else:
+            reverse, value, pk = cursor
+            if reverse:
+                queryset = queryset.order_by(field, 'pk').filter(
+                    Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+                )
+            else:
+                queryset = queryset.order_by(f'-{field}', '-pk').filter(
+                    Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+                )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        if mode == 'exact':
+            return queryset.count()
+        return None
+
+    def decode_cursor(self, request, model):
+        """Decode and type-check the cursor so malformed values never reach the query"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'), keep_blank_values=True)
+            reverse = tokens['r'][0] == '1'
+            value = model._meta.get_field(self.ordering_field).to_python(tokens['v'][0])
+            pk = model._meta.pk.to_python(tokens['k'][0])
+            if value is None or pk is None:
+                raise ValueError('Incomplete cursor')
+        except (TypeError, ValueError, KeyError, IndexError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, value, pk
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.ordering_field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        querystring = parse.urlencode({'r': '1' if reverse else '0', 'v': value, 'k': str(obj.pk)})
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+
+class SensorReadingPagination(KeysetPagination):
+    """Keyset pagination over SensorReading, backed by the timestamp index"""
+    ordering_field = 'timestamp'
+
+
+class AQICalculationPagination(KeysetPagination):
+    """Keyset pagination over AQICalculation, backed by the calculated_at index"""
+    ordering_field = 'calculated_at'
+
+
+class AlertPagination(KeysetPagination):
+    """Keyset pagination over Alert, backed by the created_at indexes"""
+    ordering_field = 'created_at'
@@ -0,0 +1,293 @@
+"""
+Coalescing fan-out of ingest events to the WebSocket consumer groups
+
+The ingest pipeline hands serialized AQI calculations and new alerts to the
+publisher, which holds them for REALTIME_COALESCE_WINDOW seconds. Within a
+window only the latest AQI per location is kept, so a burst of readings
+(e.g. a bulk upload) produces one `aqi_update` per location, sent to
+`aqi_<location>` and `aqi_all`. New alerts go to `alerts_<location>` and
+`alerts_all`. The `dashboard` group gets one change set per window, covering
+only the locations touched in it, which each receiving process turns into a
+versioned delta for its clients (see dashboard.DashboardState).
+
+Each flush also sends everything that changed the connect-time cache (latest
+AQI, new and updated alerts, sensors going inactive) and the readings added
+to the rolling statistics to the `latest_state` group. Every worker process
+subscribes one listener channel to it at startup and applies what other
+processes published to its own latest.latest_state, rolling_stats and
+anomaly_detector.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.db import connection
+
+from .anomaly import anomaly_detector
+from .dashboard import dashboard_state
+from .latest import latest_state
+from .rolling_stats import rolling_stats
+from .streaming import encode_json
+
+logger = logging.getLogger(__name__)
+
+LATEST_STATE_GROUP = 'latest_state'
+LISTEN_TIMEOUT = 10  # seconds to wait for the latest-state subscription at startup
+
+
+def to_message_data(data):
+    """Normalize serializer output into plain JSON types the channel layer can encode"""
+    return json.loads(encode_json(data))
+
+
+class RealtimePublisher:
+    """Per-process buffer of pending group messages, flushed once per coalescing window"""
+
+    def __init__(self):
+        self._pending_aqi = {}  # location id -> latest serialized AQI calculation
+        self._pending_alerts = []  # (location id, serialized alert)
+        self._dirty_locations = set()  # locations whose dashboard card may have changed
+        self._pending_latest = {}  # location id -> latest AQI for other processes' caches (None: drop it)
+        self._pending_alert_changes = []  # (location id, serialized alert) updated in place
+        self._pending_discards = []  # alert ids dropped through bulk updates
+        self._pending_readings = []  # [sensor pk, timestamp, values] for other processes' rolling stats and anomaly detectors
+        self._origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._timer = None
+        self._loop = None
+        self._private_loop = None
+        self._stats = {'aqi_received': 0, 'aqi_sent': 0, 'alerts_sent': 0, 'flushes': 0, 'dashboard_deltas': 0}
+
+    def attach_loop(self, loop):
+        """
+        Remember the server's event loop (called by consumers on connect)
+
+        Group sends are scheduled onto it, because the in-memory channel layer's
+        queues can only be woken from the loop that is waiting on them.
+        """
+        self._loop = loop
+
+    def _send_loop(self):
+        """
+        The attached server loop, or else a long-lived private one
+
+        Reusing one loop keeps the channel layer's per-loop connections open
+        between flushes (e.g. in a worker that serves no WebSockets itself).
+        """
+        if self._loop is not None and self._loop.is_running():
+            return self._loop
+        with self._lock:
+            if self._private_loop is None:
+                self._private_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._private_loop.run_forever, name='realtime-publisher', daemon=True
+                ).start()
+            return self._private_loop
+
+    def publish_aqi(self, location_id, aqi_data):
+        latest_state.set_aqi(location_id, aqi_data)
+        if not settings.REALTIME_PUBLISH:
+            return
+        with self._lock:
+            self._pending_aqi[str(location_id)] = aqi_data
+            self._pending_latest[str(location_id)] = aqi_data
+            self._dirty_locations.add(str(location_id))
+            self._stats['aqi_received'] += 1
+            self._schedule()
+
+    def publish_alert(self, location_id, alert_data):
+        latest_state.set_alert(location_id, alert_data)
+        if not settings.REALTIME_PUBLISH:
+            return
+        with self._lock:
+            self._pending_alerts.append((str(location_id), alert_data))
+            self._dirty_locations.add(str(location_id))
+            self._schedule()
+
+    def publish_alert_change(self, location_id, alert_data):
+        """An existing alert changed (acknowledged, resolved, updated): refresh every process's cache"""
+        latest_state.set_alert(location_id, alert_data)
+        if not settings.REALTIME_PUBLISH:
+            return
+        with self._lock:
+            self._pending_alert_changes.append((str(location_id), alert_data))
+            self._schedule()
+
+    def discard_alerts(self, alert_ids):
+        """Alerts deactivated through bulk queryset updates (which bypass signals)"""
+        alert_ids = [str(alert_id) for alert_id in alert_ids]
+        latest_state.discard_alerts(alert_ids)
+        if not settings.REALTIME_PUBLISH or not alert_ids:
+            return
+        with self._lock:
+            self._pending_discards.extend(alert_ids)
+            self._schedule()
+
+    def publish_reading(self, reading, aqi):
+        """Add a reading to the rolling statistics here and in every other process"""
+        values = rolling_stats.record(reading, aqi)
+        if not settings.REALTIME_PUBLISH:
+            return
+        with self._lock:
+            self._pending_readings.append([str(reading.sensor_id), reading.timestamp.isoformat(), values])
+            self._schedule()
+
+    def sensor_status_changed(self, location_id):
+        """Re-read the location's latest AQI from its ACTIVE sensors and share it"""
+        aqi_data = latest_state.reload_location(location_id)
+        if not settings.REALTIME_PUBLISH:
+            return
+        with self._lock:
+            self._pending_latest[str(location_id)] = aqi_data
+            self._dirty_locations.add(str(location_id))
+            self._schedule()
+
+    def mark_dashboard(self, location_id):
+        """Flag a location's dashboard card as stale (e.g. an alert was acknowledged)"""
+        if not settings.REALTIME_PUBLISH:
+            return
+        with self._lock:
+            self._dirty_locations.add(str(location_id))
+            self._schedule()
+
+    def _schedule(self):
+        """Start the window timer if one is not already running; caller holds the lock"""
+        if self._timer is None:
+            self._timer = threading.Timer(settings.REALTIME_COALESCE_WINDOW, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Send everything buffered in the current window"""
+        with self._lock:
+            aqi_updates, self._pending_aqi = self._pending_aqi, {}
+            alerts, self._pending_alerts = self._pending_alerts, []
+            dirty_locations, self._dirty_locations = self._dirty_locations, set()
+            latest, self._pending_latest = self._pending_latest, {}
+            alert_changes, self._pending_alert_changes = self._pending_alert_changes, []
+            discards, self._pending_discards = self._pending_discards, []
+            readings, self._pending_readings = self._pending_readings, []
+            self._timer = None
+
+        if not (aqi_updates or alerts or dirty_locations or alert_changes or discards or readings):
+            return
+
+        dashboard_changes = None
+        if dirty_locations:
+            try:
+                dashboard_changes = dashboard_state.collect_changes(dirty_locations)
+            except Exception as e:
+                logger.error(f"Error collecting dashboard changes: {e}")
+
+        messages = []
+        for location_id, aqi_data in aqi_updates.items():
+            event = {'type': 'aqi_update', 'location_id': location_id, 'aqi_data': aqi_data}
+            messages.append((f'aqi_{location_id}', event))
+            messages.append(('aqi_all', event))
+        for location_id, alert_data in alerts:
+            event = {'type': 'new_alert', 'alert_data': alert_data}
+            messages.append((f'alerts_{location_id}', event))
+            messages.append(('alerts_all', event))
+        if dashboard_changes is not None:
+            messages.append(('dashboard', {'type': 'dashboard_update', 'changes': dashboard_changes}))
+        if latest or alerts or alert_changes or discards or readings:
+            messages.append((LATEST_STATE_GROUP, {
+                'type': 'latest_state_update',
+                'origin': self._origin,
+                'aqi': latest,
+                'alerts': [list(item) for item in alerts + alert_changes],
+                'discarded_alerts': discards,
+                'readings': readings,
+            }))
+        if not messages:
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._send(messages), self._send_loop()).result()
+        except Exception as e:
+            logger.error(f"Error publishing realtime updates: {e}")
+            return
+
+        with self._lock:
+            self._stats['aqi_sent'] += len(aqi_updates)
+            self._stats['alerts_sent'] += len(alerts)
+            self._stats['flushes'] += 1
+            if dashboard_changes is not None:
+                self._stats['dashboard_deltas'] += 1
+
+    async def _send(self, messages):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        if hasattr(channel_layer, 'group_send_many'):
+            # One pipelined round trip per shard (see channel_layers)
+            await channel_layer.group_send_many(messages)
+            return
+        for group, event in messages:
+            await channel_layer.group_send(group, event)
+
+    def listen(self):
+        """
+        Apply other processes' latest-state changes and readings to this process (called at ASGI startup)
+
+        Not needed with the in-memory layer, which only works within a single
+        process where every change is already applied as it is published.
+        """
+        channel_layer = get_channel_layer()
+        if channel_layer is None or isinstance(channel_layer, InMemoryChannelLayer):
+            return
+        loop = self._send_loop()
+        channel = asyncio.run_coroutine_threadsafe(self._subscribe(channel_layer), loop).result(LISTEN_TIMEOUT)
+        asyncio.run_coroutine_threadsafe(self._listen(channel_layer, channel), loop)
+
+    async def _subscribe(self, channel_layer):
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(LATEST_STATE_GROUP, channel)
+        return channel
+
+    async def _listen(self, channel_layer, channel):
+        while True:
+            try:
+                message = await channel_layer.receive(channel)
+                if message.get('origin') != self._origin:
+                    latest_state.apply_update(message)
+                    rolling_stats.apply_update(message)
+                    anomaly_detector.apply_update(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error applying latest-state update: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+publisher = RealtimePublisher()
+
+
+def warm_realtime_state():
+    """Load the connect-time caches so the first wave of WebSocket clients is served from memory"""
+    try:
+        # Subscribe first, so changes published during the warm-up aren't missed
+        publisher.listen()
+    except Exception as e:
+        logger.error(f"Error subscribing to latest-state updates: {e}")
+    try:
+        latest_state.warm()
+        dashboard_state.snapshot()
+    except Exception as e:
+        logger.error(f"Error warming realtime caches: {e}")
+    finally:
+        connection.close()
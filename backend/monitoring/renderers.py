@@ -0,0 +1,85 @@
+"""
+Renderers for the columnar time-series formats (?format=columnar|packed|arrow)
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+from .columnar import pack_columnar
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is optional
+    pa = None
+
+
+def is_columnar(data) -> bool:
+    return isinstance(data, dict) and 'series' in data and 'columns' in data
+
+
+def render_json_fallback(data, renderer_context):
+    """Render errors and other non-columnar payloads as JSON, labelled as JSON"""
+    response = (renderer_context or {}).get('response')
+    if response is not None:
+        response['Content-Type'] = 'application/json'
+    return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON rendering of per-sensor column arrays"""
+    format = 'columnar'
+
+
+class PackedFloatRenderer(BaseRenderer):
+    """Binary rendering of per-sensor column arrays as packed float64 (see pack_columnar)"""
+    media_type = 'application/octet-stream'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not is_columnar(data):
+            return render_json_fallback(data, renderer_context)
+        return pack_columnar(data)
+
+
+class ArrowIPCRenderer(BaseRenderer):
+    """Arrow IPC stream rendering of per-sensor column arrays (requires the optional pyarrow package)"""
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not is_columnar(data):
+            return render_json_fallback(data, renderer_context)
+
+        value_keys = data['columns'][1:]
+        columns = {'sensor_id': [], 'location': [], 'timestamp': []}
+        columns.update((key, []) for key in value_keys)
+        for entry in data['series']:
+            length = len(entry['timestamps'])
+            columns['sensor_id'].extend([entry['sensor_id']] * length)
+            columns['location'].extend([entry['location']] * length)
+            columns['timestamp'].extend(entry['timestamps'])
+            for key in value_keys:
+                columns[key].extend(entry[key])
+
+        table = pa.table({
+            'sensor_id': pa.array(columns['sensor_id']).dictionary_encode(),
+            'location': pa.array(columns['location']).dictionary_encode(),
+            'timestamp': pa.array(columns['timestamp'], type=pa.timestamp('us', tz='UTC')),
+            **{key: pa.array(columns[key], type=pa.float64()) for key in value_keys},
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+COLUMNAR_FORMATS = ('columnar', 'packed', 'arrow')
+
+COLUMNAR_RENDERER_CLASSES = [
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    ColumnarJSONRenderer,
+    PackedFloatRenderer,
+] + ([ArrowIPCRenderer] if pa is not None else [])
@@ -0,0 +1,114 @@
+"""
+Response cache for read endpoints, invalidated by per-location generation counters
+
+Every cached response key embeds the current generation of the data it was
+built from: the location's counter for location-scoped requests, or the
+global counter otherwise. Ingest bumps both counters, so stale entries are
+never read again and simply expire on their TTL.
+"""
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_GENERATION_KEY = 'aqi:gen:all'
+LOCATION_GENERATION_KEY = 'aqi:gen:loc:{}'
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def bump_generation(location_id=None):
+    """Invalidate cached responses for a location (and all fleet-wide responses)"""
+    keys = [GLOBAL_GENERATION_KEY]
+    if location_id:
+        keys.append(LOCATION_GENERATION_KEY.format(location_id))
+
+    for key in keys:
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, 1, timeout=None)
+        except Exception as e:
+            logger.error(f"Error bumping cache generation {key}: {e}")
+
+
+def get_generation(location_id=None) -> int:
+    """Return the current generation for a location, or the global one"""
+    key = LOCATION_GENERATION_KEY.format(location_id) if location_id else GLOBAL_GENERATION_KEY
+    return cache.get(key, 0)
+
+
+def make_cache_key(endpoint: str, request) -> str:
+    """Build a cache key from the endpoint, normalized query params and data generation"""
+    params = sorted((key, sorted(request.GET.getlist(key))) for key in request.GET.keys())
+    digest = hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+    location_id = request.GET.get('location')
+    generation = get_generation(location_id)
+    scope = f'loc:{location_id}' if location_id else 'all'
+    return f'aqi:resp:{endpoint}:{scope}:{generation}:{digest}'
+
+
+def _record(endpoint: str, hit: bool):
+    with _stats_lock:
+        _stats[endpoint]['hits' if hit else 'misses'] += 1
+
+
+def get_cache_stats() -> dict:
+    """Return hit/miss counters per endpoint for this process"""
+    with _stats_lock:
+        snapshot = {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+
+    for counts in snapshot.values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_rate'] = round(counts['hits'] / total, 4) if total else 0.0
+    return snapshot
+
+
+def cached_response(endpoint: str):
+    """
+    Decorator caching successful DRF responses per endpoint and query params
+
+    TTLs come from settings.RESPONSE_CACHE_TTLS[endpoint] (falling back to the
+    'default' entry). Use method_decorator() to apply it to viewset actions.
+    Cache backend errors are logged and the view is computed normally.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            ttls = settings.RESPONSE_CACHE_TTLS
+            ttl = ttls.get(endpoint, ttls['default'])
+
+            try:
+                key = make_cache_key(endpoint, request)
+                data = cache.get(key)
+            except Exception as e:
+                logger.error(f"Error reading response cache for {endpoint}: {e}")
+                return view_func(request, *args, **kwargs)
+
+            if data is not None:
+                _record(endpoint, hit=True)
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _record(endpoint, hit=False)
+            response = view_func(request, *args, **kwargs)
+
+            if response.status_code == 200 and getattr(response, 'data', None) is not None:
+                try:
+                    cache.set(key, response.data, timeout=ttl)
+                except Exception as e:
+                    logger.error(f"Error writing response cache for {endpoint}: {e}")
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,218 @@
+"""
+In-memory rolling-window statistics (last 1h / 24h avg, min, max) per sensor
+
+Each sensor holds two fixed-size rings of time slots stored in flat
+array('f') / array('l') buffers: 5-minute slots covering the last hour and
+hourly slots covering the last day. A reading updates one slot in each ring,
+and a window aggregate reads at most 24 slots, so neither ingest nor reads
+depend on how many readings the window contains and memory per sensor is
+fixed. The service is warmed from the database at ASGI startup (or, failing
+that, the first time it is used in a process) and then fed by the ingest
+signal through realtime.publisher, which also shares each recorded reading
+with the other worker processes over the `latest_state` group, so every
+worker's windows cover every reading. With REALTIME_PUBLISH off nothing is
+shared and the windows only see the process's own ingests, which is only
+correct in a single-process deployment.
+"""
+import logging
+import math
+import threading
+from array import array
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Sensor, SensorReading
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('pm25', 'pm10', 'co', 'no2', 'so2', 'o3', 'aqi')
+
+
+class SlotRing:
+    """Ring of `slots` time slots of `seconds` each, with count/sum/min/max per metric"""
+
+    def __init__(self, slots: int, seconds: int):
+        self.slots = slots
+        self.seconds = seconds
+        width = slots * len(METRICS)
+        self.tags = array('q', [-1] * slots)
+        self.counts = array('l', [0] * width)
+        self.sums = array('f', [0.0] * width)
+        self.mins = array('f', [0.0] * width)
+        self.maxs = array('f', [0.0] * width)
+
+    def tag_for(self, timestamp) -> int:
+        return int(timestamp.timestamp() // self.seconds)
+
+    def add(self, timestamp, values: Dict[str, Optional[float]]):
+        tag = self.tag_for(timestamp)
+        slot = tag % self.slots
+        if self.tags[slot] > tag:
+            return  # older than the window
+        base = slot * len(METRICS)
+        if self.tags[slot] != tag:
+            self.tags[slot] = tag
+            for offset in range(len(METRICS)):
+                self.counts[base + offset] = 0
+                self.sums[base + offset] = 0.0
+
+        for offset, metric in enumerate(METRICS):
+            value = values.get(metric)
+            if value is None:
+                continue
+            index = base + offset
+            if self.counts[index]:
+                self.mins[index] = min(self.mins[index], value)
+                self.maxs[index] = max(self.maxs[index], value)
+            else:
+                self.mins[index] = self.maxs[index] = value
+            self.counts[index] += 1
+            self.sums[index] += value
+
+    def aggregate(self, now) -> Dict[str, dict]:
+        """avg/min/max/count per metric over the slots ending at `now`"""
+        current = self.tag_for(now)
+        result = {}
+        for offset, metric in enumerate(METRICS):
+            count = 0
+            total = 0.0
+            low = math.inf
+            high = -math.inf
+            for age in range(self.slots):
+                slot = (current - age) % self.slots
+                index = slot * len(METRICS) + offset
+                if self.tags[slot] != current - age or not self.counts[index]:
+                    continue
+                count += self.counts[index]
+                total += self.sums[index]
+                low = min(low, self.mins[index])
+                high = max(high, self.maxs[index])
+            result[metric] = {
+                'avg': round(total / count, 2) if count else None,
+                'min': round(low, 2) if count else None,
+                'max': round(high, 2) if count else None,
+                'count': count,
+            }
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            buffer.itemsize * len(buffer)
+            for buffer in (self.tags, self.counts, self.sums, self.mins, self.maxs)
+        )
+
+
+class SensorWindows:
+    """Last-hour (5-minute slots) and last-day (hourly slots) rings for one sensor"""
+
+    def __init__(self):
+        self.hour = SlotRing(12, 300)
+        self.day = SlotRing(24, 3600)
+        self.last_timestamp = None
+
+    def add(self, timestamp, values):
+        self.hour.add(timestamp, values)
+        self.day.add(timestamp, values)
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+
+    def summary(self, now) -> dict:
+        return {
+            'last_reading': self.last_timestamp,
+            '1h': self.hour.aggregate(now),
+            '24h': self.day.aggregate(now),
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self.hour.nbytes + self.day.nbytes
+
+
+class RollingStatsService:
+    """Process-level registry of per-sensor rolling windows"""
+
+    def __init__(self):
+        self._sensors = {}
+        self._lock = threading.Lock()
+        self._warmed = False
+
+    def _ensure_warm(self) -> bool:
+        """Load the last 24h of readings once per process; returns True if it ran now"""
+        if self._warmed:
+            return False
+        with self._lock:
+            if self._warmed:
+                return False
+            since = timezone.now() - timedelta(hours=24)
+            rows = SensorReading.objects.filter(timestamp__gte=since).values_list(
+                'sensor', 'timestamp', 'pm25', 'pm10', 'co', 'no2', 'so2', 'o3',
+                'aqi_calculation__overall_aqi'
+            ).order_by().iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+
+            for sensor_pk, timestamp, *values in rows:
+                windows = self._sensors.get(sensor_pk)
+                if windows is None:
+                    windows = self._sensors[sensor_pk] = SensorWindows()
+                windows.add(timestamp, dict(zip(METRICS, values)))
+            self._warmed = True
+            logger.info(f"Rolling stats warmed for {len(self._sensors)} sensors")
+            return True
+
+    def warm(self):
+        """Run the 24h warm-up now (at startup) so no request pays for it"""
+        try:
+            self._ensure_warm()
+        except Exception as e:
+            logger.error(f"Error warming rolling stats: {e}")
+        finally:
+            connection.close()
+
+    def record(self, reading, aqi: Optional[float] = None) -> dict:
+        """Add a saved reading (and its AQI) to its sensor's windows; returns the values added"""
+        values = {metric: getattr(reading, metric) for metric in METRICS[:-1]}
+        values['aqi'] = aqi
+        self.add(reading.sensor_id, reading.timestamp, values)
+        return values
+
+    def add(self, sensor_pk, timestamp, values: Dict[str, Optional[float]]):
+        """Add one reading's values (keyed by METRICS) to a sensor's windows"""
+        if self._ensure_warm():
+            return  # the warm-up query already included this reading
+        with self._lock:
+            windows = self._sensors.get(sensor_pk)
+            if windows is None:
+                windows = self._sensors[sensor_pk] = SensorWindows()
+            windows.add(timestamp, values)
+
+    def apply_update(self, update: dict):
+        """Fold readings recorded by another worker process into these windows"""
+        for sensor_pk, timestamp, values in update['readings']:
+            self.add(Sensor._meta.pk.to_python(sensor_pk), parse_datetime(timestamp), values)
+
+    def get(self, sensor_pk, now=None) -> Optional[dict]:
+        """Rolling 1h/24h aggregates for one sensor, or None if it has no recent data"""
+        self._ensure_warm()
+        with self._lock:
+            windows = self._sensors.get(sensor_pk)
+            if windows is None:
+                return None
+            return windows.summary(now or timezone.now())
+
+    def memory_report(self) -> dict:
+        with self._lock:
+            sensors = len(self._sensors)
+            per_sensor = SensorWindows().nbytes
+        return {
+            'sensors': sensors,
+            'bytes_per_sensor': per_sensor,
+            'total_bytes': sensors * per_sensor,
+        }
+
+
+rolling_stats = RollingStatsService()
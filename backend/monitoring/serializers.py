@@ -69,8 +69,9 @@ class AQICalculationSerializer(serializers.ModelSerializer):
         model = AQICalculation
         fields = ['id', 'sensor_id', 'location_name', 'timestamp', 
                  'aqi_pm25', 'aqi_pm10', 'aqi_co', 'aqi_no2', 'aqi_so2', 'aqi_o3',
-                 'overall_aqi', 'aqi_status', 'dominant_pollutant', 'calculated_at',
-                 'pollutant_data']
+                 'overall_aqi', 'aqi_status', 'dominant_pollutant', 'nowcast_aqi',
+                 'pm25_nowcast', 'pm10_nowcast', 'pm25_24h', 'pm10_24h', 'co_8h', 'o3_8h',
+                 'calculated_at', 'pollutant_data']
     
     def get_pollutant_data(self, obj):
         return {
@@ -3,42 +3,98 @@ from django.dispatch import receiver
 from django.utils import timezone
 from .models import SensorReading, AQICalculation, Alert, Sensor
 from .utils import calculate_aqi_from_sensor_reading
+from .averaging import calculate_windowed_aqi
+from .response_cache import bump_generation
+from .forecasting import update_forecast_state
+from .sketches import update_aqi_sketch
+from .anomaly import anomaly_detector, raise_anomaly_alerts, POLLUTANTS
+from .offline import offline_monitor
+from .realtime import publisher, to_message_data
+from .serializers import AQICalculationSerializer, AlertSerializer
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _ingest_step(description, instance, func, *args):
+    """Run one derived ingest step so that its failure doesn't skip the others"""
+    try:
+        func(*args)
+    except Exception as e:
+        logger.error(f"Error {description} for sensor reading {instance.id}: {e}")
+
+def detect_anomalies(instance, aqi_calc):
+    """Spike / data anomaly detection for a new reading"""
+    findings = anomaly_detector.observe(
+        instance.sensor_id,
+        {pollutant: getattr(instance, pollutant) for pollutant in POLLUTANTS}
+    )
+    if findings:
+        raise_anomaly_alerts(instance.sensor, findings, aqi_calc)
+
 @receiver(post_save, sender=SensorReading)
 def calculate_aqi_on_new_reading(sender, instance, created, **kwargs):
     """
     Automatically calculate AQI when a new sensor reading is created
     """
-    if created:
-        try:
-            # Calculate AQI
-            aqi_data = calculate_aqi_from_sensor_reading(instance)
-            
-            # Create AQI calculation record
-            aqi_calc = AQICalculation.objects.create(
-                sensor_reading=instance,
-                aqi_pm25=aqi_data['aqi_components']['PM25'],
-                aqi_pm10=aqi_data['aqi_components']['PM10'],
-                aqi_co=aqi_data['aqi_components']['CO'],
-                aqi_no2=aqi_data['aqi_components']['NO2'],
-                aqi_so2=aqi_data['aqi_components']['SO2'],
-                aqi_o3=aqi_data['aqi_components']['O3'],
-                overall_aqi=aqi_data['overall_aqi'],
-                aqi_status=aqi_data['aqi_status'],
-                dominant_pollutant=aqi_data['dominant_pollutant']
-            )
-            
-            # Generate alerts if necessary
-            if aqi_data['alerts']['has_alert']:
-                create_aqi_alert(instance.sensor, aqi_calc, aqi_data['alerts'])
-            
-            logger.info(f"AQI calculated for sensor {instance.sensor.sensor_id}: {aqi_data['overall_aqi']}")
-            
-        except Exception as e:
-            logger.error(f"Error calculating AQI for sensor reading {instance.id}: {e}")
+    if not created:
+        return
+    
+    try:
+        # Calculate AQI
+        aqi_data = calculate_aqi_from_sensor_reading(instance)
+        
+        # NowCast and 8h/24h averages from the sensor's in-memory hourly windows
+        windowed = calculate_windowed_aqi(instance)
+        
+        # Create AQI calculation record
+        aqi_calc = AQICalculation.objects.create(
+            sensor_reading=instance,
+            aqi_pm25=aqi_data['aqi_components']['PM25'],
+            aqi_pm10=aqi_data['aqi_components']['PM10'],
+            aqi_co=aqi_data['aqi_components']['CO'],
+            aqi_no2=aqi_data['aqi_components']['NO2'],
+            aqi_so2=aqi_data['aqi_components']['SO2'],
+            aqi_o3=aqi_data['aqi_components']['O3'],
+            overall_aqi=aqi_data['overall_aqi'],
+            aqi_status=aqi_data['aqi_status'],
+            dominant_pollutant=aqi_data['dominant_pollutant'],
+            **windowed
+        )
+    except Exception as e:
+        logger.error(f"Error calculating AQI for sensor reading {instance.id}: {e}")
+        return
+    
+    location_id = instance.sensor.location_id
+    overall_aqi = aqi_data['overall_aqi']
+    
+    # Everything below is derived from the stored calculation; each step
+    # fails on its own so one broken consumer can't starve the rest
+    
+    # Generate alerts if necessary
+    if aqi_data['alerts']['has_alert']:
+        create_aqi_alert(instance.sensor, aqi_calc, aqi_data['alerts'])
+    
+    _ingest_step("detecting anomalies", instance, detect_anomalies, instance, aqi_calc)
+    
+    # Invalidate cached analytics for this location
+    _ingest_step("invalidating cached analytics", instance, bump_generation, location_id)
+    
+    # Push to WebSocket subscribers (coalesced per location)
+    _ingest_step(
+        "publishing AQI", instance,
+        lambda: publisher.publish_aqi(location_id, to_message_data(AQICalculationSerializer(aqi_calc).data))
+    )
+    
+    # Fold the new value into the location's incremental forecaster
+    _ingest_step("updating forecast state", instance, update_forecast_state, location_id, instance.timestamp, overall_aqi)
+    
+    # Maintain the hourly percentile sketch
+    _ingest_step("updating AQI sketch", instance, update_aqi_sketch, location_id, instance.timestamp, overall_aqi)
+    
+    # Feed the in-memory rolling 1h/24h statistics (in every worker process)
+    _ingest_step("recording rolling stats", instance, publisher.publish_reading, instance, overall_aqi)
+    
+    logger.info(f"AQI calculated for sensor {instance.sensor.sensor_id}: {overall_aqi}")
 
 def create_aqi_alert(sensor, aqi_calculation, alert_data):
     """
@@ -92,8 +148,47 @@ def check_sensor_status(sender, instance, created, **kwargs):
             sensor.save()
             
             # Clear any sensor offline alerts
-            Alert.objects.filter(
+            offline_alerts = Alert.objects.filter(
                 sensor=sensor,
                 alert_type='SENSOR_OFFLINE',
                 is_active=True
-            ).update(is_active=False)
\ No newline at end of file
+            )
+            publisher.discard_alerts(list(offline_alerts.values_list('pk', flat=True)))
+            offline_alerts.update(is_active=False, updated_at=timezone.now())
+        
+        # Re-arm the sensor's offline deadline
+        offline_monitor.touch(sensor.pk)
+
+@receiver(post_save, sender=Sensor)
+def refresh_latest_on_sensor_change(sender, instance, **kwargs):
+    """
+    Keep the cached latest AQI limited to ACTIVE sensors when a sensor's
+    status is changed (through the admin, the API or a reactivating reading)
+    """
+    try:
+        publisher.sensor_status_changed(instance.location_id)
+    except Exception as e:
+        logger.error(f"Error refreshing latest AQI for sensor {instance.sensor_id}: {e}")
+
+@receiver(post_save, sender=Alert)
+def invalidate_cache_on_alert_change(sender, instance, **kwargs):
+    """
+    Invalidate cached analytics that count alerts for the alert's location
+    """
+    bump_generation(instance.sensor.location_id)
+    publisher.mark_dashboard(instance.sensor.location_id)
+
+@receiver(post_save, sender=Alert)
+def publish_new_alert(sender, instance, created, **kwargs):
+    """
+    Push newly raised alerts to WebSocket subscribers and keep the cached
+    active-alert list in step with updates
+    """
+    try:
+        alert_data = to_message_data(AlertSerializer(instance).data)
+        if created:
+            publisher.publish_alert(instance.sensor.location_id, alert_data)
+        else:
+            publisher.publish_alert_change(instance.sensor.location_id, alert_data)
+    except Exception as e:
+        logger.error(f"Error publishing alert {instance.id}: {e}")
\ No newline at end of file
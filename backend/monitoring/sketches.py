@@ -0,0 +1,160 @@
+"""
+Mergeable quantile sketches (t-digest) of AQI per location per hour
+
+Each incoming AQI value is folded into its location's hourly AQISketch row.
+A digest keeps at most ~compression centroids regardless of how many values
+it absorbed, and digests merge by concatenating and recompressing their
+centroids, so percentiles over any window are computed from a handful of
+hourly rows instead of sorting raw AQICalculation values.
+"""
+import logging
+import math
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AQISketch
+from .forecasting import hour_start
+
+logger = logging.getLogger(__name__)
+
+
+class TDigest:
+    """Merging t-digest (k1 scale function) over float values"""
+
+    def __init__(self, centroids=None, min_value=None, max_value=None, compression=None):
+        self.compression = compression or settings.QUANTILE_SKETCH_COMPRESSION
+        self.centroids = [list(centroid) for centroid in centroids or []]
+        self.min = min_value
+        self.max = max_value
+        self._unmerged = 0
+
+    @classmethod
+    def from_sketch(cls, sketch: AQISketch) -> 'TDigest':
+        return cls(sketch.centroids, sketch.min_aqi, sketch.max_aqi)
+
+    def to_sketch(self, sketch: AQISketch):
+        self.compress()
+        sketch.centroids = [[round(mean, 4), weight] for mean, weight in self.centroids]
+        sketch.count = self.count
+        sketch.min_aqi = self.min
+        sketch.max_aqi = self.max
+
+    @property
+    def count(self) -> int:
+        return sum(weight for _, weight in self.centroids)
+
+    def add(self, value: float, weight: int = 1):
+        self.centroids.append([value, weight])
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._unmerged += 1
+        if self._unmerged > self.compression:
+            self.compress()
+
+    def merge(self, other: 'TDigest'):
+        if not other.centroids:
+            return
+        self.centroids.extend(list(centroid) for centroid in other.centroids)
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._unmerged += len(other.centroids)
+        if self._unmerged > self.compression:
+            self.compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def compress(self):
+        """Merge adjacent centroids while each stays within one unit of the scale function"""
+        self._unmerged = 0
+        if len(self.centroids) <= 1:
+            return
+
+        self.centroids.sort(key=lambda centroid: centroid[0])
+        total = self.count
+        merged = []
+        current_mean, current_weight = self.centroids[0]
+        weight_so_far = 0
+        q_limit = self._k_inverse(self._k(0.0) + 1)
+
+        for mean, weight in self.centroids[1:]:
+            if (weight_so_far + current_weight + weight) / total <= q_limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                merged.append([current_mean, current_weight])
+                weight_so_far += current_weight
+                q_limit = self._k_inverse(self._k(weight_so_far / total) + 1)
+                current_mean, current_weight = mean, weight
+        merged.append([current_mean, current_weight])
+        self.centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-th quantile (0 <= q <= 1), interpolating between centroid centers"""
+        self.compress()
+        if not self.centroids:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        total = self.count
+        target = q * total
+        cumulative = 0
+        previous_center = None
+        previous_mean = None
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                if previous_center is None:
+                    # Below the first center: interpolate from the observed minimum
+                    return self.min + (mean - self.min) * target / center
+                fraction = (target - previous_center) / (center - previous_center)
+                return previous_mean + (mean - previous_mean) * fraction
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+
+        # Above the last center: interpolate towards the observed maximum
+        tail = total - previous_center
+        return previous_mean + (self.max - previous_mean) * (target - previous_center) / tail
+
+
+def merge_sketches(sketches: Iterable[AQISketch]) -> TDigest:
+    digest = TDigest()
+    for sketch in sketches:
+        digest.merge(TDigest.from_sketch(sketch))
+    return digest
+
+
+def quantiles_of(digest: TDigest, quantiles: List[float]) -> dict:
+    """Summarize a digest as {'count', 'min', 'max', 'p50', ...}"""
+    summary = {
+        'count': digest.count,
+        'min': digest.min,
+        'max': digest.max,
+    }
+    for q in quantiles:
+        value = digest.quantile(q)
+        summary[f'p{q * 100:g}'] = round(value, 2) if value is not None else None
+    return summary
+
+
+def update_aqi_sketch(location_id, timestamp, aqi: float):
+    """Fold one AQI value into its location's hourly sketch (called on ingest)"""
+    with transaction.atomic():
+        sketch, _ = AQISketch.objects.select_for_update().get_or_create(
+            location_id=location_id,
+            hour=hour_start(timestamp)
+        )
+        digest = TDigest.from_sketch(sketch)
+        digest.add(aqi)
+        digest.to_sketch(sketch)
+        sketch.save()
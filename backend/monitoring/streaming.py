@@ -0,0 +1,89 @@
+"""
+Helpers for streaming large JSON payloads without materializing them in memory
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def encode_json(obj) -> str:
+    """Encode an object the same way DRF's JSONRenderer does"""
+    return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_json_array(items, batch_size: int = 500):
+    """
+    Yield a JSON array as UTF-8 chunks, batch_size items per chunk
+
+    The opening bracket is yielded before the first item is pulled so the
+    client receives the first byte before the database has returned any rows.
+    """
+    yield b'['
+    batch = []
+    first = True
+    for item in items:
+        batch.append(encode_json(item))
+        if len(batch) >= batch_size:
+            yield ((',' if not first else '') + ','.join(batch)).encode('utf-8')
+            first = False
+            batch = []
+    if batch:
+        yield ((',' if not first else '') + ','.join(batch)).encode('utf-8')
+    yield b']'
+
+
+def iter_values_rows(queryset, fields, keys=None, chunk_size=None):
+    """
+    Iterate a queryset as dicts built from values_list tuples
+
+    Uses a server-side cursor (where the backend supports it) so only
+    chunk_size rows are held in memory at a time.
+    """
+    keys = keys or fields
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield dict(zip(keys, row))
+
+
+_EXHAUSTED = object()
+
+
+async def aiter_chunks(chunks):
+    """
+    Drive a blocking chunk iterator from async code, one chunk per thread hop
+
+    Every next() runs on the same thread-sensitive thread, so a server-side
+    cursor stays on the connection that opened it.
+    """
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(iterator, _EXHAUSTED)
+        if chunk is _EXHAUSTED:
+            return
+        yield chunk
+
+
+def streaming_content(request, chunks):
+    """
+    The right kind of iterator for StreamingHttpResponse under this server
+
+    Under ASGI Django materializes sync iterators with list() before sending
+    anything, so they are wrapped in an async iterator there. Under WSGI the
+    sync iterator is streamed as is.
+    """
+    request = getattr(request, '_request', request)  # DRF Request -> HttpRequest
+    if isinstance(request, ASGIRequest):
+        return aiter_chunks(chunks)
+    return chunks
+
+
+def streaming_json_response(request, items, batch_size: int = 500) -> StreamingHttpResponse:
+    """Wrap an iterable of JSON-serializable items in a streamed JSON array response"""
+    return StreamingHttpResponse(
+        streaming_content(request, iter_json_array(items, batch_size=batch_size)),
+        content_type='application/json'
+    )
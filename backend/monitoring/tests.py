@@ -0,0 +1,696 @@
+import asyncio
+import csv
+import io
+import math
+import random
+import zipfile
+from base64 import b64encode
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from urllib import parse
+from xml.etree import ElementTree
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+
+from .anomaly import AnomalyDetector
+from .averaging import AveragingWindows, HourlyRing, hour_index
+from .dashboard import merge_deltas
+from .export import iter_csv, iter_xlsx
+from .forecasting import MAX_GAP_HOURS, HoltWintersModel, forecast_from_state, update_forecast_state
+from .models import AQISketch, ForecastState, Location, Sensor, SensorReading
+from .pagination import SensorReadingPagination
+from .realtime import LATEST_STATE_GROUP, RealtimePublisher, to_message_data
+from .rolling_stats import RollingStatsService
+from .sketches import TDigest, merge_sketches, quantiles_of, update_aqi_sketch
+from .throttle import ThrottledSender, parse_update_frequency
+
+
+def exact_quantile(values, q):
+    """Linear-interpolated quantile of a sorted list (numpy's default method)"""
+    position = q * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def make_sensor(name='Test Park', sensor_id='SENSOR_T1', status='ACTIVE'):
+    location = Location.objects.create(name=name, city='Testville', state='TS', latitude=10.0, longitude=20.0)
+    return Sensor.objects.create(sensor_id=sensor_id, location=location, status=status)
+
+
+def reading(sensor, timestamp, **values):
+    """Unsaved reading; bulk_create these to skip the ingest signals"""
+    fields = {'pm25': 10.0, 'pm10': 20.0, 'co': 1.0, 'no2': 10.0, 'so2': 2.0, 'o3': 30.0}
+    fields.update(values)
+    return SensorReading(sensor=sensor, timestamp=timestamp, **fields)
+
+
+class TDigestTests(SimpleTestCase):
+    """t-digest accuracy, size bounds and merging"""
+
+    def test_empty_digest_has_no_quantiles(self):
+        digest = TDigest(compression=100)
+        self.assertIsNone(digest.quantile(0.5))
+        self.assertEqual(quantiles_of(digest, [0.5]), {'count': 0, 'min': None, 'max': None, 'p50': None})
+
+    def test_extremes_are_exact(self):
+        digest = TDigest(compression=100)
+        for value in [12.0, 7.5, 301.0, 44.0]:
+            digest.add(value)
+        self.assertEqual(digest.quantile(0), 7.5)
+        self.assertEqual(digest.quantile(1), 301.0)
+        self.assertEqual(digest.count, 4)
+
+    def test_small_input_is_close_to_exact(self):
+        digest = TDigest(compression=100)
+        values = [float(value) for value in range(1, 101)]
+        for value in values:
+            digest.add(value)
+        for q in (0.25, 0.5, 0.9):
+            self.assertAlmostEqual(digest.quantile(q), exact_quantile(values, q), delta=1.0)
+
+    def test_quantile_accuracy_on_skewed_data(self):
+        rng = random.Random(42)
+        values = sorted(rng.lognormvariate(4, 0.6) for _ in range(20000))
+        digest = TDigest(compression=100)
+        for value in values:
+            digest.add(value)
+        # Rank error stays well under 1% across the distribution, tighter at the tails
+        for q in (0.1, 0.5, 0.9, 0.95, 0.99):
+            estimate = digest.quantile(q)
+            rank = sum(1 for value in values if value <= estimate) / len(values)
+            self.assertAlmostEqual(rank, q, delta=0.01 if q < 0.95 else 0.005)
+
+    def test_size_is_bounded_by_compression(self):
+        digest = TDigest(compression=50)
+        for value in range(50000):
+            digest.add(float(value % 977))
+        digest.compress()
+        self.assertLessEqual(len(digest.centroids), 50)
+        self.assertEqual(digest.count, 50000)
+
+    def test_merged_digest_matches_single_digest(self):
+        rng = random.Random(7)
+        values = [rng.uniform(0, 500) for _ in range(6000)]
+        whole = TDigest(compression=100)
+        parts = [TDigest(compression=100) for _ in range(6)]
+        for index, value in enumerate(values):
+            whole.add(value)
+            parts[index % 6].add(value)
+
+        merged = TDigest(compression=100)
+        for part in parts:
+            merged.merge(part)
+
+        self.assertEqual(merged.count, len(values))
+        self.assertEqual(merged.min, min(values))
+        self.assertEqual(merged.max, max(values))
+        for q in (0.5, 0.95, 0.98):
+            self.assertAlmostEqual(merged.quantile(q), whole.quantile(q), delta=5.0)
+            self.assertAlmostEqual(merged.quantile(q), exact_quantile(sorted(values), q), delta=5.0)
+
+    def test_quantiles_of_names_percentiles(self):
+        digest = TDigest(compression=100)
+        for value in range(1, 11):
+            digest.add(float(value))
+        summary = quantiles_of(digest, [0.5, 0.999])
+        self.assertEqual(set(summary), {'count', 'min', 'max', 'p50', 'p99.9'})
+        self.assertEqual(summary['p50'], 5.5)
+
+
+class AQISketchStorageTests(TestCase):
+    """Sketch rows round-trip through the database and merge across hours"""
+
+    def setUp(self):
+        self.location = Location.objects.create(name='Sketch Park', city='Testville', state='TS')
+
+    def test_update_accumulates_per_hour(self):
+        first_hour = datetime(2026, 1, 5, 10, 15, tzinfo=dt_timezone.utc)
+        second_hour = datetime(2026, 1, 5, 11, 5, tzinfo=dt_timezone.utc)
+        for aqi in (40, 60, 80):
+            update_aqi_sketch(self.location.pk, first_hour, aqi)
+        update_aqi_sketch(self.location.pk, second_hour, 200)
+
+        sketches = AQISketch.objects.filter(location=self.location).order_by('hour')
+        self.assertEqual([sketch.count for sketch in sketches], [3, 1])
+        self.assertEqual((sketches[0].min_aqi, sketches[0].max_aqi), (40, 80))
+
+        merged = merge_sketches(sketches)
+        self.assertEqual(merged.count, 4)
+        self.assertEqual((merged.min, merged.max), (40, 200))
+        self.assertAlmostEqual(merged.quantile(0.5), 70, delta=10)
+
+
+class HourlyRingTests(SimpleTestCase):
+    """NowCast and averaging-period means against hand-computed values"""
+
+    HOUR = 500000
+
+    def ring(self, means_newest_first):
+        ring = HourlyRing()
+        for age, mean in enumerate(means_newest_first):
+            if mean is not None:
+                ring.add(self.HOUR - age, mean)
+        return ring
+
+    def test_nowcast_weight_is_floored_at_one_half(self):
+        # min/max = 10/30 < 0.5, so w = 0.5: (30 + 0.5*10 + 0.25*20) / 1.75
+        self.assertAlmostEqual(self.ring([30, 10, 20]).nowcast(self.HOUR), 40 / 1.75)
+
+    def test_nowcast_uses_min_over_max_weight(self):
+        # w = 16/20 = 0.8: (20 + 0.8*16 + 0.64*18) / (1 + 0.8 + 0.64)
+        self.assertAlmostEqual(self.ring([20, 16, 18]).nowcast(self.HOUR), 44.32 / 2.44)
+
+    def test_nowcast_of_constant_series_is_the_constant(self):
+        self.assertAlmostEqual(self.ring([35.5] * 12).nowcast(self.HOUR), 35.5)
+
+    def test_nowcast_skips_missing_hours(self):
+        # Hour 1 missing: ages 0 and 2 keep their weights (w = 0.5)
+        self.assertAlmostEqual(self.ring([40, None, 20]).nowcast(self.HOUR), (40 + 0.25 * 20) / 1.25)
+
+    def test_nowcast_needs_two_of_the_last_three_hours(self):
+        self.assertIsNone(self.ring([40, None, None, 30, 30]).nowcast(self.HOUR))
+
+    def test_hourly_mean_combines_readings_in_the_hour(self):
+        ring = HourlyRing()
+        ring.add(self.HOUR, 10)
+        ring.add(self.HOUR, 30)
+        ring.add(self.HOUR, 120, count=2)
+        self.assertEqual(ring.hourly_means(self.HOUR, 1), [40.0])
+
+    def test_average_requires_completeness(self):
+        ring = self.ring([8.0] * 5 + [None] * 3)
+        self.assertIsNone(ring.average(self.HOUR, 8, min_hours=6))
+        ring.add(self.HOUR - 5, 14.0)
+        self.assertAlmostEqual(ring.average(self.HOUR, 8, min_hours=6), 9.0)
+
+    def test_slots_roll_over_after_a_day(self):
+        ring = self.ring([50.0])
+        ring.add(self.HOUR + 24, 5.0)
+        self.assertEqual(ring.hourly_means(self.HOUR + 24, 1), [5.0])
+        # A late value for the hour the slot used to hold is dropped
+        ring.add(self.HOUR, 99.0)
+        self.assertEqual(ring.hourly_means(self.HOUR + 24, 1), [5.0])
+
+
+class AveragingWindowsWarmTests(TestCase):
+    """Startup warm-up loads every ACTIVE sensor's rings so ingest doesn't query"""
+
+    def setUp(self):
+        self.now = datetime(2026, 3, 1, 12, 30, tzinfo=dt_timezone.utc)
+        self.sensor = make_sensor()
+        readings = [
+            reading(self.sensor, self.now - timedelta(hours=age), o3=30.0 + age, co=2.0)
+            for age in range(1, 8)
+        ]
+        readings.append(reading(self.sensor, self.now - timedelta(hours=30), o3=500.0))  # outside the window
+        SensorReading.objects.bulk_create(readings)
+
+    def test_warm_then_observe_without_queries(self):
+        windows = AveragingWindows()
+        windows.warm(now=self.now)
+
+        new = reading(self.sensor, self.now, o3=30.0, co=2.0)
+        new.pk = None
+        with self.assertNumQueries(0):
+            values = windows.observe(new)
+
+        # o3 hourly means for the last 8 hours: 30 (now), 31..37
+        self.assertAlmostEqual(values['o3_8h'], sum(range(30, 38)) / 8)
+        self.assertAlmostEqual(values['co_8h'], 2.0)
+        self.assertIsNone(values['pm25_24h'])  # only 8 of the required 18 hours
+
+    def test_warm_matches_lazy_rehydration(self):
+        warmed = AveragingWindows()
+        warmed.warm(now=self.now)
+        lazy = AveragingWindows()
+
+        new = reading(self.sensor, self.now, o3=33.0)
+        SensorReading.objects.bulk_create([new])
+        self.assertEqual(warmed.observe(new), lazy.observe(new))
+
+    def test_inactive_sensors_are_not_loaded(self):
+        inactive = make_sensor(name='Quiet Park', sensor_id='SENSOR_T2', status='INACTIVE')
+        SensorReading.objects.bulk_create([reading(inactive, self.now - timedelta(hours=1))])
+        windows = AveragingWindows()
+        windows.warm(now=self.now)
+        self.assertIn(self.sensor.pk, windows._rings)
+        self.assertNotIn(inactive.pk, windows._rings)
+        self.assertEqual(
+            windows._rings[self.sensor.pk]['o3'].hourly_means(hour_index(self.now) - 1, 1), [31.0]
+        )
+
+
+class RollingStatsTests(TestCase):
+    """Rolling 1h/24h aggregates and the cross-process reading feed"""
+
+    def setUp(self):
+        self.sensor = make_sensor()
+        self.now = timezone.now()
+        self.stats = RollingStatsService()
+        self.stats.warm()
+
+    def test_windows_aggregate_known_values(self):
+        for minutes, pm25, aqi in ((2, 10.0, 40), (20, 30.0, 80), (90, 50.0, 120)):
+            self.stats.record(reading(self.sensor, self.now - timedelta(minutes=minutes), pm25=pm25), aqi)
+
+        summary = self.stats.get(self.sensor.pk, self.now)
+        self.assertEqual(summary['1h']['pm25'], {'avg': 20.0, 'min': 10.0, 'max': 30.0, 'count': 2})
+        self.assertEqual(summary['24h']['pm25'], {'avg': 30.0, 'min': 10.0, 'max': 50.0, 'count': 3})
+        self.assertEqual(summary['24h']['aqi']['avg'], 80.0)
+        self.assertEqual(summary['last_reading'], self.now - timedelta(minutes=2))
+
+    def test_readings_older_than_a_day_are_dropped(self):
+        self.stats.record(reading(self.sensor, self.now - timedelta(hours=25)), 50)
+        summary = self.stats.get(self.sensor.pk, self.now)
+        self.assertEqual(summary['24h']['pm25']['count'], 0)
+
+    def test_warm_up_loads_recent_readings(self):
+        SensorReading.objects.bulk_create([
+            reading(self.sensor, self.now - timedelta(hours=hours), so2=float(hours)) for hours in (1, 3, 30)
+        ])
+        stats = RollingStatsService()
+        stats.warm()
+        self.assertEqual(stats.get(self.sensor.pk, self.now)['24h']['so2'], {'avg': 2.0, 'min': 1.0, 'max': 3.0, 'count': 2})
+
+    @override_settings(REALTIME_PUBLISH=True)
+    def test_published_readings_reach_other_processes(self):
+        sent = []
+
+        async def capture(messages):
+            sent.extend(messages)
+
+        here = RealtimePublisher()
+        with mock.patch('monitoring.realtime.rolling_stats', self.stats), \
+                mock.patch.object(here, '_schedule'), mock.patch.object(here, '_send', side_effect=capture):
+            here.publish_reading(reading(self.sensor, self.now, pm25=42.0), 99)
+            here.flush()
+
+        (group, message), = sent
+        self.assertEqual(group, LATEST_STATE_GROUP)
+        self.assertEqual(message, to_message_data(message))  # msgpack-safe as sent
+        self.assertEqual(self.stats.get(self.sensor.pk, self.now)['1h']['pm25']['avg'], 42.0)
+
+        # Another worker applies it as the channel layer delivers it
+        elsewhere = RollingStatsService()
+        elsewhere.warm()
+        elsewhere.apply_update(message)
+        self.assertEqual(elsewhere.get(self.sensor.pk, self.now), self.stats.get(self.sensor.pk, self.now))
+
+
+class AnomalyDetectorTests(TestCase):
+    """EWMA spike scoring, flatline rule and the startup replay"""
+
+    CONFIG = {'alpha': 0.5, 'spike_z': 3.0, 'warmup': 4, 'flatline_readings': 5, 'min_relative_std': 0.0}
+
+    def values(self, **overrides):
+        values = {'pm25': 10.0, 'pm10': 20.0, 'co': 0.5, 'no2': 10.0, 'so2': 2.0, 'o3': 30.0}
+        values.update(overrides)
+        return values
+
+    def test_ewma_state_updates(self):
+        detector = AnomalyDetector(self.CONFIG)
+        for pm25 in (10.0, 14.0, 12.0):
+            detector.learn('s', self.values(pm25=pm25))
+        state = detector._sensors['s']['pm25']
+        # mean: 10 -> 12 -> 12; variance: 0 -> 0.5*(0 + 0.5*16) = 4 -> 0.5*(4 + 0) = 2
+        self.assertEqual((state.mean, state.variance, state.count), (12.0, 2.0, 3))
+
+    def test_spike_is_scored_against_the_baseline(self):
+        detector = AnomalyDetector(self.CONFIG)
+        for pm25 in (10.0, 12.0, 10.0, 12.0, 11.0):
+            detector.observe('s', {'pm25': pm25})
+        state = detector._sensors['s']['pm25']
+        self.assertEqual(detector.observe('s', {'pm25': state.mean + 2.9 * math.sqrt(state.variance)}), [])
+
+        detector = AnomalyDetector(self.CONFIG)
+        for pm25 in (10.0, 12.0, 10.0, 12.0, 11.0):
+            detector.observe('s', {'pm25': pm25})
+        findings = detector.observe('s', {'pm25': 40.0})
+        self.assertEqual([(f['alert_type'], f['pollutant']) for f in findings], [('POLLUTANT_SPIKE', 'PM25')])
+
+    def test_stuck_value_is_a_flatline(self):
+        detector = AnomalyDetector(self.CONFIG)
+        findings = [detector.observe('s', self.values(no2=17.0)) for _ in range(5)]
+        flat = [f['pollutant'] for batch in findings for f in batch if f['alert_type'] == 'DATA_ANOMALY']
+        self.assertIn('NO2', flat)
+
+    def test_zero_and_below_detection_values_are_not_a_flatline(self):
+        detector = AnomalyDetector(self.CONFIG)
+        for _ in range(30):
+            findings = detector.observe('s', self.values(pm25=0.0, pm10=0.0, co=0.05, no2=1.0, so2=0.0, o3=0.0))
+            self.assertEqual(findings, [])
+
+    def test_detection_limits_are_configurable(self):
+        detector = AnomalyDetector({**self.CONFIG, 'detection_limits': {'so2': 5.0}})
+        for _ in range(10):
+            findings = detector.observe('s', self.values(so2=4.0, no2=None, pm25=None, pm10=None, co=None, o3=None))
+            self.assertEqual(findings, [])
+
+    def test_warm_replays_recent_history(self):
+        now = timezone.now()
+        sensor = make_sensor()
+        quiet = make_sensor(name='Quiet Park', sensor_id='SENSOR_T2', status='INACTIVE')
+        SensorReading.objects.bulk_create(
+            [reading(sensor, now - timedelta(minutes=minutes), pm25=pm25)
+             for minutes, pm25 in ((30, 10.0), (20, 14.0), (10, 12.0))] +
+            [reading(sensor, now - timedelta(hours=30), pm25=400.0), reading(quiet, now, pm25=5.0)]
+        )
+        detector = AnomalyDetector(self.CONFIG)
+        detector.warm(now=now)
+
+        # Same state as test_ewma_state_updates: the 30h-old reading is outside the window
+        state = detector._sensors[sensor.pk]['pm25']
+        self.assertEqual((state.mean, state.variance, state.count), (12.0, 2.0, 3))
+        self.assertNotIn(quiet.pk, detector._sensors)
+
+    def test_readings_from_other_processes_are_learned(self):
+        sensor = make_sensor()
+        detector = AnomalyDetector(self.CONFIG)
+        detector.apply_update({'readings': [[str(sensor.pk), timezone.now().isoformat(), self.values(aqi=42)]]})
+        self.assertEqual(detector._sensors[sensor.pk]['pm25'].count, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor round-trips and (timestamp, id) ordering across pages, including timestamp ties"""
+
+    URL = '/api/v1/monitoring/readings/'
+
+    def setUp(self):
+        sensor = make_sensor()
+        base = datetime(2026, 2, 1, 8, 0, tzinfo=dt_timezone.utc)
+        # Three readings share each of the first two timestamps, so pages split ties
+        offsets = [0, 0, 0, 5, 5, 5, 10, 15]
+        SensorReading.objects.bulk_create([reading(sensor, base + timedelta(minutes=offset)) for offset in offsets])
+        self.expected = [
+            str(pk) for pk in SensorReading.objects.order_by('-timestamp', '-pk').values_list('pk', flat=True)
+        ]
+
+    def walk(self, url, params=None, link='next'):
+        pages = []
+        while url:
+            body = self.client.get(url, params).json()
+            params = None
+            pages.append([row['id'] for row in body['results']])
+            url = body[link]
+        return pages
+
+    def test_forward_pages_cover_every_row_once_in_order(self):
+        pages = self.walk(self.URL, {'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        first = self.client.get(self.URL, {'page_size': 3}).json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        third = self.client.get(second['next']).json()
+        self.assertIsNone(third['next'])
+
+        back = self.client.get(third['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], self.expected[3:6])
+        back = self.client.get(back['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], self.expected[:3])
+        self.assertIsNone(back['previous'])
+
+    def test_cursor_encodes_the_last_row(self):
+        pagination = SensorReadingPagination()
+        pagination.base_url = 'http://testserver/readings/?page_size=3'
+        row = SensorReading.objects.order_by('-timestamp', '-pk')[2]
+        link = pagination.encode_cursor(row, reverse=False)
+        cursor = parse.parse_qs(parse.urlsplit(link).query)['cursor'][0]
+
+        request = Request(RequestFactory().get('/readings/', {'cursor': cursor}))
+        self.assertEqual(pagination.decode_cursor(request, SensorReading), (False, row.timestamp, row.pk))
+
+    def test_malformed_cursors_are_not_found(self):
+        for cursor in ('not-base64!', 'cj0wJnY9eA==', b64encode(b'r=0&v=2026-02-01T08:00:00&k=nope').decode()):
+            self.assertEqual(self.client.get(self.URL, {'cursor': cursor}).status_code, 404, cursor)
+
+    def test_counts_only_on_request(self):
+        self.assertNotIn('count', self.client.get(self.URL).json())
+        self.assertEqual(self.client.get(self.URL, {'count': 'exact'}).json()['count'], 8)
+
+
+class HoltWintersTests(SimpleTestCase):
+    """Holt-Winters component updates and forecasts against hand-computed values"""
+
+    HOUR = datetime(2026, 4, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def model(self, **kwargs):
+        return HoltWintersModel(alpha=0.5, beta=0.5, gamma=0.5, phi=1.0, **kwargs)
+
+    def test_first_observation_sets_the_level(self):
+        model = self.model(seasonal=[0.0] * 10 + [4.0] + [0.0] * 13)
+        self.assertIsNone(model.update(self.HOUR, 30.0))
+        self.assertEqual((model.level, model.trend, model.observations), (26.0, 0.0, 1))
+
+    def test_update_smooths_level_trend_and_season(self):
+        model = self.model()
+        model.update(self.HOUR, 10.0)
+        residual = model.update(self.HOUR + timedelta(hours=1), 20.0)
+        # predicted 10: level 0.5*20 + 0.5*10, trend 0.5*5, season 0.5*(20 - 15)
+        self.assertEqual(residual, 10.0)
+        self.assertEqual((model.level, model.trend), (15.0, 2.5))
+        self.assertEqual(model.seasonal[11], 2.5)
+        self.assertEqual(model.residual_variance, 100.0)
+        self.assertEqual(model.observations, 2)
+
+    def test_predict_follows_the_damped_trend_and_season(self):
+        seasonal = [0.0] * 24
+        seasonal[12] = 6.0
+        model = HoltWintersModel(level=50.0, trend=2.0, seasonal=seasonal, residual_variance=4.0,
+                                 observations=10, alpha=0.5, beta=0.1, gamma=0.1, phi=0.5)
+        forecast = model.predict(self.HOUR + timedelta(hours=1), 3)
+        # damped trend sums: 0.5*2, +0.25*2, +0.125*2; hour 12 carries the +6 offset
+        self.assertEqual([point['value'] for point in forecast], [57.0, 51.5, 51.75])
+        self.assertEqual(forecast[0]['timestamp'], self.HOUR + timedelta(hours=2))
+        self.assertAlmostEqual(forecast[0]['upper'] - forecast[0]['value'], 1.96 * 2)
+        self.assertAlmostEqual(forecast[1]['upper'] - forecast[1]['value'], 1.96 * 2 * math.sqrt(1.25))
+
+    def test_constant_series_forecasts_the_constant(self):
+        model = HoltWintersModel()
+        for step in range(24 * 7):
+            model.update(self.HOUR + timedelta(hours=step), 42.0)
+        for point in model.predict(self.HOUR + timedelta(hours=24 * 7 - 1), 24):
+            self.assertAlmostEqual(point['value'], 42.0, places=6)
+
+    def test_skip_extrapolates_short_gaps_and_restarts_after_long_ones(self):
+        model = self.model(level=10.0, trend=2.0, observations=5)
+        model.skip(3)
+        self.assertEqual((model.level, model.trend), (16.0, 2.0))
+        model.skip(MAX_GAP_HOURS + 1)
+        self.assertEqual((model.observations, model.trend), (0, 0.0))
+
+
+class ForecastStateTests(TestCase):
+    """Hourly bucketing of ingested AQI into the persisted forecaster state"""
+
+    HOUR = datetime(2026, 4, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.location = Location.objects.create(name='Forecast Park', city='Testville', state='TS')
+
+    def state(self):
+        return ForecastState.objects.get(location=self.location)
+
+    def test_values_accumulate_until_the_hour_completes(self):
+        update_forecast_state(self.location.pk, self.HOUR + timedelta(minutes=5), 40.0)
+        update_forecast_state(self.location.pk, self.HOUR + timedelta(minutes=35), 60.0)
+        state = self.state()
+        self.assertEqual((state.bucket_sum, state.bucket_count, state.observations), (100.0, 2, 0))
+
+        update_forecast_state(self.location.pk, self.HOUR + timedelta(hours=1, minutes=1), 80.0)
+        state = self.state()
+        self.assertEqual(state.observations, 1)
+        self.assertEqual(state.level, 50.0)  # the first hour's mean
+        self.assertEqual(
+            (state.bucket_start, state.bucket_sum, state.bucket_count), (self.HOUR + timedelta(hours=1), 80.0, 1)
+        )
+
+    def test_late_values_for_absorbed_hours_are_ignored(self):
+        update_forecast_state(self.location.pk, self.HOUR, 40.0)
+        update_forecast_state(self.location.pk, self.HOUR + timedelta(hours=1), 50.0)
+        update_forecast_state(self.location.pk, self.HOUR + timedelta(minutes=50), 500.0)
+        state = self.state()
+        self.assertEqual((state.level, state.bucket_sum, state.bucket_count), (40.0, 50.0, 1))
+
+    def test_forecast_starts_after_the_current_hour(self):
+        update_forecast_state(self.location.pk, self.HOUR, 40.0)
+        forecast = forecast_from_state(self.state(), 3, now=self.HOUR + timedelta(hours=2, minutes=10))
+        self.assertEqual([point['timestamp'] for point in forecast],
+                         [self.HOUR + timedelta(hours=step) for step in (3, 4, 5)])
+        self.assertEqual(forecast[0]['value'], 40.0)
+
+    def test_stale_state_has_no_forecast(self):
+        update_forecast_state(self.location.pk, self.HOUR, 40.0)
+        stale = self.HOUR + timedelta(hours=MAX_GAP_HOURS + 1)
+        self.assertEqual(forecast_from_state(self.state(), 3, now=stale), [])
+
+
+def card(location_id, aqi):
+    return {'id': location_id, 'name': f'Park {location_id}', 'current_aqi': {'overall_aqi': aqi}}
+
+
+def delta(base_version, changed=(), removed=(), summary=None):
+    return {
+        'version': base_version + 1,
+        'base_version': base_version,
+        'changed': list(changed),
+        'removed': list(removed),
+        'summary': summary or {'total_alerts': 0, 'total_sensors': 1},
+    }
+
+
+class MergeDeltasTests(SimpleTestCase):
+    """Combining consecutive dashboard deltas for throttled clients"""
+
+    def test_consecutive_deltas_combine_with_the_newest_card_winning(self):
+        merged = merge_deltas(
+            delta(4, changed=[card('a', 50), card('b', 60)]),
+            delta(5, changed=[card('a', 70)], summary={'total_alerts': 2, 'total_sensors': 1})
+        )
+        self.assertEqual((merged['base_version'], merged['version']), (4, 6))
+        self.assertEqual(sorted(merged['changed'], key=lambda entry: entry['id']), [card('a', 70), card('b', 60)])
+        self.assertEqual(merged['removed'], [])
+        self.assertEqual(merged['summary'], {'total_alerts': 2, 'total_sensors': 1})
+
+    def test_removal_and_re_adding_cancel_out(self):
+        removed_later = merge_deltas(delta(1, changed=[card('a', 50)]), delta(2, removed=['a']))
+        self.assertEqual((removed_later['changed'], removed_later['removed']), ([], ['a']))
+
+        added_back = merge_deltas(delta(1, removed=['a']), delta(2, changed=[card('a', 80)]))
+        self.assertEqual((added_back['changed'], added_back['removed']), ([card('a', 80)], []))
+
+    def test_merging_is_associative_over_a_run_of_deltas(self):
+        deltas = [delta(1, changed=[card('a', 10)]), delta(2, removed=['b']), delta(3, changed=[card('b', 30)])]
+        merged = deltas[0]
+        for newer in deltas[1:]:
+            merged = merge_deltas(merged, newer)
+        self.assertEqual((merged['base_version'], merged['version']), (1, 4))
+        self.assertEqual(sorted(entry['id'] for entry in merged['changed']), ['a', 'b'])
+        self.assertEqual(merged['removed'], [])
+
+    def test_gaps_and_resyncs_force_a_resync(self):
+        self.assertEqual(merge_deltas(delta(1), delta(3)), {'resync': True, 'version': 4})
+        self.assertEqual(merge_deltas({'resync': True, 'version': 2}, delta(2)), {'resync': True, 'version': 3})
+
+
+class ThrottledSenderTests(SimpleTestCase):
+    """Coalescing and cadence of throttled WebSocket updates"""
+
+    def run_sender(self, scenario, merge=None):
+        sent = []
+
+        async def send(batch):
+            sent.append(batch)
+
+        async def main():
+            sender = ThrottledSender(send, merge=merge)
+            await scenario(sender)
+            sender.close()
+
+        asyncio.run(main())
+        return sent
+
+    def test_unthrottled_updates_pass_straight_through(self):
+        async def scenario(sender):
+            await sender.offer('a', 1)
+            await sender.offer('a', 2)
+
+        self.assertEqual(self.run_sender(scenario), [{'a': 1}, {'a': 2}])
+
+    def test_throttled_updates_coalesce_to_the_latest_per_key(self):
+        async def scenario(sender):
+            await sender.set_update_frequency(5)
+            await sender.offer('a', 1)  # first update after a quiet interval goes out at once
+            await sender.offer('a', 2)
+            await sender.offer('b', 3)
+            await sender.offer('a', 4)
+            self.assertEqual((sender.offered, sender.sent), (4, 1))
+            await sender.flush()  # what the interval timer does
+            self.assertEqual(sender.sent, 3)
+
+        self.assertEqual(self.run_sender(scenario), [{'a': 1}, {'a': 4, 'b': 3}])
+
+    def test_dashboard_deltas_are_merged_while_throttled(self):
+        async def scenario(sender):
+            await sender.set_update_frequency(1)
+            await sender.offer('dashboard', delta(1, changed=[card('a', 10)]))
+            await sender.offer('dashboard', delta(2, changed=[card('a', 20)]))
+            await sender.offer('dashboard', delta(3, changed=[card('b', 30)]))
+            await sender.set_update_frequency(None)  # switching to realtime releases the buffer
+
+        first, second = self.run_sender(scenario, merge=merge_deltas)
+        merged = second['dashboard']
+        self.assertEqual(first['dashboard']['version'], 2)
+        self.assertEqual((merged['base_version'], merged['version']), (2, 4))
+        self.assertEqual(sorted(entry['current_aqi']['overall_aqi'] for entry in merged['changed']), [20, 30])
+
+    def test_update_frequency_is_validated(self):
+        self.assertIsNone(parse_update_frequency('0'))
+        self.assertEqual(parse_update_frequency('15'), 15)
+        for value in ('61', '-1', 'soon'):
+            with self.assertRaises(ValueError):
+                parse_update_frequency(value)
+
+
+class ExportWriterTests(SimpleTestCase):
+    """CSV and streamed XLSX output of the tabular exports"""
+
+    HEADER = ['sensor', 'timestamp', 'pm25', 'valid']
+    ROWS = [
+        ['S1', datetime(2026, 1, 1, 0, 0, tzinfo=dt_timezone.utc), 12.5, True],
+        ['S<2> & co', datetime(2026, 1, 1, 1, 0, tzinfo=dt_timezone.utc), None, False],
+        ['S3', datetime(2026, 1, 1, 2, 0, tzinfo=dt_timezone.utc), 7, True],
+    ]
+    NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+    def read_xlsx(self, chunks):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        sheets = []
+        for index in range(1, len(workbook.findall('.//x:sheet', self.NS)) + 1):
+            root = ElementTree.fromstring(archive.read(f'xl/worksheets/sheet{index}.xml'))
+            rows = []
+            for row in root.findall('.//x:row', self.NS):
+                cells = []
+                for cell in row.findall('x:c', self.NS):
+                    text = cell.find('.//x:t', self.NS)
+                    value = cell.find('x:v', self.NS)
+                    cells.append(text.text if text is not None else value.text if value is not None else None)
+                rows.append((int(row.get('r')), cells))
+            sheets.append(rows)
+        return sheets
+
+    def test_csv_rows_and_batches(self):
+        chunks = list(iter_csv(self.HEADER, self.ROWS, batch_size=2))
+        self.assertEqual(len(chunks), 3)  # header, two rows, one row
+        self.assertEqual(list(csv.reader(io.StringIO(''.join(chunks)))), [
+            self.HEADER,
+            ['S1', '2026-01-01T00:00:00+00:00', '12.5', 'True'],
+            ['S<2> & co', '2026-01-01T01:00:00+00:00', '', 'False'],
+            ['S3', '2026-01-01T02:00:00+00:00', '7', 'True'],
+        ])
+
+    def test_xlsx_cells(self):
+        (sheet,) = self.read_xlsx(iter_xlsx(self.HEADER, self.ROWS, batch_size=2))
+        self.assertEqual(sheet, [
+            (1, self.HEADER),
+            (2, ['S1', '2026-01-01T00:00:00+00:00', '12.5', '1']),
+            (3, ['S<2> & co', '2026-01-01T01:00:00+00:00', None, '0']),
+            (4, ['S3', '2026-01-01T02:00:00+00:00', '7', '1']),
+        ])
+
+    def test_xlsx_rolls_over_to_new_sheets_with_the_header(self):
+        rows = [[f'S{n}', n] for n in range(5)]
+        sheets = self.read_xlsx(iter_xlsx(['sensor', 'n'], rows, batch_size=1, max_rows=3))
+        self.assertEqual([[row_number for row_number, _ in sheet] for sheet in sheets], [[1, 2, 3], [1, 2, 3], [1, 2]])
+        self.assertTrue(all(sheet[0][1] == ['sensor', 'n'] for sheet in sheets))
+        self.assertEqual([cells[1] for sheet in sheets for _, cells in sheet[1:]], ['0', '1', '2', '3', '4'])
+
+    def test_empty_xlsx_has_a_header_only_sheet(self):
+        self.assertEqual(self.read_xlsx(iter_xlsx(self.HEADER, [])), [[(1, self.HEADER)]])
@@ -0,0 +1,125 @@
+"""
+Per-connection subscription throttling for WebSocket consumers
+
+A client can ask for updates at most every N minutes, either directly
+(`?update_frequency=N` or a `set_update_frequency` message) or through a
+UserPreference (`?preference=<id>` or a `set_preference` message, using its
+update_frequency_minutes). Throttled updates are coalesced per key (the
+latest value per location wins) and flushed once per interval. An update
+arriving after a quiet interval is sent immediately. Unthrottled
+connections behave as before, and alerts are never throttled.
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import parse_qs
+
+from django.core.exceptions import ValidationError
+
+from .models import UserPreference
+
+MIN_UPDATE_FREQUENCY = 1  # minutes, matching UserPreference validators
+MAX_UPDATE_FREQUENCY = 60
+
+_counters = {'offered': 0, 'sent': 0}
+_counters_lock = threading.Lock()
+
+
+def throttle_stats() -> dict:
+    """Process-wide updates offered to and sent by throttled connections"""
+    with _counters_lock:
+        return dict(_counters)
+
+
+def _count(offered: int = 0, sent: int = 0):
+    with _counters_lock:
+        _counters['offered'] += offered
+        _counters['sent'] += sent
+
+
+def parse_update_frequency(value):
+    """Minutes as an int in 1..60, 0/None for realtime; raises ValueError otherwise"""
+    if value in (None, '', 0, '0'):
+        return None
+    minutes = int(value)
+    if not MIN_UPDATE_FREQUENCY <= minutes <= MAX_UPDATE_FREQUENCY:
+        raise ValueError(
+            f"update_frequency must be between {MIN_UPDATE_FREQUENCY} and {MAX_UPDATE_FREQUENCY} minutes"
+        )
+    return minutes
+
+
+def preference_update_frequency(preference_id):
+    """update_frequency_minutes of a UserPreference (blocking ORM call)"""
+    try:
+        return UserPreference.objects.values_list('update_frequency_minutes', flat=True).get(pk=preference_id)
+    except (UserPreference.DoesNotExist, ValidationError):
+        raise ValueError(f"Unknown preference '{preference_id}'")
+
+
+def query_params(scope) -> dict:
+    return {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode('utf-8')).items()}
+
+
+class ThrottledSender:
+    """Coalescing per-connection buffer flushed at most once per interval"""
+
+    def __init__(self, send, merge=None):
+        self._send = send  # async callable taking {key: value}
+        self._merge = merge  # optional (pending, new) -> value; default keeps the newest
+        self._interval = None
+        self._pending = {}
+        self._last_flush = 0.0
+        self._task = None
+        self.offered = 0
+        self.sent = 0
+
+    @property
+    def update_frequency(self):
+        return None if self._interval is None else int(self._interval // 60)
+
+    async def set_update_frequency(self, minutes):
+        """Change the cadence (None for realtime), releasing anything already buffered"""
+        self._interval = None if minutes is None else minutes * 60
+        await self.flush()
+
+    async def offer(self, key, value):
+        if self._interval is None:
+            await self._send({key: value})
+            return
+
+        self.offered += 1
+        _count(offered=1)
+        if self._merge is not None and key in self._pending:
+            value = self._merge(self._pending[key], value)
+        self._pending[key] = value
+
+        if self._task is None:
+            delay = self._last_flush + self._interval - time.monotonic()
+            if delay <= 0:
+                await self.flush()
+            else:
+                self._task = asyncio.ensure_future(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self._last_flush = time.monotonic()
+        self.sent += len(pending)
+        _count(sent=len(pending))
+        await self._send(pending)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._pending = {}
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     LocationViewSet, SensorViewSet, SensorReadingViewSet,
-    AQICalculationViewSet, AlertViewSet, UserPreferenceViewSet
+    AQICalculationViewSet, AlertViewSet, UserPreferenceViewSet,
+    realtime_status
 )
 
 router = DefaultRouter()
@@ -14,5 +15,6 @@ router.register(r'alerts', AlertViewSet)
 router.register(r'preferences', UserPreferenceViewSet)
 
 urlpatterns = [
+    path('realtime/status/', realtime_status, name='realtime-status'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
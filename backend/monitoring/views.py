@@ -1,18 +1,31 @@
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 # from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from django.db.models import Avg, Max, Min, Count, Q
+from django.utils.decorators import method_decorator
+from django.db.models import Max, Min, Count, Sum, Q
+from django.db.models.functions import ExtractHour
 from datetime import timedelta
 import logging
 
 from .models import Location, Sensor, SensorReading, AQICalculation, Alert, UserPreference
+from .utils import AQICalculator
 from .serializers import (
     LocationSerializer, SensorSerializer, SensorReadingSerializer, 
     AQICalculationSerializer, AlertSerializer, UserPreferenceSerializer,
     DashboardLocationSerializer, TimeSeriesDataSerializer, SensorReadingCreateSerializer
 )
+from .conditional import conditional_on_ingest
+from .response_cache import cached_response
+from .pagination import SensorReadingPagination, AQICalculationPagination, AlertPagination
+from .streaming import iter_values_rows, streaming_json_response
+from .columnar import build_columnar_series
+from .renderers import COLUMNAR_FORMATS, COLUMNAR_RENDERER_CLASSES
+from .rolling_stats import rolling_stats
+from .realtime import publisher
+from .db_executor import metrics as db_executor_metrics
+from .throttle import throttle_stats
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +38,7 @@ class LocationViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'city', 'state']
     
     @action(detail=False, methods=['get'])
+    @method_decorator(conditional_on_ingest())
     def dashboard(self, request):
         """Get locations with current AQI data for dashboard"""
         locations = Location.objects.prefetch_related('sensors__readings__aqi_calculation').all()
@@ -59,13 +73,23 @@ class SensorViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'location', 'location__city']
     search_fields = ['sensor_id', 'location__name']
     
-    @action(detail=True, methods=['get'])
+    # values_list() lookups for columnar reading output
+    READING_COLUMN_FIELDS = (
+        'pm25', 'pm10', 'co', 'no2', 'so2', 'o3',
+        'temperature', 'humidity', 'wind_speed', 'wind_direction',
+    )
+    
+    @action(detail=True, methods=['get'], renderer_classes=COLUMNAR_RENDERER_CLASSES)
     def readings(self, request, pk=None):
-        """Get recent readings for a specific sensor"""
+        """Get recent readings for a specific sensor (format=columnar|packed|arrow for column arrays)"""
         sensor = self.get_object()
         hours = int(request.query_params.get('hours', 24))
         since = timezone.now() - timedelta(hours=hours)
         
+        if request.accepted_renderer.format in COLUMNAR_FORMATS:
+            queryset = SensorReading.objects.filter(sensor=sensor, timestamp__gte=since)
+            return Response(build_columnar_series(queryset, self.READING_COLUMN_FIELDS))
+        
         readings = SensorReading.objects.filter(
             sensor=sensor,
             timestamp__gte=since
@@ -74,6 +98,37 @@ class SensorViewSet(viewsets.ModelViewSet):
         serializer = SensorReadingSerializer(readings, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def rolling_stats(self, request, pk=None):
+        """Get last 1h/24h avg/min/max per pollutant and AQI from the in-memory windows"""
+        sensor = self.get_object()
+        stats = rolling_stats.get(sensor.pk)
+        
+        if stats is None:
+            return Response({'error': 'No readings in the last 24 hours'}, status=404)
+        
+        return Response({'sensor_id': sensor.sensor_id, **stats})
+    
+    @action(detail=False, methods=['get'])
+    def rolling_overview(self, request):
+        """Get rolling 1h/24h statistics for all sensors and the service memory footprint"""
+        now = timezone.now()
+        sensors = []
+        for sensor in self.get_queryset():
+            stats = rolling_stats.get(sensor.pk, now)
+            if stats is not None:
+                sensors.append({
+                    'sensor_id': sensor.sensor_id,
+                    'location': sensor.location.name,
+                    **stats
+                })
+        
+        return Response({
+            'timestamp': now,
+            'memory': rolling_stats.memory_report(),
+            'sensors': sensors
+        })
+    
     @action(detail=True, methods=['post'])
     def maintenance(self, request, pk=None):
         """Mark sensor for maintenance"""
@@ -88,6 +143,7 @@ class SensorReadingViewSet(viewsets.ModelViewSet):
     """ViewSet for managing sensor readings"""
     queryset = SensorReading.objects.select_related('sensor', 'sensor__location').all()
     serializer_class = SensorReadingSerializer
+    pagination_class = SensorReadingPagination
     filter_backends = []
     filterset_fields = ['sensor', 'sensor__location']
     
@@ -110,42 +166,56 @@ class SensorReadingViewSet(viewsets.ModelViewSet):
         serializer = SensorReadingSerializer(latest_readings, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    # values_list() lookups for time series points, in output key order
+    TIME_SERIES_FIELDS = (
+        'timestamp', 'aqi_calculation__overall_aqi', 'pm25', 'pm10', 'co', 'no2', 'so2', 'o3',
+        'sensor__location__name', 'sensor__sensor_id',
+    )
+    TIME_SERIES_KEYS = (
+        'timestamp', 'aqi', 'pm25', 'pm10', 'co', 'no2', 'so2', 'o3', 'location', 'sensor_id',
+    )
+    
+    @action(detail=False, methods=['get'], renderer_classes=COLUMNAR_RENDERER_CLASSES)
     def time_series(self, request):
-        """Get time series data for charts"""
+        """
+        Get time series data for charts
+        
+        Pass stream=true for a streamed JSON array, or format=columnar|packed|arrow
+        for per-sensor column arrays.
+        """
         hours = int(request.query_params.get('hours', 24))
         location_id = request.query_params.get('location')
         sensor_id = request.query_params.get('sensor')
+        stream = request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
         
         since = timezone.now() - timedelta(hours=hours)
-        queryset = SensorReading.objects.filter(timestamp__gte=since)
+        queryset = SensorReading.objects.filter(
+            timestamp__gte=since,
+            aqi_calculation__isnull=False
+        )
         
         if location_id:
             queryset = queryset.filter(sensor__location_id=location_id)
         if sensor_id:
             queryset = queryset.filter(sensor__sensor_id=sensor_id)
         
-        readings = queryset.select_related(
-            'sensor', 'sensor__location', 'aqi_calculation'
-        ).order_by('timestamp')
-        
-        data = []
-        for reading in readings:
-            if hasattr(reading, 'aqi_calculation'):
-                data.append({
-                    'timestamp': reading.timestamp,
-                    'aqi': reading.aqi_calculation.overall_aqi,
-                    'pm25': reading.pm25,
-                    'pm10': reading.pm10,
-                    'co': reading.co,
-                    'no2': reading.no2,
-                    'so2': reading.so2,
-                    'o3': reading.o3,
-                    'location': reading.sensor.location.name,
-                    'sensor_id': reading.sensor.sensor_id,
-                })
+        rows = iter_values_rows(
+            queryset.order_by('timestamp'),
+            self.TIME_SERIES_FIELDS,
+            self.TIME_SERIES_KEYS
+        )
+        
+        if request.accepted_renderer.format in COLUMNAR_FORMATS:
+            return Response(build_columnar_series(
+                queryset,
+                self.TIME_SERIES_FIELDS[1:8],
+                self.TIME_SERIES_KEYS[1:8]
+            ))
         
-        return Response(data)
+        if stream:
+            return streaming_json_response(request, rows)
+        
+        return Response(list(rows))
 
 class AQICalculationViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for AQI calculations (read-only)"""
@@ -153,10 +223,12 @@ class AQICalculationViewSet(viewsets.ReadOnlyModelViewSet):
         'sensor_reading__sensor__location'
     ).all()
     serializer_class = AQICalculationSerializer
+    pagination_class = AQICalculationPagination
     filter_backends = []
     filterset_fields = ['aqi_status', 'dominant_pollutant', 'sensor_reading__sensor__location']
     
     @action(detail=False, methods=['get'])
+    @method_decorator(conditional_on_ingest())
     def current(self, request):
         """Get current AQI for all locations"""
         current_aqi = []
@@ -175,6 +247,7 @@ class AQICalculationViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @method_decorator(cached_response('aqi_analytics'))
     def analytics(self, request):
         """Get AQI analytics data"""
         days = int(request.query_params.get('days', 7))
@@ -186,41 +259,74 @@ class AQICalculationViewSet(viewsets.ReadOnlyModelViewSet):
         if location_id:
             queryset = queryset.filter(sensor_reading__sensor__location_id=location_id)
         
-        # Overall statistics
-        stats = queryset.aggregate(
-            avg_aqi=Avg('overall_aqi'),
-            max_aqi=Max('overall_aqi'),
-            min_aqi=Min('overall_aqi'),
-            total_readings=Count('id')
-        )
+        # One pass grouped by hour of day; conditional counts give the status
+        # and pollutant distributions, and the overall statistics are rolled
+        # up from the hourly groups
+        statuses = [choice for choice, _ in AQICalculation.AQI_STATUS_CHOICES]
+        pollutants = list(AQICalculator.BREAKPOINT_MAP)
+        
+        aggregates = {
+            'sum_aqi': Sum('overall_aqi'),
+            'max_aqi': Max('overall_aqi'),
+            'min_aqi': Min('overall_aqi'),
+            'count': Count('id'),
+        }
+        aggregates.update({
+            f'status_{choice}': Count('id', filter=Q(aqi_status=choice)) for choice in statuses
+        })
+        aggregates.update({
+            f'pollutant_{pollutant}': Count('id', filter=Q(dominant_pollutant=pollutant))
+            for pollutant in pollutants
+        })
+        
+        hourly_rows = {
+            row['hour']: row
+            for row in queryset.annotate(
+                hour=ExtractHour('calculated_at')
+            ).values('hour').annotate(**aggregates).order_by('hour')
+        }
+        rows = hourly_rows.values()
+        
+        total_readings = sum(row['count'] for row in rows)
+        stats = {
+            'avg_aqi': sum(row['sum_aqi'] for row in rows) / total_readings if total_readings else None,
+            'max_aqi': max((row['max_aqi'] for row in rows), default=None),
+            'min_aqi': min((row['min_aqi'] for row in rows), default=None),
+            'total_readings': total_readings
+        }
         
         # AQI status distribution
-        status_distribution = queryset.values('aqi_status').annotate(
-            count=Count('id')
-        ).order_by('aqi_status')
+        status_distribution = []
+        for choice in sorted(statuses):
+            count = sum(row[f'status_{choice}'] for row in rows)
+            if count:
+                status_distribution.append({'aqi_status': choice, 'count': count})
         
         # Dominant pollutant distribution
-        pollutant_distribution = queryset.values('dominant_pollutant').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        pollutant_distribution = []
+        for pollutant in pollutants:
+            count = sum(row[f'pollutant_{pollutant}'] for row in rows)
+            if count:
+                pollutant_distribution.append({'dominant_pollutant': pollutant, 'count': count})
+        pollutant_distribution.sort(key=lambda item: item['count'], reverse=True)
         
         # Hourly averages
         hourly_data = []
         for hour in range(24):
-            hour_avg = queryset.filter(
-                calculated_at__hour=hour
-            ).aggregate(avg_aqi=Avg('overall_aqi'))
-            
+            row = hourly_rows.get(hour)
             hourly_data.append({
                 'hour': hour,
-                'avg_aqi': hour_avg['avg_aqi'] or 0
+                'avg_aqi': row['sum_aqi'] / row['count'] if row else 0,
+                'min_aqi': row['min_aqi'] if row else None,
+                'max_aqi': row['max_aqi'] if row else None,
+                'count': row['count'] if row else 0
             })
         
         return Response({
             'period': f"{days} days",
             'statistics': stats,
-            'status_distribution': list(status_distribution),
-            'pollutant_distribution': list(pollutant_distribution),
+            'status_distribution': status_distribution,
+            'pollutant_distribution': pollutant_distribution,
             'hourly_averages': hourly_data
         })
 
@@ -228,6 +334,7 @@ class AlertViewSet(viewsets.ModelViewSet):
     """ViewSet for managing alerts"""
     queryset = Alert.objects.select_related('sensor__location').all()
     serializer_class = AlertSerializer
+    pagination_class = AlertPagination
     filter_backends = []
     filterset_fields = ['alert_type', 'severity', 'is_active', 'acknowledged']
     
@@ -262,6 +369,7 @@ class AlertViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Alert deactivated'})
     
     @action(detail=False, methods=['get'])
+    @method_decorator(conditional_on_ingest())
     def summary(self, request):
         """Get alert summary statistics"""
         active_alerts = Alert.objects.filter(is_active=True)
@@ -283,4 +391,14 @@ class UserPreferenceViewSet(viewsets.ModelViewSet):
     queryset = UserPreference.objects.select_related('location').all()
     serializer_class = UserPreferenceSerializer
     filter_backends = []
-    filterset_fields = ['location', 'notification_method']
\ No newline at end of file
+    filterset_fields = ['location', 'notification_method']
+
+@api_view(['GET'])
+def realtime_status(request):
+    """WebSocket fan-out counters and consumer DB pool queue-wait metrics"""
+    return Response({
+        'timestamp': timezone.now(),
+        'publisher': publisher.stats(),
+        'db_executor': db_executor_metrics.snapshot(),
+        'throttled_subscriptions': throttle_stats()
+    })
\ No newline at end of file
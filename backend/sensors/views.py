@@ -1,6 +1,7 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.utils import timezone
 from monitoring.models import Sensor, SensorReading
 from monitoring.serializers import SensorReadingCreateSerializer
@@ -17,7 +18,7 @@ def sensor_health_check(request):
         
         if latest_reading:
             time_diff = timezone.now() - latest_reading.timestamp
-            is_online = time_diff.total_seconds() < 300  # 5 minutes
+            is_online = time_diff.total_seconds() < settings.SENSOR_OFFLINE_TIMEOUT
             
             health_data.append({
                 'sensor_id': sensor.sensor_id,